@@ -3,7 +3,9 @@ from sqladmin.authentication import AuthenticationBackend
 from starlette.requests import Request
 from starlette.responses import RedirectResponse
 from auth.oauth2 import (
-    verify_password,
+    verify_password_async,
+    hash_password_async,
+    needs_rehash,
     create_access_token,
     decode_access_token,
 )
@@ -26,9 +28,14 @@ class AdminAuth(AuthenticationBackend):
             if not user:
                 return False
 
-            if not verify_password(password, user.password):
+            if not await verify_password_async(password, user.password):
                 return False
 
+            if needs_rehash(user.password):
+                # Upgrade hashes created with an older BCRYPT_ROUNDS
+                user.password = await hash_password_async(password)
+                db.commit()
+
             if not user.is_admin:
                 # Optional: Log attempt by non-admin
                 return False
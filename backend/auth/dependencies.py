@@ -2,6 +2,7 @@ from jwt.exceptions import PyJWTError as JWTError
 from fastapi import Depends, status, HTTPException
 from fastapi.security import OAuth2PasswordBearer, HTTPBearer
 from fastapi.security.http import HTTPAuthorizationCredentials
+from sqlalchemy.orm import Session
 
 from utility.logger import get_logger
 from core.config import settings
@@ -11,6 +12,7 @@ from core.custom_error_handlers import (
     AccessTokenRequired,
     RefreshTokenRequired,
 )
+from db.database import get_db, route_reads
 from db.redis import token_in_blocklist
 from auth.oauth2 import decode_access_token
 
@@ -64,6 +66,14 @@ def get_current_admin_user(
     return current_user
 
 
+def get_read_db(
+    db: Session = Depends(get_db),
+    current_user: TokenData = Depends(get_current_user),
+) -> Session:
+    """Session dependency for read-only endpoints, routed by db.database.route_reads."""
+    return route_reads(db, current_user.user_id)
+
+
 async def get_access_token(
     creds: HTTPAuthorizationCredentials = Depends(HTTPBearer()),
 ) -> str:
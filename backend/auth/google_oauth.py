@@ -0,0 +1,196 @@
+"""
+Google OAuth helpers shared by every login.
+
+The client config is built once, the authorization code is exchanged over a
+pooled HTTP session, and Google's ID token signing certificates are cached for
+as long as their Cache-Control max-age allows. A login then costs a single
+round trip to Google (the token exchange) instead of also fetching the certs.
+The endpoint URLs are settings, so tests can point them at a local stand-in.
+"""
+
+import re
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from google.auth import jwt as google_jwt
+from google_auth_oauthlib.flow import Flow
+
+from core.config import settings
+from core.metrics import GOOGLE_OAUTH_REQUEST_SECONDS
+from utility.logger import get_logger
+
+lg = get_logger(script_path=__file__)
+
+SCOPES = [
+    "openid",
+    "https://www.googleapis.com/auth/userinfo.email",
+    "https://www.googleapis.com/auth/userinfo.profile",
+]
+ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+MAX_AGE_PATTERN = re.compile(r"max-age=(\d+)")
+
+
+def _build_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=1, pool_maxsize=settings.GOOGLE_HTTP_POOL_SIZE
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# Keep-alive connections to Google, shared by all request threads
+http_session = _build_session()
+
+
+def client_config() -> dict:
+    return {
+        "web": {
+            "client_id": settings.GOOGLE_CLIENT_ID,
+            "client_secret": settings.GOOGLE_CLIENT_SECRET,
+            "auth_uri": settings.GOOGLE_AUTH_URI,
+            "token_uri": settings.GOOGLE_TOKEN_URI,
+            "redirect_uris": [settings.GOOGLE_REDIRECT_URI],
+        }
+    }
+
+
+def authorization_url() -> str:
+    """URL of Google's consent screen for a new login."""
+    # The code is exchanged without a verifier, so no PKCE challenge is sent
+    flow = Flow.from_client_config(
+        client_config=client_config(),
+        scopes=SCOPES,
+        redirect_uri=settings.GOOGLE_REDIRECT_URI,
+        autogenerate_code_verifier=False,
+    )
+    url, _ = flow.authorization_url(
+        access_type="offline", include_granted_scopes="true"
+    )
+    return url
+
+
+def exchange_code(request_url: str) -> dict:
+    """
+    Exchange the authorization code of the OAuth callback for Google's tokens.
+    Args:
+        request_url (str): The full callback URL, with the code in its query.
+    Returns:
+        dict: Google's token response, including the 'id_token'.
+    Raises:
+        ValueError: If the callback carries no code or Google rejects it.
+    """
+    query = parse_qs(urlparse(request_url).query)
+    if "code" not in query:
+        raise ValueError(query.get("error", ["missing authorization code"])[0])
+
+    started = time.perf_counter()
+    try:
+        response = http_session.post(
+            settings.GOOGLE_TOKEN_URI,
+            data={
+                "grant_type": "authorization_code",
+                "code": query["code"][0],
+                "client_id": settings.GOOGLE_CLIENT_ID,
+                "client_secret": settings.GOOGLE_CLIENT_SECRET,
+                "redirect_uri": settings.GOOGLE_REDIRECT_URI,
+            },
+            timeout=settings.GOOGLE_HTTP_TIMEOUT_SECONDS,
+        )
+    except requests.RequestException as e:
+        raise ValueError(f"token exchange failed: {e}") from e
+    finally:
+        GOOGLE_OAUTH_REQUEST_SECONDS.labels(endpoint="token").observe(
+            time.perf_counter() - started
+        )
+    if response.status_code != 200:
+        raise ValueError(f"token exchange failed: {response.text}")
+    return response.json()
+
+
+class GoogleCertsCache:
+    """
+    Google's ID token signing certificates, refreshed when their max-age runs out.
+    """
+
+    def __init__(self):
+        self._certs = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def _fetch(self) -> None:
+        started = time.perf_counter()
+        try:
+            response = http_session.get(
+                settings.GOOGLE_CERTS_URL,
+                timeout=settings.GOOGLE_HTTP_TIMEOUT_SECONDS,
+            )
+            response.raise_for_status()
+        except requests.RequestException as e:
+            if self._certs is None:
+                raise ValueError(f"could not fetch Google certificates: {e}") from e
+            # Google's keys overlap for days, stale certs beat failing every login
+            lg.warning(f"Google certificate refresh failed, keeping cached: {e}")
+            self._expires_at = time.monotonic() + 60
+            return
+        finally:
+            GOOGLE_OAUTH_REQUEST_SECONDS.labels(endpoint="certs").observe(
+                time.perf_counter() - started
+            )
+
+        match = MAX_AGE_PATTERN.search(response.headers.get("Cache-Control", ""))
+        max_age = int(match.group(1)) if match else 0
+        max_age -= int(response.headers.get("Age", 0))
+        self._certs = response.json()
+        self._expires_at = time.monotonic() + max(max_age, 0)
+
+    def get(self, key_id: str | None = None) -> dict:
+        """
+        Current certificates by key id.
+        Args:
+            key_id (str, optional): Key id of the token to verify; a key id not in
+                the cache triggers a refresh, as Google may have rotated its keys.
+        Returns:
+            dict: Certificates by key id.
+        """
+        with self._lock:
+            if (
+                self._certs is None
+                or time.monotonic() >= self._expires_at
+                or (key_id is not None and key_id not in self._certs)
+            ):
+                self._fetch()
+            return self._certs
+
+    def clear(self) -> None:
+        with self._lock:
+            self._certs = None
+            self._expires_at = 0.0
+
+
+google_certs = GoogleCertsCache()
+
+
+def verify_id_token(token: str) -> dict:
+    """
+    Verify a Google ID token against the cached certificates.
+    Args:
+        token (str): The 'id_token' of the token response.
+    Returns:
+        dict: The token's claims.
+    Raises:
+        ValueError: If the signature, audience, issuer or expiry is invalid.
+    """
+    key_id = google_jwt.decode_header(token).get("kid")
+    id_info = google_jwt.decode(
+        token,
+        certs=google_certs.get(key_id),
+        audience=settings.GOOGLE_CLIENT_ID,
+    )
+    if id_info.get("iss") not in ISSUERS:
+        raise ValueError(f"Wrong issuer: {id_info.get('iss')}")
+    return id_info
@@ -1,4 +1,10 @@
+import hmac
 import uuid
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
 import bcrypt
 import jwt
 from jwt.exceptions import PyJWTError as JWTError
@@ -8,6 +14,13 @@ from itsdangerous import URLSafeTimedSerializer
 from datetime import datetime, timedelta
 from utility.logger import get_logger
 from core.config import settings
+from core.custom_error_handlers import PasswordHashingBusy
+from auth.token_cache import verified_tokens
+from core.metrics import (
+    PASSWORD_HASH_SECONDS,
+    PASSWORD_HASH_QUEUE_DEPTH,
+    PASSWORD_HASH_REJECTED,
+)
 
 
 lg = get_logger(__file__)
@@ -19,54 +32,119 @@ oauth2_scheme = OAuth2PasswordBearer(
 )
 
 
+# bcrypt releases the GIL, so hashing runs on this small dedicated pool in
+# parallel with regular traffic. Async callers await it without blocking the loop.
+_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt"
+)
+# Running plus queued calls; beyond this, login storms are rejected instead of
+# piling up behind each other
+_hash_slots = threading.BoundedSemaphore(
+    settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_MAX_QUEUE
+)
+
+
+def _submit(op: str, fn: Callable, *args) -> Future:
+    slots = _hash_slots
+    if not slots.acquire(blocking=False):
+        PASSWORD_HASH_REJECTED.inc()
+        lg.warning(f"Password hashing pool full, rejecting {op}")
+        raise PasswordHashingBusy()
+    PASSWORD_HASH_QUEUE_DEPTH.inc()
+
+    def run():
+        with PASSWORD_HASH_SECONDS.labels(op=op).time():
+            return fn(*args)
+
+    def release(_):
+        PASSWORD_HASH_QUEUE_DEPTH.dec()
+        slots.release()
+
+    future = _hash_executor.submit(run)
+    future.add_done_callback(release)
+    return future
+
+
+def _hashpw(password: str) -> str:
+    truncated_password = password.encode("utf-8")[:72]
+    salt = bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS)
+    return bcrypt.hashpw(truncated_password, salt).decode("utf-8")
+
+
+def _checkpw(plain: str, hashed: str) -> bool:
+    return bcrypt.checkpw(plain.encode("utf-8")[:72], hashed.encode("utf-8"))
+
+
 def hash_password(password: str) -> str:
     try:
-        lg.debug(f"Hashing passowrd: {password}")
-        truncated_password = password.encode("utf-8")[:72]
-        salt = bcrypt.gensalt()
-        hashed_password = bcrypt.hashpw(truncated_password, salt).decode("utf-8")
-        lg.debug(f"Hashed password: {hashed_password}")
-        if hashed_password is not None:
-            return hashed_password
-
-        return None
+        return _submit("hash", _hashpw, password).result()
+    except PasswordHashingBusy:
+        raise
     except Exception as e:
         lg.error(f"Error hashing password: {str(e)}")
         raise e
 
 
-def hash_token(token: str) -> str:
-    """Hash a token for storage."""
-    truncated_token = token.encode("utf-8")[:72]
-    return bcrypt.hashpw(truncated_token, bcrypt.gensalt()).decode("utf-8")
+async def hash_password_async(password: str) -> str:
+    """hash_password for async code, awaits the pool instead of blocking the loop."""
+    return await asyncio.wrap_future(_submit("hash", _hashpw, password))
+
+
+def needs_rehash(hashed_password: str) -> bool:
+    """
+    Whether a stored bcrypt hash uses another cost than BCRYPT_ROUNDS.
+    Args:
+        hashed_password (str): Stored hash, e.g. '$2b$12$...'.
+    Returns:
+        bool: True if the password should be rehashed after a successful login.
+    """
+    try:
+        return int(hashed_password.split("$")[2]) != settings.BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+
+def token_digest(token: str) -> str:
+    """
+    Keyed SHA-256 (HMAC) digest of a token for storage.
+    Deterministic, so a stored token is found with one indexed equality lookup,
+    and useless without the secret key if the table leaks.
+    """
+    return hmac.new(
+        settings.JWT_SECRET_KEY.encode("utf-8"), token.encode("utf-8"), hashlib.sha256
+    ).hexdigest()
 
 
 def verify_token(token: str, hashed_token: str) -> bool:
-    """Verify a token against its hash."""
-    truncated_token = token.encode("utf-8")[:72]
-    return bcrypt.checkpw(truncated_token, hashed_token.encode("utf-8"))
+    """Verify a token against its legacy bcrypt hash."""
+    return _submit("verify", _checkpw, token, hashed_token).result()
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     try:
-        lg.debug(
-            f"Verifing password: {plain_password} with hashed password: {hashed_password}"
-        )
-        truncated_password = plain_password.encode("utf-8")[:72]
-        verified_password = bcrypt.checkpw(
-            truncated_password, hashed_password.encode("utf-8")
-        )
+        verified_password = _submit(
+            "verify", _checkpw, plain_password, hashed_password
+        ).result()
         if not verified_password:
             lg.debug("Failed to verify password")
             return False
 
         lg.debug("Password verified successfully")
         return True
+    except PasswordHashingBusy:
+        raise
     except Exception as e:
         lg.error(f"Error verifying password: {str(e)}")
         raise e
 
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password for async code, awaits the pool instead of blocking the loop."""
+    return await asyncio.wrap_future(
+        _submit("verify", _checkpw, plain_password, hashed_password)
+    )
+
+
 def create_access_token(
     user_data: dict, expiry: timedelta = None, refresh: bool = False
 ) -> str:
@@ -112,6 +190,7 @@ def create_access_token(
 def decode_access_token(token: str) -> dict:
     """
     Decode a JWT access token and return the payload as a dictionary.
+    Tokens verified before are served from the in-process cache until they expire.
     Args:
         token (str): The JWT token to decode.
     Returns:
@@ -119,12 +198,16 @@ def decode_access_token(token: str) -> dict:
     Raises:
         JWTError: If the token is invalid or cannot be decoded.
     """
+    token_data = verified_tokens.get(token)
+    if token_data is not None:
+        return token_data
     try:
         token_data = jwt.decode(
             jwt=token,
             key=settings.JWT_SECRET_KEY,
             algorithms=[settings.JWT_ALGORITHM],
         )
+        verified_tokens.put(token, token_data)
         return token_data
     except JWTError as e:
         lg.error(f"Error decoding access token: {str(e)}")
@@ -0,0 +1,110 @@
+"""
+In-process revocation filter for the JWT blocklist.
+
+Every revoked jti goes into a Bloom filter, and the most recent ones also go
+into a small exact set. A jti the Bloom filter has never seen is definitely not
+revoked, so most requests need no Redis round trip. A jti in the exact set is
+definitely revoked. Anything else (a Bloom false positive, or an older
+revocation) is checked against Redis.
+
+The filter is filled from Redis and kept current through pub/sub by
+db.redis.sync_revocation_filter. Until the first sync, and whenever the
+subscription is lost, it is not ready and every check goes to Redis.
+"""
+
+import hashlib
+import math
+import time
+from collections import OrderedDict
+from typing import Iterable
+
+from core.config import settings
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings (double hashing on one blake2b digest).
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(capacity, 1)
+        self.size = max(
+            8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item)
+        )
+
+
+class RevocationFilter:
+    """
+    Bloom filter of all revoked jtis plus an exact LRU of the recent ones.
+    Only touched from the event loop, so it needs no locking.
+    """
+
+    def __init__(self, capacity: int, error_rate: float, exact_size: int):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.exact_size = exact_size
+        self.ready = False
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._recent: OrderedDict[str, float] = OrderedDict()
+
+    def add(self, jti: str, exp: float) -> None:
+        self._bloom.add(jti)
+        self._recent[jti] = exp
+        self._recent.move_to_end(jti)
+        while len(self._recent) > self.exact_size:
+            self._recent.popitem(last=False)
+
+    def rebuild(self, revoked: Iterable[tuple[str, float]]) -> None:
+        """
+        Replace the contents with the revocations currently stored in Redis.
+        Rebuilding also forgets expired jtis, which a Bloom filter cannot delete.
+        Args:
+            revoked (Iterable[tuple[str, float]]): (jti, exp) pairs, oldest first.
+        """
+        revoked = list(revoked)
+        self._bloom = BloomFilter(max(self.capacity, 2 * len(revoked)), self.error_rate)
+        self._recent = OrderedDict()
+        for jti, exp in revoked:
+            self.add(jti, exp)
+        self.ready = True
+
+    def check(self, jti: str) -> bool | None:
+        """
+        Answer a revocation check locally if possible.
+        Args:
+            jti (str): The token's jti.
+        Returns:
+            bool | None: True if revoked, False if not, None if Redis must decide.
+        """
+        if not self.ready:
+            return None
+        if jti not in self._bloom:
+            return False
+        exp = self._recent.get(jti)
+        if exp is not None and exp > time.time():
+            return True
+        return None
+
+
+revocation_filter = RevocationFilter(
+    capacity=settings.REVOCATION_FILTER_CAPACITY,
+    error_rate=settings.REVOCATION_FILTER_ERROR_RATE,
+    exact_size=settings.REVOCATION_EXACT_SIZE,
+)
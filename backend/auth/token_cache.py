@@ -0,0 +1,96 @@
+"""
+In-process cache of verified JWT claims.
+
+decode_access_token verifies the same token on every request of its lifetime.
+Verified claims are kept here, keyed by a digest of the token, until the token's
+exp, so repeat requests skip the signature check. Revocation is unaffected:
+callers still check the jti blocklist, and a blocklisted jti is dropped from
+this cache as well.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from core.config import settings
+from core.metrics import JWT_CACHE_LOOKUPS, JWT_CACHE_SIZE
+
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU of token digest -> (exp, claims), safe to share between threads.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[bytes, tuple[float, dict]] = OrderedDict()
+        self._by_jti: dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def _evict(self, key: bytes) -> None:
+        _, claims = self._entries.pop(key)
+        self._by_jti.pop(claims.get("jti"), None)
+
+    def get(self, token: str) -> dict | None:
+        """
+        Look up the verified claims of a token.
+        Args:
+            token (str): The encoded JWT.
+        Returns:
+            dict | None: A copy of the claims, None if not cached or expired.
+        """
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.time():
+                # Let jwt.decode raise the usual ExpiredSignatureError
+                self._evict(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+            JWT_CACHE_SIZE.set(len(self._entries))
+        JWT_CACHE_LOOKUPS.labels(result="miss" if entry is None else "hit").inc()
+        return None if entry is None else dict(entry[1])
+
+    def put(self, token: str, claims: dict) -> None:
+        """
+        Remember the claims of a token that just passed verification.
+        Args:
+            token (str): The encoded JWT.
+            claims (dict): Its decoded claims, tokens without 'exp' are not cached.
+        """
+        exp = claims.get("exp")
+        if self.max_entries <= 0 or not isinstance(exp, (int, float)):
+            return
+        key = self._key(token)
+        with self._lock:
+            if key in self._entries:
+                self._evict(key)
+            self._entries[key] = (exp, dict(claims))
+            if claims.get("jti"):
+                self._by_jti[claims["jti"]] = key
+            while len(self._entries) > self.max_entries:
+                self._evict(next(iter(self._entries)))
+            JWT_CACHE_SIZE.set(len(self._entries))
+
+    def invalidate_jti(self, jti: str) -> None:
+        """Drop the cached claims of a revoked token."""
+        with self._lock:
+            key = self._by_jti.get(jti)
+            if key is not None and key in self._entries:
+                self._evict(key)
+            JWT_CACHE_SIZE.set(len(self._entries))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_jti.clear()
+            JWT_CACHE_SIZE.set(0)
+
+
+verified_tokens = VerifiedTokenCache(settings.JWT_CACHE_MAX_ENTRIES)
@@ -0,0 +1,7 @@
+from core.cache.cache import (
+    Cache,
+    VersionedCache,
+    invalidate_tags,
+    drop_all_local,
+    sync_cache_invalidations,
+)
@@ -0,0 +1,562 @@
+"""
+Two-tier cache: an in-process LRU in front of Redis.
+
+Every Cache has a namespace (its key prefix and metric label). Values are
+stored in Redis as msgpack with the time the loader took and the expiry, so
+readers can refresh an entry early with a probability that grows as it nears
+expiry (XFetch) instead of all missing at once. Concurrent misses of a key in
+one process share a single loader call. With shared_wait, the processes share it
+too: one process loads while the others block on a Redis list (a single BLPOP)
+that the loading process pushes to when it is done.
+
+Entries can carry tags: invalidate_tags() drops every entry with one of the
+tags, in any namespace, from Redis and, over pub/sub, from the local tier of
+every process. The local tier is only served while this process follows that
+channel (sync_cache_invalidations), otherwise reads go to Redis.
+
+Every tag also has a generation, bumped by each invalidation. get_or_set reads
+the generations of the entry's tags before calling the loader and stores the
+value only if they are unchanged (WATCH/MULTI), so a value loaded before an
+invalidation cannot be written after it and outlive it.
+
+VersionedCache groups entries (e.g. per user) in one Redis hash per group, next
+to a random version of the group. Invalidating a group replaces the version and
+drops the hash in one transaction, and the version can serve as an ETag.
+"""
+
+import math
+import random
+import threading
+import time
+from typing import Any, Callable, Iterable
+
+import redis
+
+from core.cache.codec import pack, unpack
+from core.cache.local import Entry, LocalTier
+from core.config import settings
+from core.ids import new_id
+from core.metrics import CACHE_LOOKUPS, CACHE_LOCAL_ENTRIES, CACHE_VALUE_BYTES
+from db.redis import get_sync_redis, subscribe_forever
+from utility.logger import get_logger
+
+lg = get_logger(script_path=__file__)
+
+INVALIDATE_CHANNEL = "cache_invalidate"
+
+# namespace -> Cache, for invalidations received over pub/sub
+_caches: dict[str, "Cache"] = {}
+_following = threading.Event()
+# Bumped whenever local entries are dropped, a load that saw an older value
+# does not fill the local tier
+_local_epoch = 0
+
+
+def tag_key(tag: str) -> str:
+    return f"cache_tag:{tag}"
+
+
+def tag_generation_key(tag: str) -> str:
+    return f"cache_tag_gen:{tag}"
+
+
+def _tag_ttl() -> int:
+    # Tag sets and generations must outlive every entry they cover
+    return max(cache.ttl for cache in _caches.values())
+
+
+class _Flight:
+    """A loader call other threads wait for."""
+
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class Cache:
+    def __init__(
+        self,
+        namespace: str,
+        ttl: int,
+        local_ttl: float = 0,
+        local_max_entries: int = 0,
+        encode: Callable[[Any], Any] | None = None,
+        decode: Callable[[Any], Any] | None = None,
+        compress_min_bytes: int | None = settings.CACHE_COMPRESS_MIN_BYTES,
+        shared_wait: float = 0,
+    ):
+        """
+        Args:
+            namespace (str): Unique name, prefixes the Redis keys.
+            ttl (int): Lifetime of Redis entries in seconds.
+            local_ttl (float, optional): Lifetime of local entries, 0 disables the local tier.
+            local_max_entries (int, optional): Size of the local tier.
+            encode (Callable, optional): Turns a value into msgpack-serializable data.
+            decode (Callable, optional): Inverse of encode.
+            compress_min_bytes (int, optional): Compress Redis entries from this size, None never.
+            shared_wait (float, optional): Seconds a miss waits for another process
+                loading the same key, 0 loads in every process.
+        """
+        if namespace in _caches:
+            raise ValueError(f"Cache namespace {namespace!r} already exists")
+        self.namespace = namespace
+        self.ttl = ttl
+        self.local_ttl = local_ttl
+        self.local = (
+            LocalTier(local_max_entries) if local_ttl and local_max_entries else None
+        )
+        self.encode = encode or (lambda value: value)
+        self.decode = decode or (lambda value: value)
+        self.compress_min_bytes = compress_min_bytes
+        self.shared_wait = shared_wait
+        self._flights: dict[str, _Flight] = {}
+        self._flights_lock = threading.Lock()
+        _caches[namespace] = self
+
+    def _key(self, key: str) -> str:
+        return f"cache:{self.namespace}:{key}"
+
+    def _loading_key(self, key: str) -> str:
+        return f"cache_loading:{self._key(key)}"
+
+    def _loaded_key(self, key: str) -> str:
+        return f"cache_loaded:{self._key(key)}"
+
+    def _read(self, client, key: str) -> bytes | None:
+        return client.get(self._key(key))
+
+    def _guard_keys(self, key: str, tags: list[str]) -> list[str]:
+        """Keys that must not change between the load of a value and its store."""
+        return [tag_generation_key(tag) for tag in tags]
+
+    def _write(self, pipe, key: str, data: bytes, tags: list[str]) -> None:
+        pipe.set(self._key(key), data, ex=self.ttl)
+        for tag in tags:
+            pipe.sadd(tag_key(tag), self._key(key))
+            pipe.expire(tag_key(tag), _tag_ttl())
+
+    def _count(self, result: str) -> None:
+        CACHE_LOOKUPS.labels(namespace=self.namespace, result=result).inc()
+
+    def _put_local(
+        self, key: str, value: Any, expires_at: float, tags: Iterable[str]
+    ) -> None:
+        if self.local is None or not _following.is_set():
+            return
+        expires_at = min(expires_at, time.time() + self.local_ttl)
+        self.local.set(key, Entry(value, expires_at, tuple(tags)))
+        CACHE_LOCAL_ENTRIES.labels(namespace=self.namespace).set(len(self.local))
+
+    def _refresh_early(self, delta: float, expires_at: float, now: float) -> bool:
+        # XFetch: -log(u) is exponentially distributed, so the slower the loader
+        # the earlier some reader volunteers to recompute
+        jitter = -math.log(1.0 - random.random())
+        return now + delta * settings.CACHE_EARLY_REFRESH_BETA * jitter >= expires_at
+
+    def _lookup(self, key: str) -> tuple[bool, Any]:
+        now = time.time()
+        if self.local is not None and _following.is_set():
+            entry = self.local.get(key, now)
+            if entry is not None:
+                self._count("local_hit")
+                return True, entry.value
+        try:
+            data = self._read(get_sync_redis(), key)
+        except redis.RedisError as e:
+            lg.error(f"Cache read of {self.namespace} failed: {e}")
+            data = None
+        if data is None:
+            return False, None
+        value, delta, expires_at, tags = unpack(data)
+        if self._refresh_early(delta, expires_at, now):
+            self._count("early_refresh")
+            return False, None
+        value = self.decode(value)
+        self._put_local(key, value, expires_at, tags)
+        self._count("redis_hit")
+        return True, value
+
+    def get(self, key: str) -> Any | None:
+        """
+        Cached value of a key.
+        Args:
+            key (str): The key, unique within the namespace.
+        Returns:
+            Any | None: The value, None on a miss.
+        """
+        found, value = self._lookup(key)
+        if not found:
+            self._count("miss")
+        return value
+
+    def get_or_set(
+        self, key: str, loader: Callable[[], Any], tags: Iterable[str] = ()
+    ) -> Any:
+        """
+        Cached value of a key, loaded and stored on a miss.
+
+        Concurrent misses in this process wait for one loader call, and with
+        shared_wait for a loader call in another process. A loader returning None
+        is not cached.
+
+        Args:
+            key (str): The key, unique within the namespace.
+            loader (Callable[[], Any]): Computes the value, may raise.
+            tags (Iterable[str], optional): Tags to invalidate the entry by.
+        Returns:
+            Any: The value.
+        """
+        found, value = self._lookup(key)
+        if found:
+            return value
+
+        tags = list(tags)
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            if not flight.done.wait(settings.CACHE_COALESCE_WAIT_SECONDS):
+                # The loading request is stuck, do not wait any longer
+                self._count("miss")
+                return loader()
+            self._count("coalesced")
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        claimed = None
+        try:
+            if self.shared_wait:
+                claimed = self._claim(key)
+                if claimed is False:
+                    found, value = self._wait_for_other_process(key)
+                    if found:
+                        self._count("waited")
+                        flight.value = value
+                        return value
+            self._count("miss")
+            epoch = _local_epoch
+            generations = self._generations(key, tags)
+            started = time.monotonic()
+            flight.value = loader()
+            if flight.value is not None and generations is not None:
+                self._store(
+                    key,
+                    flight.value,
+                    tags,
+                    time.monotonic() - started,
+                    generations,
+                    epoch,
+                )
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            if claimed:
+                self._release(key)
+            with self._flights_lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def _claim(self, key: str) -> bool | None:
+        """
+        Take the load of a key across processes: True if this process loads it,
+        False if another one already does, None if Redis cannot tell.
+        """
+        try:
+            client = get_sync_redis()
+            loading = client.set(
+                self._loading_key(key), 1, nx=True, px=int(self.shared_wait * 1000)
+            )
+            if not loading:
+                return False
+            # A wake-up left over from an earlier load must not end a wait early
+            client.delete(self._loaded_key(key))
+            return True
+        except redis.RedisError as e:
+            lg.error(f"Cache read of {self.namespace} failed: {e}")
+            return None
+
+    def _wait_for_other_process(self, key: str) -> tuple[bool, Any]:
+        try:
+            client = get_sync_redis()
+            # One blocking pop instead of polling the entry
+            if client.blpop([self._loaded_key(key)], timeout=self.shared_wait) is None:
+                return False, None
+            # Pass the wake-up on to the next waiting process
+            pipe = client.pipeline(transaction=False)
+            pipe.rpush(self._loaded_key(key), 1)
+            pipe.pexpire(self._loaded_key(key), int(self.shared_wait * 1000))
+            pipe.execute()
+        except redis.RedisError as e:
+            lg.error(f"Cache read of {self.namespace} failed: {e}")
+            return False, None
+        return self._lookup(key)
+
+    def _release(self, key: str) -> None:
+        """End the load of a key and wake the processes waiting for it."""
+        try:
+            pipe = get_sync_redis().pipeline(transaction=False)
+            pipe.delete(self._loading_key(key))
+            pipe.rpush(self._loaded_key(key), 1)
+            pipe.pexpire(self._loaded_key(key), int(self.shared_wait * 1000))
+            pipe.execute()
+        except redis.RedisError as e:
+            # The waiting processes give up after shared_wait
+            lg.error(f"Cache write of {self.namespace} failed: {e}")
+
+    def _generations(self, key: str, tags: list[str]) -> list | None:
+        """Current values of the guard keys of an entry, None if Redis cannot tell."""
+        guard_keys = self._guard_keys(key, tags)
+        if not guard_keys:
+            return []
+        try:
+            return get_sync_redis().mget(guard_keys)
+        except redis.RedisError as e:
+            lg.error(f"Cache read of {self.namespace} failed: {e}")
+            return None
+
+    def _store(
+        self,
+        key: str,
+        value: Any,
+        tags: list[str],
+        delta: float,
+        generations: list | None = None,
+        epoch: int | None = None,
+    ) -> None:
+        expires_at = time.time() + self.ttl
+        data = pack(
+            [self.encode(value), delta, expires_at, tags], self.compress_min_bytes
+        )
+        CACHE_VALUE_BYTES.labels(namespace=self.namespace).observe(len(data))
+        guard_keys = self._guard_keys(key, tags)
+        checked = generations is not None and bool(guard_keys)
+        try:
+            with get_sync_redis().pipeline(transaction=checked) as pipe:
+                if checked:
+                    pipe.watch(*guard_keys)
+                    if pipe.mget(guard_keys) != generations:
+                        # A tag was invalidated while the value was loaded
+                        return
+                    pipe.multi()
+                self._write(pipe, key, data, tags)
+                pipe.execute()
+        except redis.WatchError:
+            return
+        except redis.RedisError as e:
+            lg.error(f"Cache write of {self.namespace} failed: {e}")
+        if epoch is None or epoch == _local_epoch:
+            self._put_local(key, value, expires_at, tags)
+
+    def set(
+        self, key: str, value: Any, tags: Iterable[str] = (), delta: float = 0.0
+    ) -> None:
+        """
+        Store a value in both tiers.
+        Args:
+            key (str): The key, unique within the namespace.
+            value (Any): The value, must not be None.
+            tags (Iterable[str], optional): Tags to invalidate the entry by.
+            delta (float, optional): Seconds it took to compute, drives the early refresh.
+        """
+        self._store(key, value, list(tags), delta)
+
+    def delete(self, *keys: str) -> None:
+        """Drop keys from Redis and from the local tier of every process."""
+        self.drop_local(*keys)
+        try:
+            pipe = get_sync_redis().pipeline(transaction=False)
+            pipe.delete(*(self._key(key) for key in keys))
+            pipe.publish(
+                INVALIDATE_CHANNEL, pack({"namespace": self.namespace, "keys": keys})
+            )
+            pipe.execute()
+        except Exception as e:
+            # Other processes' local entries still expire after local_ttl
+            lg.error(f"Cache invalidation of {self.namespace} failed: {e}")
+
+    def drop_local(self, *keys: str) -> None:
+        """Forget keys from this process's local tier, all of them if none are given."""
+        global _local_epoch
+        if self.local is None:
+            return
+        _local_epoch += 1
+        if not keys:
+            self.local.clear()
+        for key in keys:
+            self.local.pop(key)
+        CACHE_LOCAL_ENTRIES.labels(namespace=self.namespace).set(len(self.local))
+
+
+class VersionedCache(Cache):
+    """
+    Cache of entries grouped by an owner, keyed by (group, field) tuples.
+
+    A group's entries live in one Redis hash next to the group's version, a random
+    id replaced by every invalidation. An entry is stored only if the version is
+    still the one read before its loader ran, and invalidate() replaces the version
+    and drops the hash atomically, so no reader sees a new version next to an old
+    entry. Versions are never reused, not even after they expired, so they can be
+    used as ETags. There is no local tier and no tags.
+    """
+
+    def __init__(self, namespace: str, ttl: int, version_ttl: int, **kwargs):
+        """
+        Args:
+            namespace (str): Unique name, prefixes the Redis keys.
+            ttl (int): Lifetime of the entries in seconds.
+            version_ttl (int): Lifetime of a group's version, renewed on every change.
+            kwargs: compress_min_bytes and shared_wait, as for Cache.
+        """
+        super().__init__(namespace, ttl, **kwargs)
+        self.version_ttl = version_ttl
+
+    def _key(self, key: tuple[str, str]) -> str:
+        return f"cache:{self.namespace}:{key[0]}:{key[1]}"
+
+    def _hash_key(self, group: str) -> str:
+        return f"cache:{self.namespace}:{group}"
+
+    def _version_key(self, group: str) -> str:
+        return f"cache_version:{self.namespace}:{group}"
+
+    def _read(self, client, key: tuple[str, str]) -> bytes | None:
+        return client.hget(self._hash_key(key[0]), key[1])
+
+    def _guard_keys(self, key: tuple[str, str], tags: list[str]) -> list[str]:
+        return [self._version_key(key[0])]
+
+    def _write(self, pipe, key: tuple[str, str], data: bytes, tags: list[str]) -> None:
+        pipe.hset(self._hash_key(key[0]), key[1], data)
+        pipe.expire(self._hash_key(key[0]), self.ttl)
+
+    def delete(self, *keys: tuple[str, str]) -> None:
+        """Drop single entries, the version of their group is left as is."""
+        try:
+            pipe = get_sync_redis().pipeline(transaction=False)
+            for group, field in keys:
+                pipe.hdel(self._hash_key(group), field)
+            pipe.execute()
+        except redis.RedisError as e:
+            lg.error(f"Cache invalidation of {self.namespace} failed: {e}")
+
+    def version(self, group: str) -> str | None:
+        """
+        Current version of a group, a new one if it has none yet (or it expired).
+        Args:
+            group (str): The group, e.g. a user id.
+        Returns:
+            str | None: The version, None if Redis is unavailable.
+        """
+        try:
+            pipe = get_sync_redis().pipeline(transaction=False)
+            pipe.set(self._version_key(group), new_id(), nx=True, ex=self.version_ttl)
+            pipe.get(self._version_key(group))
+            version = pipe.execute()[-1]
+        except redis.RedisError as e:
+            lg.error(f"Cache read of {self.namespace} failed: {e}")
+            return None
+        return None if version is None else version.decode("utf-8")
+
+    def invalidate(self, *groups: str) -> None:
+        """
+        Drop every entry of the groups and give them a new version.
+        Args:
+            groups (str): The groups whose data changed.
+        """
+        if not groups:
+            return
+        try:
+            # Atomic, so no reader sees the new version next to an old entry
+            pipe = get_sync_redis().pipeline(transaction=True)
+            for group in groups:
+                pipe.set(self._version_key(group), new_id(), ex=self.version_ttl)
+                pipe.delete(self._hash_key(group))
+            pipe.execute()
+        except Exception as e:
+            # Entries left behind expire after ttl
+            lg.error(
+                f"Cache invalidation of {self.namespace} groups {groups} failed: {e}"
+            )
+
+
+def _drop_local_tags(tags: Iterable[str]) -> None:
+    global _local_epoch
+    _local_epoch += 1
+    for cache in _caches.values():
+        if cache.local is not None:
+            cache.local.drop_tags(tags)
+            CACHE_LOCAL_ENTRIES.labels(namespace=cache.namespace).set(len(cache.local))
+
+
+def invalidate_tags(*tags: str) -> None:
+    """
+    Drop every entry carrying one of the tags, in all namespaces and processes.
+    Args:
+        tags (str): The tags, e.g. 'user:<user_id>'.
+    """
+    if not tags:
+        return
+    _drop_local_tags(tags)
+    try:
+        client = get_sync_redis()
+        pipe = client.pipeline(transaction=False)
+        # Bumped before the tag sets are read: a store that got in before still
+        # has its key listed, any later one fails its generation check
+        for tag in tags:
+            pipe.incr(tag_generation_key(tag))
+            pipe.expire(tag_generation_key(tag), _tag_ttl())
+        for tag in tags:
+            pipe.smembers(tag_key(tag))
+        keys = set().union(*pipe.execute()[2 * len(tags) :])
+        pipe = client.pipeline(transaction=False)
+        pipe.delete(*keys, *(tag_key(tag) for tag in tags))
+        pipe.publish(INVALIDATE_CHANNEL, pack({"tags": tags}))
+        pipe.execute()
+    except Exception as e:
+        # Other processes' local entries still expire after their local_ttl
+        lg.error(f"Cache invalidation of tags {tags} failed: {e}")
+
+
+def drop_all_local() -> None:
+    """Empty the local tier of every cache in this process."""
+    for cache in _caches.values():
+        cache.drop_local()
+
+
+def _on_invalidation(data: bytes) -> None:
+    message = unpack(data)
+    if "tags" in message:
+        _drop_local_tags(message["tags"])
+        return
+    cache = _caches.get(message["namespace"])
+    if cache is not None:
+        cache.drop_local(*message["keys"])
+
+
+async def _follow_start() -> None:
+    # Invalidations missed while not subscribed may have left stale entries
+    drop_all_local()
+    _following.set()
+
+
+def _follow_lost() -> None:
+    _following.clear()
+    drop_all_local()
+
+
+async def sync_cache_invalidations() -> None:
+    """Apply cache invalidations published by other processes, runs for the app's lifetime."""
+    await subscribe_forever(
+        INVALIDATE_CHANNEL,
+        on_message=_on_invalidation,
+        on_connect=_follow_start,
+        on_error=_follow_lost,
+    )
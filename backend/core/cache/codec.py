@@ -0,0 +1,39 @@
+"""
+Wire format of cache entries: msgpack, zlib-compressed when that pays off.
+
+The first byte says how the rest is encoded, so the compression threshold can
+change without invalidating stored entries.
+"""
+
+import zlib
+from typing import Any
+
+import msgpack
+
+RAW = b"\x00"
+ZLIB = b"\x01"
+
+
+def pack(obj: Any, compress_min_bytes: int | None = None) -> bytes:
+    """
+    Encode a msgpack-serializable object.
+    Args:
+        obj (Any): Built-in types only (dict, list, str, bytes, numbers, None).
+        compress_min_bytes (int, optional): Compress encodings at least this long.
+    Returns:
+        bytes: The encoded object.
+    """
+    data = msgpack.packb(obj, use_bin_type=True)
+    if compress_min_bytes is not None and len(data) >= compress_min_bytes:
+        compressed = zlib.compress(data, 1)
+        if len(compressed) < len(data):
+            return ZLIB + compressed
+    return RAW + data
+
+
+def unpack(data: bytes) -> Any:
+    """Decode what pack() produced."""
+    body = data[1:]
+    if data[:1] == ZLIB:
+        body = zlib.decompress(body)
+    return msgpack.unpackb(body, raw=False)
@@ -1,11 +1,70 @@
+import time
+
 from celery import Celery
+from celery.schedules import crontab
 from asgiref.sync import async_to_sync
 
+from core.config import settings
 from utility.logger import get_logger
 
 lg = get_logger(__file__)
 c_app = Celery()
 c_app.config_from_object("core.config")
+c_app.conf.beat_schedule = {
+    "maintain-partitions": {
+        "task": "core.celery_tasks.maintain_partitions",
+        "schedule": crontab(hour=3, minute=0),
+    },
+    "write-back-quota-usage": {
+        "task": "core.celery_tasks.write_back_quota_usage",
+        "schedule": settings.QUOTA_WRITEBACK_SECONDS,
+        "options": {"expires": settings.QUOTA_WRITEBACK_SECONDS},
+    },
+}
+if settings.STRUCTURED_WRITE_BEHIND:
+    c_app.conf.beat_schedule["flush-structured-prompts"] = {
+        "task": "core.celery_tasks.flush_structured_prompts",
+        "schedule": settings.STRUCTURED_FLUSH_INTERVAL_SECONDS,
+        # A missed run is covered by the next one
+        "options": {"expires": settings.STRUCTURED_FLUSH_INTERVAL_SECONDS},
+    }
+
+
+@c_app.task()
+def maintain_partitions():
+    # Imported here so the worker only connects to the database when the job runs
+    from db.partitions import maintain_partitions as run_maintenance
+
+    report = run_maintenance()
+    lg.info(f"Partition maintenance done: {report}")
+    return report
+
+
+@c_app.task()
+def flush_structured_prompts():
+    from db.database import SessionLocal
+    from services.structured_write_behind import StructuredPromptWriteBehind
+
+    write_behind = StructuredPromptWriteBehind()
+    flushed = 0
+    # One schedule interval at most, the next run picks up the rest
+    deadline = time.monotonic() + settings.STRUCTURED_FLUSH_INTERVAL_SECONDS
+    with SessionLocal() as db:
+        # A batch per transaction
+        while time.monotonic() < deadline and (batch := write_behind.flush(db)):
+            flushed += batch
+    return flushed
+
+
+@c_app.task()
+def write_back_quota_usage():
+    from db.database import SessionLocal
+    from services.quota_service import DailyQuotaService
+
+    with SessionLocal() as db:
+        written = DailyQuotaService().write_back(db)
+    lg.info(f"Quota usage written back for {written} users")
+    return written
 
 
 # @c_app.task()
@@ -8,18 +8,92 @@ class Settings(BaseSettings):
     DATABASE_HOSTNAME: str
     DATABASE_PORT: int
     DATABASE_NAME: str
+    # Optional streaming replica for read-only endpoints (same credentials/database name)
+    DATABASE_REPLICA_HOSTNAME: str | None = None
+    DATABASE_REPLICA_PORT: int | None = None
+    REPLICA_MAX_LAG_SECONDS: float = 5.0
+    REPLICA_LAG_CHECK_INTERVAL_SECONDS: float = 5.0
+    # Reads go to the primary for this long after a user writes (read-your-writes)
+    REPLICA_STICKY_SECONDS: int = 10
     VERSION: str
     JWT_SECRET_KEY: str
     JWT_ALGORITHM: str
     JWT_ACCESS_TOKEN_EXPIRE_MINUTES: int
     JWT_REFRESH_TOKEN_EXPIRY_MINUTES: int
+    # Blocklist TTL for tokens without an exp claim (otherwise the remaining lifetime)
     JTI_EXPIRY_SECONDS: int = 3600
+    # Local revocation filter: Bloom filter sizing, recent revocations kept exactly,
+    # and the interval of the full resync from Redis
+    REVOCATION_FILTER_CAPACITY: int = 100_000
+    REVOCATION_FILTER_ERROR_RATE: float = 0.001
+    REVOCATION_EXACT_SIZE: int = 10_000
+    REVOCATION_RESYNC_SECONDS: int = 300
+    # Verified token claims kept in memory until exp (0 disables the cache)
+    JWT_CACHE_MAX_ENTRIES: int = 10_000
+    # Password hashing: bcrypt cost (stored hashes with another cost are rehashed on
+    # login) and the dedicated hashing pool; calls beyond workers + queue are rejected
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_QUEUE: int = 16
     REDIS_HOST: str = "localhost"
     REDIS_PORT: int = 6379
     REDIS_URL: str = "redis://localhost:6379/0"
+    # Shared connection pools (one asyncio, one blocking per process)
+    REDIS_MAX_CONNECTIONS: int = 50
+    # Seconds to wait for a free pooled connection before failing
+    REDIS_POOL_TIMEOUT: float = 2.0
+    REDIS_SOCKET_TIMEOUT: float = 0.5
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30
+    # Bulk import / export
+    IMPORT_MAX_BYTES: int = 50 * 1024 * 1024
+    IMPORT_SPOOL_BYTES: int = 4 * 1024 * 1024
+    IMPORT_MAX_ROWS: int = 100_000
+    IMPORT_CHUNK_ROWS: int = 5_000
+    PROMPT_BATCH_MAX_ITEMS: int = 500
+    # Concurrent LLM requests per process (AI refinements)
+    LLM_MAX_CONCURRENCY: int = 4
+    # Rows per server-side cursor fetch for streamed responses (history, export)
+    STREAM_FETCH_ROWS: int = 1_000
+    # Monthly partitions of prompts/structured_prompts: created this many months ahead,
+    # detached once older than PARTITION_RETENTION_MONTHS (0 keeps everything)
+    PARTITION_MONTHS_AHEAD: int = 3
+    PARTITION_RETENTION_MONTHS: int = 0
+    # Drop detached partitions instead of keeping them around for archiving
+    PARTITION_DROP_DETACHED: bool = False
+    # Structured prompts are queued in Redis and batch-inserted by the worker
+    STRUCTURED_WRITE_BEHIND: bool = False
+    # Flush schedule, also the longest a single flush run keeps draining
+    STRUCTURED_FLUSH_INTERVAL_SECONDS: float = 2.0
+    STRUCTURED_FLUSH_BATCH_ROWS: int = 500
+    # Unacknowledged entries older than this are redelivered to another flush
+    STRUCTURED_FLUSH_CLAIM_IDLE_MS: int = 60_000
+    # Entries delivered this many times without being flushed go to the dead-letter stream
+    STRUCTURED_FLUSH_MAX_DELIVERIES: int = 5
+    # User profile cache: local LRU (only trusted for a short while) and Redis tier
+    USER_CACHE_LOCAL_MAX_ENTRIES: int = 10_000
+    USER_CACHE_LOCAL_TTL_SECONDS: float = 30.0
+    USER_CACHE_TTL_SECONDS: int = 3600
+    # core.cache: Redis entries are compressed from this size, higher beta refreshes earlier
+    CACHE_COMPRESS_MIN_BYTES: int = 1024
+    CACHE_EARLY_REFRESH_BETA: float = 1.0
+    CACHE_COALESCE_WAIT_SECONDS: float = 5.0
+    PROMPT_CACHE_TTL_SECONDS: int = 600
+    # How long a request waits for a response another request is building
+    PROMPT_CACHE_WAIT_MS: int = 1000
+    # Lifetime of a user's prompt version (the ETag), renewed on every change
+    PROMPT_VERSION_TTL_SECONDS: int = 86400
+    # Shared caches may serve public library responses this long
+    PUBLIC_LIBRARY_MAX_AGE_SECONDS: int = 60
+    # Interval of the write-back of Redis quota usage to users.tokens_used_today
+    QUOTA_WRITEBACK_SECONDS: float = 60.0
     GOOGLE_CLIENT_ID: str
     GOOGLE_CLIENT_SECRET: str
     GOOGLE_REDIRECT_URI: str
+    GOOGLE_AUTH_URI: str = "https://accounts.google.com/o/oauth2/auth"
+    GOOGLE_TOKEN_URI: str = "https://oauth2.googleapis.com/token"
+    GOOGLE_CERTS_URL: str = "https://www.googleapis.com/oauth2/v1/certs"
+    GOOGLE_HTTP_POOL_SIZE: int = 10
+    GOOGLE_HTTP_TIMEOUT_SECONDS: float = 10.0
 
     class Config:
         # Construct absolute path to .env file in the backend root directory
@@ -24,7 +24,8 @@ class PromptCrafterException(Exception):
 
 class PromptNotModified(PromptCrafterException):
     """
-    Exception raised when a prompt modification request does not result in any changes."""
+    Exception raised when a prompt modification request does not result in any changes.
+    """
 
     pass
 
@@ -128,6 +129,34 @@ class RateLimitExceeded(PromptCrafterException):
     pass
 
 
+class InvalidCursor(PromptCrafterException):
+    """
+    Exception raised when a pagination cursor cannot be decoded."""
+
+    pass
+
+
+class ImportTooLarge(PromptCrafterException):
+    """
+    Exception raised when a bulk import body exceeds the configured size limit."""
+
+    pass
+
+
+class PromptBatchTooLarge(PromptCrafterException):
+    """
+    Exception raised when a prompt batch has more items than the configured limit."""
+
+    pass
+
+
+class PasswordHashingBusy(PromptCrafterException):
+    """
+    Exception raised when the password hashing pool has no free slot."""
+
+    pass
+
+
 def create_exception_handler(
     status_code: int, initial_detail: any
 ) -> Callable[[Request, Exception], JSONResponse]:
@@ -320,6 +349,54 @@ def register_all_errors(app: FastAPI):
         ),
     )
 
+    app.add_exception_handler(
+        InvalidCursor,
+        create_exception_handler(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            initial_detail={
+                "message": "Invalid pagination cursor.",
+                "error_code": "invalid_cursor",
+                "resolution": "Use the 'next_cursor' value returned by the previous page, or omit it to start from the first page.",
+            },
+        ),
+    )
+
+    app.add_exception_handler(
+        ImportTooLarge,
+        create_exception_handler(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            initial_detail={
+                "message": "Import file too large.",
+                "error_code": "import_too_large",
+                "resolution": "Split the file into smaller parts and import them one by one.",
+            },
+        ),
+    )
+
+    app.add_exception_handler(
+        PromptBatchTooLarge,
+        create_exception_handler(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            initial_detail={
+                "message": "Too many prompts in one batch.",
+                "error_code": "prompt_batch_too_large",
+                "resolution": "Split the prompts into batches of at most PROMPT_BATCH_MAX_ITEMS items.",
+            },
+        ),
+    )
+
+    app.add_exception_handler(
+        PasswordHashingBusy,
+        create_exception_handler(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            initial_detail={
+                "message": "Too many login attempts in progress.",
+                "error_code": "password_hashing_busy",
+                "resolution": "Please try again in a few seconds.",
+            },
+        ),
+    )
+
     app.add_exception_handler(Exception, global_exception_handler)
 
     @app.exception_handler(500)
@@ -1,4 +1,5 @@
 import re
+import hashlib
 
 
 def clean_json_block(text: str) -> str:
@@ -15,3 +16,20 @@ def clean_json_block(text: str) -> str:
     # Remove ``` at the end
     text = re.sub(r"\s*```$", "", text)
     return text.strip()
+
+
+def normalize_text(text: str | None) -> str:
+    """
+    Normalizes free text for content comparison: casefolded, whitespace collapsed.
+    Example: "  Write  a\nPoem " becomes "write a poem"
+    """
+    return " ".join((text or "").split()).casefold()
+
+
+def content_hash(*parts: str | None) -> bytes:
+    """
+    SHA-256 digest of the normalized parts, used to spot resubmitted content.
+    Parts are separated by a unit separator so ("ab", "c") and ("a", "bc") differ.
+    """
+    normalized = "\x1f".join(normalize_text(part) for part in parts)
+    return hashlib.sha256(normalized.encode("utf-8")).digest()
@@ -0,0 +1,31 @@
+"""
+HTTP caching helpers: Cache-Control values and If-None-Match evaluation.
+"""
+
+from core.config import settings
+
+# Per-user responses: browsers may keep them but must revalidate (ETag) every time
+PRIVATE_REVALIDATE = "private, no-cache"
+
+
+def public_library_cache_control() -> str:
+    """Cache-Control of responses that are the same for every user (public library)."""
+    return f"public, max-age={settings.PUBLIC_LIBRARY_MAX_AGE_SECONDS}"
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Whether an If-None-Match header matches an ETag (weak comparison, RFC 9110 13.1.2).
+    Args:
+        if_none_match (str | None): The header value, e.g. '"a", W/"b"' or '*'.
+        etag (str): The current quoted ETag.
+    Returns:
+        bool: True if the client's copy is current (answer 304).
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(",")
+    )
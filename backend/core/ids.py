@@ -0,0 +1,29 @@
+import os
+import time
+import uuid
+
+
+def uuid7() -> uuid.UUID:
+    """
+    Generate a time-ordered UUID (version 7, RFC 9562).
+
+    The first 48 bits are the Unix time in milliseconds and the rest is random, so
+    new keys land at the right-hand edge of the primary key btree instead of at
+    random pages like uuid4, which keeps inserts cache friendly and indexes compact.
+
+    Returns:
+        uuid.UUID: A new version 7 UUID.
+    """
+    unix_ms = time.time_ns() // 1_000_000
+    rand = int.from_bytes(os.urandom(10), "big")
+    value = (unix_ms & 0xFFFF_FFFF_FFFF) << 80
+    value |= 0x7 << 76  # version
+    value |= ((rand >> 62) & 0xFFF) << 64  # rand_a
+    value |= 0b10 << 62  # variant
+    value |= rand & 0x3FFF_FFFF_FFFF_FFFF  # rand_b
+    return uuid.UUID(int=value)
+
+
+def new_id() -> str:
+    """Generate a new primary key, as the string the app passes around."""
+    return str(uuid7())
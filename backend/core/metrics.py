@@ -0,0 +1,110 @@
+"""
+Application metrics exported on /metrics next to the HTTP metrics of the
+prometheus_fastapi_instrumentator. Every custom metric lives here so the
+names stay consistent and nothing is registered twice.
+"""
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# --- Database routing ---
+DB_READ_ROUTE = Counter(
+    "promptcrafter_db_read_route_total",
+    "Read-only sessions by the engine they were routed to.",
+    ["target", "reason"],
+)
+DB_REPLICA_LAG_SECONDS = Gauge(
+    "promptcrafter_db_replica_lag_seconds",
+    "Replication lag of the read replica, -1 when it is unreachable.",
+)
+
+# --- Redis ---
+REDIS_COMMAND_SECONDS = Histogram(
+    "promptcrafter_redis_command_seconds",
+    "Latency of Redis commands by command name (PIPELINE for a whole pipeline).",
+    ["command"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5),
+)
+
+# --- Structured prompt write-behind ---
+WRITE_BEHIND_ENQUEUED = Counter(
+    "promptcrafter_write_behind_enqueued_total",
+    "Structured prompts handed to the write-behind stream, or saved synchronously when Redis was unavailable.",
+    ["result"],
+)
+WRITE_BEHIND_FLUSHED = Counter(
+    "promptcrafter_write_behind_flushed_total",
+    "Structured prompts flushed to the database by outcome (inserted, duplicate, replayed, dead_letter).",
+    ["outcome"],
+)
+WRITE_BEHIND_BACKLOG = Gauge(
+    "promptcrafter_write_behind_backlog",
+    "Structured prompts waiting in the write-behind stream after the last flush.",
+)
+WRITE_BEHIND_LAG_SECONDS = Histogram(
+    "promptcrafter_write_behind_lag_seconds",
+    "Time from enqueue to database commit of write-behind structured prompts.",
+    buckets=(0.1, 0.5, 1, 2, 5, 10, 30, 60, 300),
+)
+
+# --- Authentication ---
+JWT_CACHE_LOOKUPS = Counter(
+    "promptcrafter_jwt_cache_lookups_total",
+    "Verified-JWT cache lookups by result (hit, miss).",
+    ["result"],
+)
+JWT_CACHE_SIZE = Gauge(
+    "promptcrafter_jwt_cache_entries",
+    "Verified tokens held in the in-process JWT cache.",
+)
+REVOCATION_CHECKS = Counter(
+    "promptcrafter_revocation_checks_total",
+    "JWT blocklist checks by where they were answered (filter, redis).",
+    ["source"],
+)
+CACHE_LOOKUPS = Counter(
+    "promptcrafter_cache_lookups_total",
+    "core.cache lookups by outcome (local_hit, redis_hit, early_refresh, miss, coalesced, waited).",
+    ["namespace", "result"],
+)
+
+CACHE_LOCAL_ENTRIES = Gauge(
+    "promptcrafter_cache_local_entries",
+    "Entries in the in-process tier of core.cache.",
+    ["namespace"],
+)
+
+CACHE_VALUE_BYTES = Histogram(
+    "promptcrafter_cache_value_bytes",
+    "Size of entries written to the Redis tier of core.cache, after compression.",
+    ["namespace"],
+    buckets=(64, 256, 1024, 4096, 16384, 65536, 262144, 1048576),
+)
+
+# --- Daily quota ---
+QUOTA_CHECKS = Counter(
+    "promptcrafter_quota_checks_total",
+    "Daily token quota checks by result (allowed, exceeded, fallback to the database).",
+    ["result"],
+)
+GOOGLE_OAUTH_REQUEST_SECONDS = Histogram(
+    "promptcrafter_google_oauth_request_seconds",
+    "Latency of requests to Google during OAuth login (token exchange, certs).",
+    ["endpoint"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10),
+)
+
+# --- Password hashing ---
+PASSWORD_HASH_SECONDS = Histogram(
+    "promptcrafter_password_hash_seconds",
+    "Time spent in bcrypt by operation (hash, verify).",
+    ["op"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5),
+)
+PASSWORD_HASH_QUEUE_DEPTH = Gauge(
+    "promptcrafter_password_hash_queue_depth",
+    "bcrypt calls running or waiting in the password hashing pool.",
+)
+PASSWORD_HASH_REJECTED = Counter(
+    "promptcrafter_password_hash_rejected_total",
+    "bcrypt calls rejected because the password hashing pool was full.",
+)
@@ -1,7 +1,9 @@
 import os
 import json
+import threading
 import requests
 from dotenv import load_dotenv
+from .config import settings
 from .formatters import clean_json_block
 
 # Load environment variables
@@ -20,6 +22,8 @@ result = {"object":"list","data":[{"id":"mistral:7b","object":"model","created":
 OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://127.0.0.1:5000")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "phi3:mini")
 OLLAMA_TIMEOUT = int(os.getenv("OLLAMA_TIMEOUT", 60))  # seconds
+# Chat completions in flight per process, the model server queues the rest anyway
+_llm_slots = threading.BoundedSemaphore(settings.LLM_MAX_CONCURRENCY)
 
 
 class OllamaClient:
@@ -60,13 +64,14 @@ class OllamaClient:
             # Check if streaming is requested
             stream = payload.get("stream", False)
 
-            r = requests.post(url, json=payload, timeout=self.timeout, stream=stream)
-            r.raise_for_status()
-
-            if stream:
-                return self._parse_streaming_response(r)
-            else:
-                return r.json()
+            with _llm_slots:
+                r = requests.post(
+                    url, json=payload, timeout=self.timeout, stream=stream
+                )
+                r.raise_for_status()
+                if not stream:
+                    return r.json()
+            return self._parse_streaming_response(r)
         except requests.RequestException as e:
             return {"error": str(e)}
 
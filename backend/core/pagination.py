@@ -0,0 +1,135 @@
+"""
+Keyset (cursor) pagination helpers.
+
+Cursors are opaque to clients: they are url-safe base64 encoded JSON holding the
+sort key of the last row on the previous page, e.g. (created_at, prompt_id).
+The next page is fetched with a "seek" predicate on the composite index instead
+of an OFFSET, so page cost does not grow with the number of rows a user has.
+"""
+
+import base64
+import json
+import uuid
+from datetime import datetime
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query
+
+from core.custom_error_handlers import InvalidCursor
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def _encode(payload: dict) -> str:
+    raw = json.dumps(payload, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode(cursor: str) -> dict:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(data, dict):
+            raise ValueError("cursor payload must be an object")
+        return data
+    except Exception:
+        raise InvalidCursor()
+
+
+def encode_cursor(created_at: datetime, row_id: str) -> str:
+    """
+    Encode the sort key of the last row of a page into an opaque cursor token.
+    Args:
+        created_at (datetime): The created_at value of the last row.
+        row_id (str): The primary key of the last row (tie breaker).
+    Returns:
+        str: The url-safe cursor token.
+    """
+    return _encode({"c": created_at.isoformat(), "id": str(row_id)})
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    """
+    Decode a cursor token back into its (created_at, row_id) sort key.
+    Args:
+        cursor (str): The token previously returned by encode_cursor.
+    Returns:
+        tuple[datetime, str]: The sort key of the last row of the previous page.
+    Raises:
+        InvalidCursor: If the token is malformed or was tampered with.
+    """
+    data = _decode(cursor)
+    try:
+        # A row id that is not a UUID would only fail later, in the database
+        return datetime.fromisoformat(data["c"]), str(uuid.UUID(data["id"]))
+    except Exception:
+        raise InvalidCursor()
+
+
+def encode_rank_cursor(rank: float, row_id: str) -> str:
+    """
+    Encode the (rank, row_id) sort key of the last row of a ranked search page.
+    Args:
+        rank (float): The relevance score of the last row.
+        row_id (str): The primary key of the last row (tie breaker).
+    Returns:
+        str: The url-safe cursor token.
+    """
+    return _encode({"r": float(rank), "id": str(row_id)})
+
+
+def decode_rank_cursor(cursor: str) -> tuple[float, str]:
+    """
+    Decode a ranked search cursor back into its (rank, row_id) sort key.
+    Args:
+        cursor (str): The token previously returned by encode_rank_cursor.
+    Returns:
+        tuple[float, str]: The sort key of the last row of the previous page.
+    Raises:
+        InvalidCursor: If the token is malformed or was tampered with.
+    """
+    data = _decode(cursor)
+    try:
+        return float(data["r"]), str(uuid.UUID(data["id"]))
+    except Exception:
+        raise InvalidCursor()
+
+
+def paginate_newest_first(
+    query: Query, created_at_column, id_column, cursor: str | None, limit: int
+) -> tuple[list, str | None]:
+    """
+    Apply created_at DESC, id DESC keyset pagination to an ORM query and run it.
+
+    One extra row is fetched to know whether there is a next page, so a page is
+    always a single index range scan, whatever the page number.
+
+    Args:
+        query (Query): The filtered ORM query of the entity to page through.
+        created_at_column: The entity's created_at column.
+        id_column: The entity's primary key column (tie breaker).
+        cursor (str, optional): The 'next_cursor' token of the previous page.
+        limit (int): Maximum number of rows to return.
+    Returns:
+        tuple[list, str | None]: The rows and the cursor of the next page (None on the last page).
+    """
+    if cursor:
+        last_created_at, last_id = decode_cursor(cursor)
+        query = query.filter(
+            tuple_(created_at_column, id_column) < tuple_(last_created_at, last_id)
+        )
+
+    rows = (
+        query.order_by(created_at_column.desc(), id_column.desc())
+        .limit(limit + 1)
+        .all()
+    )
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(
+            getattr(last, created_at_column.key), getattr(last, id_column.key)
+        )
+    return rows, next_cursor
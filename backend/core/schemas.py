@@ -23,6 +23,8 @@ class PromptSchema(BaseModel):
     tags: List[str] = []
     constraints: Optional[str] = None
     personality: Optional[str] = None
+    # shared in the public prompt library
+    is_public: bool = False
 
     class Config:
         from_attributes = True
@@ -39,13 +41,64 @@ class PromptSchemaOutput(BaseModel):
         from_attributes = True
 
 
+class PromptPageSchema(BaseModel):
+    # one page of prompt history, pass 'next_cursor' back to get the next page
+    items: List[PromptSchema]
+    next_cursor: Optional[str] = None
+
+
+class PromptImportResultSchema(BaseModel):
+    # summary of a bulk import, 'errors' only holds the first rejected rows;
+    # 'deduplicated' rows reused a prompt the author already had
+    imported: int
+    deduplicated: int = 0
+    rejected: int
+    errors: List[str] = []
+
+
+class PromptBatchItemSchema(BaseModel):
+    # outcome of one item of POST /pcrafter/batch, either result or error is set
+    index: int
+    result: Optional[PromptSchemaOutput] = None
+    error: Optional[str] = None
+
+
+class PromptBatchResultSchema(BaseModel):
+    # one entry per submitted item, in submission order
+    items: List[PromptBatchItemSchema]
+
+
+class TagCountSchema(BaseModel):
+    # one tag facet of the public library
+    tag: str
+    count: int
+
+
+class StructuredPromptSchema(BaseModel):
+    # a stored refinement of one of the user's prompts
+    prompt_id: uuid.UUID
+    structured_prompt: Optional[str] = None
+    natural_prompt: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
 class UserPromptsSchema(PromptSchema):
-    st_prompts: List[PromptSchema]
+    # a prompt together with its refinement (null if it was never refined)
+    structured_version: Optional[StructuredPromptSchema] = None
 
     class Config:
         from_attributes = True
 
 
+class UserPromptsPageSchema(BaseModel):
+    # one page of the combined history, pass 'next_cursor' back to get the next page
+    items: List[UserPromptsSchema]
+    next_cursor: Optional[str] = None
+
+
 class UserCreateSchema(BaseModel):
     email: str
     password: str
@@ -67,6 +120,15 @@ class UserOutSchema(BaseModel):
         from_attributes = True
 
 
+class UserProfileSchema(UserOutSchema):
+    """User metadata kept in the profile cache (no credentials)."""
+
+    # A string like everywhere else in the app, only the API output is a UUID
+    user_id: str
+    username: str
+    daily_token_limit: int
+
+
 class UserSignupResponse(BaseModel):
     message: str
     user: UserOutSchema
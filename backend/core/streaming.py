@@ -0,0 +1,63 @@
+"""
+Streaming serialization of query results.
+
+Rows are read through a server-side cursor (stream_results + yield_per), so the
+driver never buffers the whole result set, and every fetched partition is
+serialized and handed to the response straight away. Peak memory is bounded by
+one partition and the first bytes leave as soon as the first partition arrives.
+"""
+
+import io
+import json
+import uuid
+from datetime import datetime
+from typing import Callable, Iterator
+
+from sqlalchemy import Row, Select
+from sqlalchemy.orm import Session
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def iter_partitions(
+    db: Session, statement: Select, fetch_rows: int
+) -> Iterator[list[Row]]:
+    """Execute a Core select on a server-side cursor and yield it fetch_rows rows at a time."""
+    statement = statement.execution_options(stream_results=True, yield_per=fetch_rows)
+    yield from db.execute(statement).partitions()
+
+
+def iter_ndjson(
+    db: Session,
+    statement: Select,
+    fetch_rows: int,
+    serialize: Callable[[Row], dict] = lambda row: row._asdict(),
+) -> Iterator[str]:
+    """
+    Stream the rows of a select as NDJSON, one chunk per fetched partition.
+    Args:
+        db (Session): SQLAlchemy database session.
+        statement (Select): The Core select to stream.
+        fetch_rows (int): Rows fetched from the server-side cursor per round trip.
+        serialize (Callable, optional): Turns a row into a JSON-able dict.
+    Yields:
+        str: Newline delimited JSON documents.
+    """
+    buffer = io.StringIO()
+    for partition in iter_partitions(db, statement, fetch_rows):
+        for row in partition:
+            buffer.write(
+                json.dumps(serialize(row), ensure_ascii=False, default=_json_default)
+            )
+            buffer.write("\n")
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
@@ -1,8 +1,14 @@
-from sqlalchemy import create_engine
+import time
+from threading import Lock
+
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.sql import Select
 
 from core.config import settings
+from core.metrics import DB_READ_ROUTE, DB_REPLICA_LAG_SECONDS
+from db.redis import get_sync_redis
 from utility.logger import get_logger
 
 lg = get_logger(__file__)
@@ -26,7 +32,43 @@ except Exception as e:
     # We might want to re-raise here if the app cannot function without DB
     raise e
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Optional read replica. Unlike the primary, the app keeps working without it.
+replica_engine = None
+if settings.DATABASE_REPLICA_HOSTNAME:
+    SQLALCHEMY_REPLICA_URL = f"postgresql://{settings.DATABASE_USERNAME}:{settings.DATABASE_PASSWORD}@{settings.DATABASE_REPLICA_HOSTNAME}:{settings.DATABASE_REPLICA_PORT or settings.DATABASE_PORT}/{settings.DATABASE_NAME}"
+    try:
+        lg.info(
+            f"Connecting to read replica at {settings.DATABASE_REPLICA_HOSTNAME}..."
+        )
+        replica_engine = create_engine(SQLALCHEMY_REPLICA_URL, pool_pre_ping=True)
+        with replica_engine.connect() as connection:
+            lg.info("Successfully connected to the PostgreSQL read replica!")
+    except Exception as e:
+        lg.error(f"Read replica unavailable, all reads will use the primary: {e}")
+        replica_engine = None
+
+
+class RoutingSession(Session):
+    """
+    Session that sends SELECTs to the read replica when the session was opened
+    for a read-only request (info["use_replica"]), and everything else, including
+    every flush, to the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if (
+            replica_engine is not None
+            and self.info.get("use_replica")
+            and not self._flushing
+            and isinstance(clause, Select)
+        ):
+            return replica_engine
+        return engine
+
+
+SessionLocal = sessionmaker(
+    class_=RoutingSession, autocommit=False, autoflush=False, bind=engine
+)
 Base = declarative_base()
 
 
@@ -40,3 +82,123 @@ def get_db():
         raise e
     finally:
         db.close()
+
+
+# --- Read replica routing ---
+
+_lag_lock = Lock()
+_lag_checked_at: float = 0.0
+_replica_healthy: bool = False
+
+REPLICA_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+def replica_is_healthy() -> bool:
+    """
+    Check whether the replica is reachable and within REPLICA_MAX_LAG_SECONDS.
+    The lag query runs at most once per REPLICA_LAG_CHECK_INTERVAL_SECONDS per process.
+    Returns:
+        bool: True if reads can be served by the replica.
+    """
+    global _lag_checked_at, _replica_healthy
+    if replica_engine is None:
+        return False
+
+    now = time.monotonic()
+    if now - _lag_checked_at < settings.REPLICA_LAG_CHECK_INTERVAL_SECONDS:
+        return _replica_healthy
+
+    with _lag_lock:
+        if now - _lag_checked_at < settings.REPLICA_LAG_CHECK_INTERVAL_SECONDS:
+            return _replica_healthy
+        try:
+            with replica_engine.connect() as connection:
+                lag = float(connection.execute(REPLICA_LAG_SQL).scalar() or 0)
+            DB_REPLICA_LAG_SECONDS.set(lag)
+            _replica_healthy = lag <= settings.REPLICA_MAX_LAG_SECONDS
+            if not _replica_healthy:
+                lg.warning(
+                    f"Read replica is {lag:.1f}s behind, falling back to primary"
+                )
+        except Exception as e:
+            DB_REPLICA_LAG_SECONDS.set(-1)
+            _replica_healthy = False
+            lg.error(f"Read replica lag check failed: {e}")
+        _lag_checked_at = now
+        return _replica_healthy
+
+
+def mark_recent_write(user_id: str) -> None:
+    """Pin a user's reads to the primary for REPLICA_STICKY_SECONDS (shared by all workers)."""
+    if replica_engine is None or not user_id:
+        return
+    try:
+        get_sync_redis().set(
+            f"rw_sticky:{user_id}", 1, ex=settings.REPLICA_STICKY_SECONDS
+        )
+    except Exception as e:
+        lg.error(f"Could not record recent write for user {user_id}: {e}")
+
+
+def wrote_recently(user_id: str) -> bool:
+    """Check whether a user wrote within the read-your-writes window."""
+    try:
+        return bool(get_sync_redis().exists(f"rw_sticky:{user_id}"))
+    except Exception as e:
+        # Unknown, so be safe and read from the primary
+        lg.error(f"Could not check recent writes for user {user_id}: {e}")
+        return True
+
+
+def mark_written(db: Session, user_id: str) -> None:
+    """Pin a user to the primary on commit, for writes that bypass the ORM (COPY, Core INSERT)."""
+    db.info.setdefault("written_users", set()).add(str(user_id))
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _collect_written_users(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        user_id = getattr(obj, "author_id", None) or getattr(obj, "user_id", None)
+        if user_id:
+            mark_written(session, user_id)
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _pin_written_users(session):
+    for user_id in session.info.pop("written_users", ()):
+        mark_recent_write(user_id)
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _forget_written_users(session):
+    session.info.pop("written_users", None)
+
+
+def route_reads(db: Session, user_id: str) -> Session:
+    """
+    Send the session's SELECTs to the read replica, for read-only requests.
+
+    Stays on the primary when there is no healthy replica or the user wrote
+    something within the last REPLICA_STICKY_SECONDS.
+    """
+    if replica_engine is None:
+        return db
+    if not replica_is_healthy():
+        DB_READ_ROUTE.labels(target="primary", reason="replica_unhealthy").inc()
+    elif wrote_recently(user_id):
+        DB_READ_ROUTE.labels(target="primary", reason="recent_write").inc()
+    else:
+        DB_READ_ROUTE.labels(target="replica", reason="read_only").inc()
+        db.info["use_replica"] = True
+    return db
+    if not replica_is_healthy():
+        DB_READ_ROUTE.labels(target="primary", reason="replica_unhealthy").inc()
+    elif wrote_recently(current_user.user_id):
+        DB_READ_ROUTE.labels(target="primary", reason="recent_write").inc()
+    else:
+        DB_READ_ROUTE.labels(target="replica", reason="read_only").inc()
+        db.info["use_replica"] = True
+    return db
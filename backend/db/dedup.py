@@ -0,0 +1,97 @@
+"""
+Content-hash deduplication for prompts and structured prompts.
+
+Both tables are partitioned on created_at, so a unique index on
+(author_id, content_hash) is not possible (it would have to include created_at).
+Instead, writers of the same author and content are serialized with a
+transaction-scoped advisory lock, then look the content up through the
+(author_id, content_hash) index before inserting.
+"""
+
+import hashlib
+from collections import Counter
+from typing import Iterable
+
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session
+
+
+def _lock_key(table: str, author_id: str, digest: bytes) -> int:
+    material = f"{table}:{author_id}:".encode("utf-8") + digest
+    return int.from_bytes(hashlib.sha256(material).digest()[:8], "big", signed=True)
+
+
+def lock_contents(db: Session, model, contents: Iterable[tuple[str, bytes]]) -> None:
+    """
+    Lock every (author_id, digest) until the end of the transaction, in a fixed
+    order so concurrent writers cannot deadlock.
+    Args:
+        db (Session): SQLAlchemy database session.
+        model: Prompts or StructuredPrompts.
+        contents (Iterable[tuple[str, bytes]]): (author_id, content hash) pairs.
+    """
+    keys = sorted({_lock_key(model.__tablename__, a, d) for a, d in contents})
+    db.execute(
+        text("SELECT pg_advisory_xact_lock(k) FROM unnest(CAST(:keys AS bigint[])) k"),
+        {"keys": keys},
+    )
+
+
+def claim_duplicate(db: Session, model, author_id: str, digest: bytes):
+    """
+    Lock (author_id, digest) until the end of the transaction and return the existing
+    row with that content, with its use_count and last_used_at bumped.
+    Args:
+        db (Session): SQLAlchemy database session.
+        model: Prompts or StructuredPrompts.
+        author_id (str): The ID of the author.
+        digest (bytes): The content hash of the new row.
+    Returns:
+        The existing row, or None if the content is new (the caller inserts it
+        before committing, still holding the lock).
+    """
+    db.execute(
+        select(
+            func.pg_advisory_xact_lock(
+                _lock_key(model.__tablename__, author_id, digest)
+            )
+        )
+    )
+    existing = (
+        db.query(model)
+        .filter(model.author_id == author_id, model.content_hash == digest)
+        .order_by(model.created_at)
+        .first()
+    )
+    if existing is not None:
+        existing.use_count = model.use_count + 1
+        existing.last_used_at = func.now()
+    return existing
+
+
+def claim_duplicates(db: Session, model, author_id: str, digests: list[bytes]) -> dict:
+    """
+    claim_duplicate for a batch of one author's rows: lock them all with
+    lock_contents and look them up with one query.
+    Args:
+        db (Session): SQLAlchemy database session.
+        model: Prompts or StructuredPrompts.
+        author_id (str): The ID of the author.
+        digests (list[bytes]): The content hashes of the new rows, repeats allowed.
+    Returns:
+        dict: digest -> existing row, bumped once per occurrence in digests. Missing
+        digests are new content (the caller inserts them before committing).
+    """
+    lock_contents(db, model, ((author_id, d) for d in digests))
+    existing = {}
+    for row in (
+        db.query(model)
+        .filter(model.author_id == author_id, model.content_hash.in_(set(digests)))
+        .order_by(model.created_at)
+    ):
+        existing.setdefault(row.content_hash, row)
+    uses = Counter(digests)
+    for digest, row in existing.items():
+        row.use_count = model.use_count + uses[digest]
+        row.last_used_at = func.now()
+    return existing
@@ -0,0 +1,135 @@
+"""
+Before/after benchmark for the prompts index overhaul (migration d7e2b4c81f36).
+
+Builds two scratch copies of the prompts table inside a transaction that is
+rolled back at the end, one with the old index set (btrees on title/role/task
+and a duplicate prompt_id index) and one with the new set (author keyset index
+and BRIN on created_at), then measures bulk insert time and the latency of the
+queries the application actually runs.
+
+Usage: python db/index_benchmark.py [rows] [authors]
+"""
+
+import sys
+import os
+import time
+import uuid
+import random
+from datetime import datetime, timedelta, timezone
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+from db.database import engine
+from utility.logger import get_logger
+
+lg = get_logger(__file__)
+
+TABLE_DDL = """
+CREATE TABLE {table} (
+    prompt_id VARCHAR PRIMARY KEY,
+    title VARCHAR, role VARCHAR, task VARCHAR, constraints VARCHAR,
+    output VARCHAR, personality VARCHAR,
+    created_at TIMESTAMPTZ DEFAULT now(),
+    tags VARCHAR[],
+    author_id VARCHAR
+)
+"""
+
+INDEX_SETS = {
+    "before": [
+        "CREATE INDEX ON {table} (prompt_id)",
+        "CREATE INDEX ON {table} (title)",
+        "CREATE INDEX ON {table} (role)",
+        "CREATE INDEX ON {table} (task)",
+    ],
+    "after": [
+        "CREATE INDEX ON {table} (author_id, created_at DESC, prompt_id DESC)",
+        "CREATE INDEX ON {table} USING brin (created_at)",
+    ],
+}
+
+QUERIES = {
+    "history_page": "SELECT * FROM {table} WHERE author_id = :author "
+    "ORDER BY created_at DESC, prompt_id DESC LIMIT 20",
+    "last_day_count": "SELECT count(*) FROM {table} WHERE created_at >= :since",
+}
+
+
+def make_rows(rows: int, authors: int) -> tuple[list[dict], list[str]]:
+    author_ids = [str(uuid.uuid4()) for _ in range(authors)]
+    start = datetime.now(timezone.utc) - timedelta(days=365)
+    step = timedelta(days=365) / max(rows, 1)
+    words = "role task constraint output personality refine explain build".split()
+    return [
+        {
+            "prompt_id": str(uuid.uuid4()),
+            "title": " ".join(random.choices(words, k=4)),
+            "role": " ".join(random.choices(words, k=3)),
+            "task": " ".join(random.choices(words, k=12)),
+            "created_at": start + step * i,
+            "author_id": random.choice(author_ids),
+        }
+        for i in range(rows)
+    ], author_ids
+
+
+def run_benchmark(rows: int = 100_000, authors: int = 100, repeats: int = 50):
+    data, author_ids = make_rows(rows, authors)
+    insert_sql = (
+        "INSERT INTO {table} (prompt_id, title, role, task, created_at, author_id) "
+        "VALUES (:prompt_id, :title, :role, :task, :created_at, :author_id)"
+    )
+    results = {}
+
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            for label, index_ddl in INDEX_SETS.items():
+                table = f"bench_prompts_{label}"
+                conn.execute(text(TABLE_DDL.format(table=table)))
+                for ddl in index_ddl:
+                    conn.execute(text(ddl.format(table=table)))
+
+                started = time.perf_counter()
+                conn.execute(text(insert_sql.format(table=table)), data)
+                insert_seconds = time.perf_counter() - started
+                conn.execute(text(f"ANALYZE {table}"))
+
+                timings = {}
+                for name, sql in QUERIES.items():
+                    params = {
+                        "author": random.choice(author_ids),
+                        "since": datetime.now(timezone.utc) - timedelta(days=1),
+                    }
+                    started = time.perf_counter()
+                    for _ in range(repeats):
+                        conn.execute(text(sql.format(table=table)), params).fetchall()
+                    timings[name] = (time.perf_counter() - started) / repeats * 1000
+
+                size = conn.execute(text(f"SELECT pg_indexes_size('{table}')")).scalar()
+                results[label] = {
+                    "insert_rows_per_s": rows / insert_seconds,
+                    "index_mb": size / 1024 / 1024,
+                    **{f"{name}_ms": ms for name, ms in timings.items()},
+                }
+        finally:
+            # Scratch tables never outlive the benchmark
+            trans.rollback()
+
+    return results
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    authors = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    results = run_benchmark(rows=rows, authors=authors)
+    metrics = list(next(iter(results.values())).keys())
+    print(f"{'metric':<24}" + "".join(f"{label:>14}" for label in results))
+    for metric in metrics:
+        print(
+            f"{metric:<24}"
+            + "".join(f"{results[label][metric]:>14.2f}" for label in results)
+        )
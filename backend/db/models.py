@@ -1,12 +1,66 @@
-from sqlalchemy import Column, String, ForeignKey, TIMESTAMP, Boolean, Integer, Date
+from sqlalchemy import (
+    Column,
+    String,
+    ForeignKey,
+    TIMESTAMP,
+    Boolean,
+    Integer,
+    Date,
+    Index,
+    Computed,
+    LargeBinary,
+    DDL,
+    event,
+)
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql.sqltypes import DateTime
 from sqlalchemy.sql.expression import text
 from sqlalchemy.sql import func
 from sqlalchemy.ext.mutable import MutableList
-from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR, UUID
 
 from db.database import Base
+from core.ids import new_id
+
+# Native 16-byte uuid in Postgres, plain str in Python
+UUIDString = UUID(as_uuid=False)
+
+# Weighted full-text document for library search: title > role/task > constraints
+PROMPT_SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(role, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(task, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(constraints, '')), 'C')"
+)
+
+# The trigram index on prompts.title needs pg_trgm before the tables are created
+event.listen(
+    Base.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+)
+
+# Keeps tag_counts in step with the public prompts, so tag facets never need an
+# unnest() over the whole prompts table at request time.
+TAG_COUNTS_SYNC_FUNCTION = """
+CREATE OR REPLACE FUNCTION prompts_tag_counts_sync() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.is_public AND OLD.tags IS NOT NULL THEN
+        UPDATE tag_counts SET prompt_count = prompt_count - 1
+        WHERE tag IN (SELECT DISTINCT unnest(OLD.tags));
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.is_public AND NEW.tags IS NOT NULL THEN
+        INSERT INTO tag_counts (tag, prompt_count)
+        SELECT DISTINCT unnest(NEW.tags), 1
+        ON CONFLICT (tag) DO UPDATE SET prompt_count = tag_counts.prompt_count + 1;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+TAG_COUNTS_SYNC_TRIGGER = """
+CREATE TRIGGER prompts_tag_counts_sync
+AFTER INSERT OR DELETE OR UPDATE OF tags, is_public ON prompts
+FOR EACH ROW EXECUTE FUNCTION prompts_tag_counts_sync()
+"""
 
 
 class Prompts(Base):
@@ -25,31 +79,75 @@ class Prompts(Base):
 
     __tablename__ = "prompts"
 
-    prompt_id = Column(String, primary_key=True, index=True)
-    title = Column(String, index=True)
-    role = Column(String, index=True)
-    task = Column(String, index=True)
+    prompt_id = Column(UUIDString, primary_key=True, default=new_id)
+    title = Column(String)
+    role = Column(String)
+    task = Column(String)
     constraints = Column(String)
     output = Column(String)
     personality = Column(String)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Partition key, so it has to be part of the table's primary key
+    created_at = Column(
+        DateTime(timezone=True),
+        primary_key=True,
+        nullable=False,
+        server_default=func.now(),
+    )
     # Note: Using Postgres ARRAY for tags
     tags = Column(MutableList.as_mutable(ARRAY(String)), default=[])
+    is_public = Column(Boolean, nullable=False, server_default=text("false"))
+    # Maintained by Postgres, never written by the app
+    search_vector = Column(TSVECTOR, Computed(PROMPT_SEARCH_VECTOR, persisted=True))
+    # Resubmitted content reuses the row instead of inserting a duplicate
+    content_hash = Column(LargeBinary)
+    use_count = Column(Integer, nullable=False, server_default=text("1"))
+    last_used_at = Column(DateTime(timezone=True), default=func.now())
 
     # Foreign Keys
-    author_id = Column(String, ForeignKey("users.user_id"))
+    author_id = Column(UUIDString, ForeignKey("users.user_id"))
 
     # Relationships
     author = relationship("User", back_populates="prompts")
     structured_version = relationship(
-        "StructuredPrompts", back_populates="original_prompt", uselist=False
+        "StructuredPrompts",
+        back_populates="original_prompt",
+        uselist=False,
+        primaryjoin="Prompts.prompt_id == foreign(StructuredPrompts.original_prompt_id)",
+    )
+
+    # Rows are still identified by prompt_id alone in the app
+    __mapper_args__ = {"primary_key": [prompt_id]}
+
+    __table_args__ = (
+        # Keyset pagination of a user's history: WHERE author_id = ? ORDER BY created_at DESC, prompt_id DESC
+        Index(
+            "ix_prompts_author_created_id",
+            "author_id",
+            created_at.desc(),
+            prompt_id.desc(),
+        ),
+        # Append-only table, so created_at correlates with physical order: BRIN is tiny and cheap to maintain
+        Index("ix_prompts_created_at_brin", created_at, postgresql_using="brin"),
+        Index("ix_prompts_search_vector", search_vector, postgresql_using="gin"),
+        Index(
+            "ix_prompts_title_trgm",
+            title,
+            postgresql_using="gin",
+            postgresql_ops={"title": "gin_trgm_ops"},
+        ),
+        # Tag containment (tags @> ARRAY['x'])
+        Index("ix_prompts_tags", tags, postgresql_using="gin"),
+        # Duplicate lookup, see db/dedup.py
+        Index("ix_prompts_author_content_hash", "author_id", "content_hash"),
+        # Monthly partitions, see db/partitions.py
+        {"postgresql_partition_by": "RANGE (created_at)"},
     )
 
 
 class User(Base):
     __tablename__ = "users"
 
-    user_id = Column(String, primary_key=True, index=True)
+    user_id = Column(UUIDString, primary_key=True, index=True, default=new_id)
     username = Column(String, unique=True, index=True)
     password = Column(String, nullable=False)
     email = Column(String, unique=True, index=True)
@@ -77,30 +175,93 @@ class User(Base):
 class RefreshToken(Base):
     __tablename__ = "refresh_tokens"
 
-    id = Column(String, primary_key=True, index=True)
-    token_hash = Column(String, nullable=False)
-    user_id = Column(String, ForeignKey("users.user_id"), nullable=False)
+    id = Column(UUIDString, primary_key=True, index=True, default=new_id)
+    # HMAC-SHA256 of the token (auth.oauth2.token_digest), the lookup key
+    token_digest = Column(String(64))
+    # bcrypt hash, only set on tokens issued before token_digest existed
+    token_hash = Column(String, nullable=True)
+    user_id = Column(UUIDString, ForeignKey("users.user_id"), nullable=False)
     expires_at = Column(DateTime(timezone=True), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationships
     user = relationship("User", back_populates="refresh_tokens")
 
+    __table_args__ = (
+        Index("ix_refresh_tokens_token_digest", "token_digest", unique=True),
+        Index("ix_refresh_tokens_user_id_expires_at", "user_id", "expires_at"),
+    )
+
+
+class TagCount(Base):
+    """Number of public prompts per tag, maintained by the prompts_tag_counts_sync trigger."""
+
+    __tablename__ = "tag_counts"
+
+    tag = Column(String, primary_key=True)
+    prompt_count = Column(Integer, nullable=False, server_default=text("0"))
+
+    __table_args__ = (Index("ix_tag_counts_prompt_count", prompt_count.desc()),)
+
 
 class StructuredPrompts(Base):
     __tablename__ = "structured_prompts"
-    prompt_id = Column(String, primary_key=True, index=True)
+    prompt_id = Column(UUIDString, primary_key=True, default=new_id)
     structured_prompt = Column(String)
     natural_prompt = Column(String)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    content_hash = Column(LargeBinary)
+    use_count = Column(Integer, nullable=False, server_default=text("1"))
+    last_used_at = Column(DateTime(timezone=True), default=func.now())
+    created_at = Column(
+        DateTime(timezone=True),
+        primary_key=True,
+        nullable=False,
+        server_default=func.now(),
+    )
 
     # Foreign Keys
-    author_id = Column(String, ForeignKey("users.user_id"))
-    original_prompt_id = Column(String, ForeignKey("prompts.prompt_id"))
+    author_id = Column(UUIDString, ForeignKey("users.user_id"))
+    # No FK constraint: prompts' unique key is (prompt_id, created_at) since it is partitioned
+    original_prompt_id = Column(UUIDString)
 
     # Relationships
     author = relationship("User", back_populates="structured_prompts")
-    original_prompt = relationship("Prompts", back_populates="structured_version")
+    original_prompt = relationship(
+        "Prompts",
+        back_populates="structured_version",
+        primaryjoin="Prompts.prompt_id == foreign(StructuredPrompts.original_prompt_id)",
+    )
+
+    __mapper_args__ = {"primary_key": [prompt_id]}
+
+    __table_args__ = (
+        Index(
+            "ix_structured_prompts_author_created_id",
+            "author_id",
+            created_at.desc(),
+            prompt_id.desc(),
+        ),
+        Index("ix_structured_prompts_original_prompt_id", "original_prompt_id"),
+        Index("ix_structured_prompts_author_content_hash", "author_id", "content_hash"),
+        Index(
+            "ix_structured_prompts_created_at_brin",
+            created_at,
+            postgresql_using="brin",
+        ),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+
+event.listen(Prompts.__table__, "after_create", DDL(TAG_COUNTS_SYNC_FUNCTION))
+event.listen(Prompts.__table__, "after_create", DDL(TAG_COUNTS_SYNC_TRIGGER))
+
+# Catch-all partitions, so inserts never fail before the monthly partitions exist
+for _partitioned in (Prompts.__table__, StructuredPrompts.__table__):
+    event.listen(
+        _partitioned,
+        "after_create",
+        DDL("CREATE TABLE %(table)s_default PARTITION OF %(table)s DEFAULT"),
+    )
 
 
 """
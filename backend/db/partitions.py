@@ -0,0 +1,203 @@
+"""
+Monthly range partitions for the append-only tables (prompts, structured_prompts).
+
+Each month lives in its own partition, <table>_pYYYY_MM, holding
+[first of the month, first of the next month) in UTC. A <table>_default partition
+catches anything outside the monthly partitions so inserts never fail.
+
+maintain_partitions() is run by the worker (core.celery_tasks) and can also be
+run by hand:
+  - it creates the partitions for the current month and PARTITION_MONTHS_AHEAD
+    months ahead, so new rows never land in the default partition;
+  - with PARTITION_RETENTION_MONTHS set, it detaches partitions that are entirely
+    older than the retention window (optionally dropping them). Detaching is a
+    catalog change, so old data goes away without a massive DELETE, without
+    vacuum work and without index bloat.
+
+Usage: python db/partitions.py
+"""
+
+import re
+import sys
+import os
+from datetime import date, datetime, timezone
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import SQLAlchemyError
+
+from core.config import settings
+from db.database import engine
+from utility.logger import get_logger
+
+lg = get_logger(__file__)
+
+PARTITIONED_TABLES = ("prompts", "structured_prompts")
+
+LIST_PARTITIONS_SQL = text(
+    "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+    "WHERE i.inhparent = CAST(:table AS regclass)"
+)
+
+# Detaching does not fire row triggers, so take the detached public prompts out of
+# the tag facets by hand (same counting rule as prompts_tag_counts_sync)
+RELEASE_TAG_COUNTS_SQL = """
+UPDATE tag_counts SET prompt_count = tag_counts.prompt_count - released.n
+FROM (
+    SELECT tag, count(*) AS n
+    FROM (SELECT DISTINCT prompt_id, unnest(tags) AS tag FROM {partition} WHERE is_public) t
+    GROUP BY tag
+) released
+WHERE tag_counts.tag = released.tag
+"""
+
+
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y_%m}"
+
+
+def list_partitions(conn: Connection, table: str) -> dict[str, date]:
+    """
+    List a table's monthly partitions.
+    Args:
+        conn (Connection): An open database connection.
+        table (str): The partitioned table.
+    Returns:
+        dict[str, date]: Partition name -> first day of the month it holds.
+    """
+    pattern = re.compile(rf"^{table}_p(\d{{4}})_(\d{{2}})$")
+    partitions = {}
+    for (name,) in conn.execute(LIST_PARTITIONS_SQL, {"table": table}):
+        match = pattern.match(name)
+        if match:
+            partitions[name] = date(int(match.group(1)), int(match.group(2)), 1)
+    return partitions
+
+
+def create_partition(conn: Connection, table: str, month: date) -> bool:
+    """
+    Create the partition of a table for one month.
+
+    Fails (and returns False) if the default partition already holds rows of that
+    month; those have to be moved by hand before the partition can be created.
+
+    Args:
+        conn (Connection): An open database connection, inside a transaction.
+        table (str): The partitioned table.
+        month (date): The first day of the month.
+    Returns:
+        bool: True if the partition was created.
+    """
+    name = partition_name(table, month)
+    try:
+        with conn.begin_nested():
+            conn.execute(
+                text(
+                    f"CREATE TABLE {name} PARTITION OF {table} "
+                    f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') "
+                    f"TO ('{add_months(month, 1).isoformat()} 00:00:00+00')"
+                )
+            )
+        lg.info(f"Created partition {name}")
+        return True
+    except SQLAlchemyError as e:
+        lg.error(f"Could not create partition {name}: {e}")
+        return False
+
+
+def ensure_partitions(
+    conn: Connection, table: str, months_ahead: int, today: date | None = None
+) -> list[str]:
+    """
+    Create the missing partitions from the current month to months_ahead months ahead.
+    Returns:
+        list[str]: The names of the partitions created.
+    """
+    current = month_start(today or datetime.now(timezone.utc).date())
+    existing = set(list_partitions(conn, table).values())
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        if month not in existing and create_partition(conn, table, month):
+            created.append(partition_name(table, month))
+    return created
+
+
+def detach_expired_partitions(
+    conn: Connection,
+    table: str,
+    retention_months: int,
+    drop: bool = False,
+    today: date | None = None,
+) -> list[str]:
+    """
+    Detach the partitions whose whole month is older than retention_months.
+    Args:
+        conn (Connection): An open database connection, inside a transaction.
+        table (str): The partitioned table.
+        retention_months (int): Number of full months to keep before the current one.
+        drop (bool): Drop the detached partitions instead of keeping them as plain tables.
+        today (date, optional): Reference date, defaults to today (UTC).
+    Returns:
+        list[str]: The names of the partitions detached.
+    """
+    cutoff = add_months(
+        month_start(today or datetime.now(timezone.utc).date()), -retention_months
+    )
+    detached = []
+    for name, month in sorted(list_partitions(conn, table).items()):
+        if month >= cutoff:
+            continue
+        if table == "prompts":
+            conn.execute(text(RELEASE_TAG_COUNTS_SQL.format(partition=name)))
+        conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+        if drop:
+            conn.execute(text(f"DROP TABLE {name}"))
+        lg.info(f"{'Dropped' if drop else 'Detached'} expired partition {name}")
+        detached.append(name)
+    return detached
+
+
+def maintain_partitions() -> dict[str, dict[str, list[str]]]:
+    """
+    Create upcoming partitions and apply retention to every partitioned table.
+    Each table is handled in its own transaction.
+    Returns:
+        dict: Per table, the partitions 'created' and 'detached'.
+    """
+    report = {}
+    for table in PARTITIONED_TABLES:
+        with engine.begin() as conn:
+            # Never queue behind long transactions for the ACCESS EXCLUSIVE lock
+            conn.execute(text("SET LOCAL lock_timeout = '5s'"))
+            created = ensure_partitions(conn, table, settings.PARTITION_MONTHS_AHEAD)
+            detached = []
+            if settings.PARTITION_RETENTION_MONTHS > 0:
+                detached = detach_expired_partitions(
+                    conn,
+                    table,
+                    settings.PARTITION_RETENTION_MONTHS,
+                    drop=settings.PARTITION_DROP_DETACHED,
+                )
+        report[table] = {"created": created, "detached": detached}
+    return report
+
+
+if __name__ == "__main__":
+    for table, changes in maintain_partitions().items():
+        print(
+            f"{table}: created {changes['created'] or 'none'}, "
+            f"detached {changes['detached'] or 'none'}"
+        )
@@ -1,33 +1,182 @@
+"""
+Redis access for the whole app.
+
+Every subsystem (blocklist and revocation filter, login attempts, the response
+cache, read-your-writes pins, quotas, the write-behind stream) shares one
+connection pool per process: get_async_redis for async code, get_sync_redis for
+sync routes, services and the worker. Pools are sized by REDIS_MAX_CONNECTIONS,
+health-check idle connections, and wait up to REDIS_POOL_TIMEOUT for a free
+connection instead of failing. Command latencies are exported as metrics.
+"""
+
+import asyncio
+import math
+import time
+from typing import Awaitable, Callable
+
+import redis
 import redis.asyncio as aioredis
 from core.config import settings
+from core.metrics import REDIS_COMMAND_SECONDS, REVOCATION_CHECKS
+from auth.token_cache import verified_tokens
+from auth.revocation import revocation_filter
+from utility.logger import get_logger
+
+lg = get_logger(script_path=__file__)
+
+_async_client = None
+_sync_client = None
+
+# Revoked jtis scored by their exp, the source the revocation filters load from
+REVOKED_INDEX_KEY = "revoked_jti_index"
+REVOKED_CHANNEL = "revoked_jti"
+# Set (for good) once the blocklist keys written before the index existed are in it
+REVOKED_INDEX_BACKFILLED_KEY = "revoked_jti_index:backfilled"
+# Held by the one worker running the backfill
+REVOKED_INDEX_BACKFILL_LOCK_KEY = "revoked_jti_index:backfilling"
+REVOKED_INDEX_BACKFILL_LOCK_SECONDS = 300
+# Blocklist entries are keyed by the bare jti, a uuid4
+JTI_KEY_PATTERN = "????????-????-????-????-????????????"
+
+_revoked_index_backfilled = False
+
+
+def _pool_options() -> dict:
+    return {
+        "max_connections": settings.REDIS_MAX_CONNECTIONS,
+        "timeout": settings.REDIS_POOL_TIMEOUT,
+        "health_check_interval": settings.REDIS_HEALTH_CHECK_INTERVAL,
+        "socket_timeout": settings.REDIS_SOCKET_TIMEOUT,
+        "socket_connect_timeout": settings.REDIS_SOCKET_TIMEOUT,
+    }
+
+
+def _timed(fn: Callable, command: str | None = None) -> Callable:
+    """Wrap a client method to record its latency, labelled by the command name."""
+
+    def observe(args: tuple, started: float) -> None:
+        REDIS_COMMAND_SECONDS.labels(command=command or str(args[0]).upper()).observe(
+            time.perf_counter() - started
+        )
+
+    if asyncio.iscoroutinefunction(fn):
+
+        async def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                observe(args, started)
+
+    else:
 
-# we can use the redis config
-token_blacklist = aioredis.from_url(settings.REDIS_URL)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe(args, started)
 
+    return timed
 
-async def add_jit_to_blocklist(jti: str) -> None:
+
+def _instrument(client):
+    # Every command (scripts included) goes through execute_command, and a
+    # pipeline is one round trip timed as a whole
+    client.execute_command = _timed(client.execute_command)
+    pipeline = client.pipeline
+
+    def instrumented_pipeline(*args, **kwargs):
+        pipe = pipeline(*args, **kwargs)
+        pipe.execute = _timed(pipe.execute, command="PIPELINE")
+        return pipe
+
+    client.pipeline = instrumented_pipeline
+    return client
+
+
+def get_async_redis() -> aioredis.Redis:
+    """Shared asyncio Redis client of this process."""
+    global _async_client
+    if _async_client is None:
+        pool = aioredis.BlockingConnectionPool.from_url(
+            settings.REDIS_URL, **_pool_options()
+        )
+        _async_client = _instrument(aioredis.Redis(connection_pool=pool))
+    return _async_client
+
+
+def get_sync_redis() -> redis.Redis:
+    """Shared blocking Redis client of this process, safe to use from threads."""
+    global _sync_client
+    if _sync_client is None:
+        pool = redis.BlockingConnectionPool.from_url(
+            settings.REDIS_URL, **_pool_options()
+        )
+        _sync_client = _instrument(redis.Redis(connection_pool=pool))
+    return _sync_client
+
+
+async def init_redis() -> None:
+    """Open the async pool at startup, a Redis outage only degrades the app."""
+    try:
+        await get_async_redis().ping()
+        lg.info("Redis connection pool ready")
+    except Exception as e:
+        lg.error(f"Redis is not reachable at startup: {e}")
+
+
+async def close_redis() -> None:
+    """Close both pools at shutdown."""
+    global _async_client, _sync_client
+    try:
+        if _async_client is not None:
+            await _async_client.connection_pool.disconnect()
+        if _sync_client is not None:
+            _sync_client.connection_pool.disconnect()
+    except Exception as e:
+        lg.error(f"Error closing Redis connection pools: {e}")
+    _async_client = _sync_client = None
+
+
+async def add_jit_to_blocklist(jti: str, exp: float | None = None) -> None:
     """
     Adds a JTI (JWT ID) to the Redis blacklist.
 
     This function marks a token (specifically its JTI) as invalid or revoked
-    by storing it in Redis with an expiration time.
+    by storing it in Redis until the token expires, and announces it to the
+    revocation filters of every worker.
 
     Args:
         jti (str): The unique identifier of the JWT (JTI) to be blacklisted.
+        exp (float, optional): The token's exp claim. Defaults to None, which
+            keeps the entry for JTI_EXPIRY_SECONDS.
     """
-    await token_blacklist.set(
-        name=jti,
-        value="true",
-        ex=settings.JTI_EXPIRY_SECONDS,
-    )
+    verified_tokens.invalidate_jti(jti)
+    now = time.time()
+    if exp is None:
+        exp = now + settings.JTI_EXPIRY_SECONDS
+    ttl = math.ceil(exp - now)
+    if ttl <= 0:
+        # Already expired, jwt.decode rejects it anyway
+        return
+
+    revocation_filter.add(jti, exp)
+    pipe = get_async_redis().pipeline(transaction=False)
+    pipe.set(name=jti, value="true", ex=ttl)
+    pipe.zadd(REVOKED_INDEX_KEY, {jti: exp})
+    # Keeps the index (and the filters rebuilt from it) down to live tokens
+    pipe.zremrangebyscore(REVOKED_INDEX_KEY, "-inf", now)
+    pipe.publish(REVOKED_CHANNEL, f"{jti} {exp}")
+    await pipe.execute()
 
 
 async def token_in_blocklist(jti: str) -> bool:
     """
     Checks if a JTI (JWT ID) is present in the Redis blacklist.
 
-    This function queries Redis to see if the token's JTI has been stored,
-    indicating that the token has been revoked.
+    The local revocation filter answers most checks, Redis is only queried
+    when the filter cannot rule the JTI in or out.
 
     Args:
         jti (str): The unique identifier of the JWT (JTI) to check.
@@ -35,26 +184,183 @@ async def token_in_blocklist(jti: str) -> bool:
     Returns:
         bool: True if the JTI is in the blacklist, False otherwise.
     """
-    jti = await token_blacklist.get(name=jti)
+    revoked = revocation_filter.check(jti)
+    if revoked is not None:
+        REVOCATION_CHECKS.labels(source="filter").inc()
+        return revoked
+    REVOCATION_CHECKS.labels(source="redis").inc()
+    jti = await get_async_redis().get(name=jti)
     return jti is not None
 
 
+async def backfill_revoked_index() -> int:
+    """
+    Add the blocklist keys written before REVOKED_INDEX_KEY existed to the index.
+
+    The revocation filters are rebuilt from the index only, so without this
+    tokens revoked before the deploy would be accepted again. The keys are found
+    with one SCAN, their TTL gives back the token's exp. It runs once: the marker
+    never expires. Only the worker holding the lock scans; the others raise until
+    the marker is set, and so does a failed backfill, so it is retried.
+
+    Returns:
+        int: Number of jtis added to the index, 0 if it was already backfilled.
+    """
+    client = get_async_redis()
+    if await client.exists(REVOKED_INDEX_BACKFILLED_KEY):
+        return 0
+    if not await client.set(
+        REVOKED_INDEX_BACKFILL_LOCK_KEY,
+        "1",
+        nx=True,
+        ex=REVOKED_INDEX_BACKFILL_LOCK_SECONDS,
+    ):
+        raise RuntimeError(
+            "The revoked jti index is being backfilled by another worker"
+        )
+    try:
+        added = 0
+        keys = []
+        async for key in client.scan_iter(match=JTI_KEY_PATTERN, count=1000):
+            keys.append(key)
+            if len(keys) >= 1000:
+                added += await _index_blocklist_keys(client, keys)
+                keys = []
+        if keys:
+            added += await _index_blocklist_keys(client, keys)
+        await client.set(REVOKED_INDEX_BACKFILLED_KEY, added)
+    finally:
+        await client.delete(REVOKED_INDEX_BACKFILL_LOCK_KEY)
+    lg.info(f"Backfilled {added} revoked jtis into {REVOKED_INDEX_KEY}")
+    return added
+
+
+async def _index_blocklist_keys(client, keys: list[bytes]) -> int:
+    pipe = client.pipeline(transaction=False)
+    for key in keys:
+        pipe.get(key)
+        pipe.pttl(key)
+    replies = await pipe.execute()
+    now = time.time()
+    revoked = {
+        key: now + ttl_ms / 1000
+        for key, value, ttl_ms in zip(keys, replies[::2], replies[1::2])
+        # Only blocklist entries, whose TTL follows the token's exp
+        if value == b"true" and ttl_ms > 0
+    }
+    if revoked:
+        await client.zadd(REVOKED_INDEX_KEY, revoked)
+    return len(revoked)
+
+
+async def _reload_revocation_filter() -> None:
+    global _revoked_index_backfilled
+    if not _revoked_index_backfilled:
+        # Raising keeps the filter not ready, so checks still go to Redis
+        await backfill_revoked_index()
+        _revoked_index_backfilled = True
+    pipe = get_async_redis().pipeline(transaction=False)
+    pipe.zremrangebyscore(REVOKED_INDEX_KEY, "-inf", time.time())
+    pipe.zrange(REVOKED_INDEX_KEY, 0, -1, withscores=True)
+    _, revoked = await pipe.execute()
+    revocation_filter.rebuild((jti.decode("utf-8"), exp) for jti, exp in revoked)
+
+
+async def subscribe_forever(
+    channel: str,
+    on_message: Callable[[bytes], None],
+    on_connect: Callable[[], Awaitable[None]],
+    on_error: Callable[[], None],
+    resync_seconds: float | None = None,
+) -> None:
+    """
+    Follow a pub/sub channel for the app's lifetime, reconnecting on errors.
+
+    on_connect runs after subscribing (so nothing published in between is
+    missed) and every resync_seconds, on_error whenever the subscription is
+    lost, since messages published while disconnected are gone.
+
+    Args:
+        channel (str): The channel to subscribe to.
+        on_message (Callable): Called with the data of every message.
+        on_connect (Callable): Loads the current state, awaited.
+        on_error (Callable): Marks local state as untrusted.
+        resync_seconds (float, optional): Interval to rerun on_connect.
+    """
+    while True:
+        pubsub = get_async_redis().pubsub()
+        try:
+            await pubsub.subscribe(channel)
+            await on_connect()
+            lg.info(f"Subscribed to {channel}")
+            resync_at = time.monotonic() + (resync_seconds or math.inf)
+            while True:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=1.0
+                )
+                if message is not None:
+                    on_message(message["data"])
+                if time.monotonic() >= resync_at:
+                    await on_connect()
+                    resync_at = time.monotonic() + resync_seconds
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            on_error()
+            lg.error(f"Subscription to {channel} failed: {e}")
+            await asyncio.sleep(5)
+        finally:
+            try:
+                await pubsub.close()
+            except Exception:
+                pass
+
+
+def _on_revocation(data: bytes) -> None:
+    jti, exp = data.decode("utf-8").split(" ")
+    revocation_filter.add(jti, float(exp))
+
+
+def _revocation_sync_lost() -> None:
+    # Checks go to Redis until the next successful sync
+    revocation_filter.ready = False
+
+
+async def sync_revocation_filter() -> None:
+    """
+    Keep the local revocation filter in sync with Redis, runs for the app's lifetime.
+
+    Follows the revocations published by other workers, loads the current
+    blocklist on connect, and reloads it every REVOCATION_RESYNC_SECONDS to
+    forget expired entries.
+    """
+    await subscribe_forever(
+        REVOKED_CHANNEL,
+        on_message=_on_revocation,
+        on_connect=_reload_revocation_filter,
+        on_error=_revocation_sync_lost,
+        resync_seconds=settings.REVOCATION_RESYNC_SECONDS,
+    )
+
+
 async def increment_login_attempts(email: str) -> int:
     """Increment login attempts for an email."""
     key = f"login_attempts:{email}"
-    attempts = await token_blacklist.incr(key)
-    await token_blacklist.expire(key, 3600)  # Expire in 1 hour
+    pipe = get_async_redis().pipeline(transaction=True)
+    pipe.incr(key)
+    pipe.expire(key, 3600)  # Expire in 1 hour
+    attempts, _ = await pipe.execute()
     return attempts
 
 
 async def get_login_attempts(email: str) -> int:
     """Get current login attempts for an email."""
     key = f"login_attempts:{email}"
-    attempts = await token_blacklist.get(key)
+    attempts = await get_async_redis().get(key)
     return int(attempts) if attempts else 0
 
 
 async def reset_login_attempts(email: str):
     """Reset login attempts for an email."""
     key = f"login_attempts:{email}"
-    await token_blacklist.delete(key)
+    await get_async_redis().delete(key)
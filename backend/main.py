@@ -6,6 +6,8 @@ RESTful Prompt restructing app
 
 import os
 import sys
+import asyncio
+from contextlib import asynccontextmanager
 
 # Add the directory containing this file to the Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -14,7 +16,6 @@ from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi_cache import FastAPICache
 from fastapi_cache.backends.redis import RedisBackend
-from redis import asyncio as aioredis
 from sqladmin import Admin
 from prometheus_fastapi_instrumentator import Instrumentator
 
@@ -25,6 +26,8 @@ from core.custom_error_handlers import register_all_errors
 from auth.admin_panel import UserAdmin, PromptAdmin, StructuredPromptAdmin, AdminAuth
 
 from db.database import engine
+from db.redis import init_redis, close_redis, get_async_redis, sync_revocation_filter
+from core.cache import sync_cache_invalidations
 from utility.logger import get_logger
 
 lg = get_logger(script_path=__file__)
@@ -57,6 +60,21 @@ tags_metadata = [
     },
 ]
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_redis()
+    FastAPICache.init(RedisBackend(get_async_redis()), prefix="fastapi-cache")
+    subscriptions = [
+        asyncio.create_task(sync_revocation_filter()),
+        asyncio.create_task(sync_cache_invalidations()),
+    ]
+    yield
+    for task in subscriptions:
+        task.cancel()
+    await close_redis()
+
+
 app = FastAPI(
     title="PromptCrafter Backend API",
     description=description,
@@ -74,17 +92,10 @@ app = FastAPI(
     openapi_url=f"/api/{settings.VERSION or version}/openapi.json",
     docs_url=f"/api/{settings.VERSION or version}/docs",
     redoc_url=f"/api/{settings.VERSION or version}/redoc",
+    lifespan=lifespan,
 )
 
 
-@app.on_event("startup")
-async def startup():
-    redis = aioredis.from_url(
-        settings.REDIS_URL, encoding="utf8", decode_responses=True
-    )
-    FastAPICache.init(RedisBackend(redis), prefix="fastapi-cache")
-
-
 # --- Global Exception Handling ---
 
 register_all_errors(app=app)
@@ -0,0 +1,228 @@
+"""partition prompts and structured prompts by month
+
+Rebuilds prompts and structured_prompts as tables range-partitioned on created_at,
+one partition per month plus a default partition. Existing rows are copied into
+the new tables; created_at becomes part of the primary key (a requirement of
+partitioning), so the structured_prompts -> prompts foreign key is dropped.
+
+The copy rewrites both tables and holds an exclusive lock on them for its
+duration, so run this in a maintenance window.
+
+Revision ID: a9c4e7d1b258
+Revises: f2b6d9a4c037
+Create Date: 2026-10-19 14:10:00.000000
+
+"""
+
+from datetime import date, datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a9c4e7d1b258"
+down_revision: Union[str, Sequence[str], None] = "f2b6d9a4c037"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Partitions created ahead of the current month (db.partitions keeps this going)
+MONTHS_AHEAD = 3
+
+# Keep in sync with db.models.PROMPT_SEARCH_VECTOR
+PROMPT_SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(role, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(task, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(constraints, '')), 'C')"
+)
+
+PROMPTS_COLUMNS = (
+    "prompt_id",
+    "title",
+    "role",
+    "task",
+    "constraints",
+    "output",
+    "personality",
+    "created_at",
+    "tags",
+    "is_public",
+    "author_id",
+)
+STRUCTURED_PROMPTS_COLUMNS = (
+    "prompt_id",
+    "structured_prompt",
+    "natural_prompt",
+    "created_at",
+    "author_id",
+    "original_prompt_id",
+)
+
+PROMPTS_DDL = f"""
+CREATE TABLE {{table}} (
+    prompt_id VARCHAR NOT NULL,
+    title VARCHAR,
+    role VARCHAR,
+    task VARCHAR,
+    constraints VARCHAR,
+    output VARCHAR,
+    personality VARCHAR,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    tags VARCHAR[],
+    is_public BOOLEAN NOT NULL DEFAULT false,
+    search_vector TSVECTOR GENERATED ALWAYS AS ({PROMPT_SEARCH_VECTOR}) STORED,
+    author_id VARCHAR
+){{partition_by}}
+"""
+STRUCTURED_PROMPTS_DDL = """
+CREATE TABLE {table} (
+    prompt_id VARCHAR NOT NULL,
+    structured_prompt VARCHAR,
+    natural_prompt VARCHAR,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    author_id VARCHAR,
+    original_prompt_id VARCHAR
+){partition_by}
+"""
+
+# Keep in sync with db.models.TAG_COUNTS_SYNC_TRIGGER
+TAG_COUNTS_SYNC_TRIGGER = """
+CREATE TRIGGER prompts_tag_counts_sync
+AFTER INSERT OR DELETE OR UPDATE OF tags, is_public ON prompts
+FOR EACH ROW EXECUTE FUNCTION prompts_tag_counts_sync()
+"""
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _create_indexes() -> None:
+    op.create_index(
+        "ix_prompts_author_created_id",
+        "prompts",
+        ["author_id", sa.text("created_at DESC"), sa.text("prompt_id DESC")],
+    )
+    op.create_index(
+        "ix_prompts_created_at_brin",
+        "prompts",
+        ["created_at"],
+        postgresql_using="brin",
+    )
+    op.create_index(
+        "ix_prompts_search_vector",
+        "prompts",
+        ["search_vector"],
+        postgresql_using="gin",
+    )
+    op.create_index(
+        "ix_prompts_title_trgm",
+        "prompts",
+        ["title"],
+        postgresql_using="gin",
+        postgresql_ops={"title": "gin_trgm_ops"},
+    )
+    op.create_index("ix_prompts_tags", "prompts", ["tags"], postgresql_using="gin")
+    op.create_index(
+        "ix_structured_prompts_author_created_id",
+        "structured_prompts",
+        ["author_id", sa.text("created_at DESC"), sa.text("prompt_id DESC")],
+    )
+    op.create_index(
+        "ix_structured_prompts_original_prompt_id",
+        "structured_prompts",
+        ["original_prompt_id"],
+    )
+    op.create_index(
+        "ix_structured_prompts_created_at_brin",
+        "structured_prompts",
+        ["created_at"],
+        postgresql_using="brin",
+    )
+
+
+def _rebuild(table: str, ddl: str, columns: tuple, partitioned: bool) -> None:
+    """Recreate a table from ddl and move its rows over. Indexes are added afterwards."""
+    old_table = f"{table}_old"
+    column_list = ", ".join(columns)
+    op.execute(f"ALTER TABLE {table} RENAME TO {old_table}")
+    op.execute(
+        ddl.format(
+            table=table,
+            partition_by=" PARTITION BY RANGE (created_at)" if partitioned else "",
+        )
+    )
+
+    if partitioned:
+        oldest = (
+            op.get_bind()
+            .execute(sa.text(f"SELECT min(created_at) FROM {old_table}"))
+            .scalar()
+        )
+        today = datetime.now(timezone.utc).date()
+        month = date((oldest or today).year, (oldest or today).month, 1)
+        last = _add_months(date(today.year, today.month, 1), MONTHS_AHEAD)
+        while month <= last:
+            op.execute(
+                f"CREATE TABLE {table}_p{month:%Y_%m} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') "
+                f"TO ('{_add_months(month, 1).isoformat()} 00:00:00+00')"
+            )
+            month = _add_months(month, 1)
+        op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+    select_list = column_list.replace("created_at", "coalesce(created_at, now())")
+    op.execute(
+        f"INSERT INTO {table} ({column_list}) SELECT {select_list} FROM {old_table}"
+    )
+    # Drops the old indexes and the tag_counts trigger with it
+    op.execute(f"DROP TABLE {old_table}")
+    if partitioned:
+        op.execute(f"ALTER TABLE {table} ADD PRIMARY KEY (prompt_id, created_at)")
+    else:
+        op.execute(f"ALTER TABLE {table} ADD PRIMARY KEY (prompt_id)")
+    op.create_foreign_key(
+        f"{table}_author_id_fkey", table, "users", ["author_id"], ["user_id"]
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(
+        "ALTER TABLE structured_prompts "
+        "DROP CONSTRAINT IF EXISTS structured_prompts_original_prompt_id_fkey"
+    )
+    _rebuild("prompts", PROMPTS_DDL, PROMPTS_COLUMNS, partitioned=True)
+    _rebuild(
+        "structured_prompts",
+        STRUCTURED_PROMPTS_DDL,
+        STRUCTURED_PROMPTS_COLUMNS,
+        partitioned=True,
+    )
+    _create_indexes()
+    # The rows were copied without the trigger, so tag_counts is still accurate
+    op.execute(TAG_COUNTS_SYNC_TRIGGER)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Partitions detached by the retention job are not brought back
+    _rebuild(
+        "structured_prompts",
+        STRUCTURED_PROMPTS_DDL,
+        STRUCTURED_PROMPTS_COLUMNS,
+        partitioned=False,
+    )
+    _rebuild("prompts", PROMPTS_DDL, PROMPTS_COLUMNS, partitioned=False)
+    _create_indexes()
+    op.execute(TAG_COUNTS_SYNC_TRIGGER)
+    op.create_foreign_key(
+        "structured_prompts_original_prompt_id_fkey",
+        "structured_prompts",
+        "prompts",
+        ["original_prompt_id"],
+        ["prompt_id"],
+    )
@@ -0,0 +1,312 @@
+"""native uuid keys
+
+Converts every primary and foreign key column from VARCHAR to the native uuid
+type (16 bytes instead of 36 + header), which roughly halves the key indexes.
+
+The conversion runs online: no table is rewritten under an exclusive lock.
+  - Each key column gets a shadow column of the new type, filled by a trigger for
+    new writes and backfilled in batches (one partition at a time for prompts and
+    structured_prompts), each batch in its own transaction.
+  - The primary keys, the other key indexes and the foreign keys are built on the
+    shadow columns beforehand, concurrently and partition by partition; validated
+    CHECK constraints prove the NOT NULLs.
+  - A single short transaction then swaps the columns. It only changes the
+    catalog: it drops the old columns, renames the shadow ones and attaches the
+    prebuilt indexes and constraints. The space of the dropped columns is
+    reclaimed as the rows are rewritten by later updates and vacuum.
+
+Downgrade converts the keys back to VARCHAR the same way.
+
+Revision ID: b3e8f1c6a074
+Revises: a9c4e7d1b258
+Create Date: 2026-10-19 15:30:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b3e8f1c6a074"
+down_revision: Union[str, Sequence[str], None] = "a9c4e7d1b258"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Rows converted per backfill statement
+BACKFILL_BATCH_ROWS = 10_000
+
+# Key columns per table, the primary key first (users first: the foreign keys need
+# its shadow key)
+KEY_COLUMNS = {
+    "users": ("user_id",),
+    "refresh_tokens": ("id", "user_id"),
+    "prompts": ("prompt_id", "author_id"),
+    "structured_prompts": ("prompt_id", "author_id", "original_prompt_id"),
+}
+NOT_NULL_COLUMNS = (
+    ("users", "user_id"),
+    ("refresh_tokens", "id"),
+    ("refresh_tokens", "user_id"),
+    ("prompts", "prompt_id"),
+    ("structured_prompts", "prompt_id"),
+)
+PARTITIONED_TABLES = ("prompts", "structured_prompts")
+# (name, table, columns) of the other indexes on key columns
+KEY_INDEXES = (
+    ("ix_users_user_id", "users", ("user_id",)),
+    ("ix_refresh_tokens_id", "refresh_tokens", ("id",)),
+    (
+        "ix_prompts_author_created_id",
+        "prompts",
+        ("author_id", "created_at DESC", "prompt_id DESC"),
+    ),
+    (
+        "ix_structured_prompts_author_created_id",
+        "structured_prompts",
+        ("author_id", "created_at DESC", "prompt_id DESC"),
+    ),
+    (
+        "ix_structured_prompts_original_prompt_id",
+        "structured_prompts",
+        ("original_prompt_id",),
+    ),
+)
+# (name, table, column) of the foreign keys to users.user_id
+USER_FOREIGN_KEYS = (
+    ("prompts_author_id_fkey", "prompts", "author_id"),
+    ("structured_prompts_author_id_fkey", "structured_prompts", "author_id"),
+    ("refresh_tokens_user_id_fkey", "refresh_tokens", "user_id"),
+)
+
+LIST_PARTITIONS_SQL = sa.text(
+    "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+    "WHERE i.inhparent = CAST(:table AS regclass)"
+)
+
+SHADOW_SYNC_FUNCTION = """
+CREATE OR REPLACE FUNCTION {table}_key_shadow() RETURNS trigger AS $$
+BEGIN
+{assignments}
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql
+"""
+SHADOW_SYNC_TRIGGER = """
+CREATE TRIGGER {table}_key_shadow
+BEFORE INSERT OR UPDATE ON {table}
+FOR EACH ROW EXECUTE FUNCTION {table}_key_shadow()
+"""
+
+
+def _shadow(column: str) -> str:
+    return f"{column}_new"
+
+
+def _shadow_columns(table: str, columns: tuple) -> str:
+    """Index column list with the key columns replaced by their shadow columns."""
+    shadowed = []
+    for column in columns:
+        name, *order = column.split()
+        if name in KEY_COLUMNS[table]:
+            name = _shadow(name)
+        shadowed.append(" ".join([name, *order]))
+    return ", ".join(shadowed)
+
+
+def _partition_index(partition: str, table: str, name: str) -> str:
+    return f"{partition}_{name.removeprefix(f'ix_{table}_')}_idx"
+
+
+def _primary_key(table: str) -> tuple:
+    key = KEY_COLUMNS[table][0]
+    return (key, "created_at") if table in PARTITIONED_TABLES else (key,)
+
+
+def _add_shadow_columns(type_: str) -> None:
+    """Add the shadow columns and the triggers that fill them for new writes."""
+    for table, columns in KEY_COLUMNS.items():
+        for column in columns:
+            # No default, so this does not rewrite the table
+            op.execute(
+                f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {_shadow(column)} {type_}"
+            )
+        op.execute(
+            SHADOW_SYNC_FUNCTION.format(
+                table=table,
+                assignments="\n".join(
+                    f"    NEW.{_shadow(column)} := NEW.{column}::{type_};"
+                    for column in columns
+                ),
+            )
+        )
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_key_shadow ON {table}")
+        op.execute(SHADOW_SYNC_TRIGGER.format(table=table))
+
+
+def _backfill(relation: str, table: str, type_: str) -> None:
+    """Fill the shadow columns of the existing rows, one batch per transaction."""
+    key = KEY_COLUMNS[table][0]
+    assignments = ", ".join(
+        f"{_shadow(column)} = {column}::{type_}" for column in KEY_COLUMNS[table]
+    )
+    bind = op.get_bind()
+    after = None
+    while True:
+        # Keyset batches walk the primary key index instead of rescanning the table
+        batch = "" if after is None else f"WHERE {key} > :after "
+        upto = bind.execute(
+            sa.text(
+                f"SELECT {key} FROM (SELECT {key} FROM {relation} "
+                f"{batch}ORDER BY {key} LIMIT :rows) batch ORDER BY {key} DESC LIMIT 1"
+            ),
+            {"after": after, "rows": BACKFILL_BATCH_ROWS},
+        ).scalar()
+        if upto is None:
+            return
+        bounds = (
+            f"{key} <= :upto" if after is None else f"{key} > :after AND {key} <= :upto"
+        )
+        bind.execute(
+            sa.text(f"UPDATE {relation} SET {assignments} WHERE {bounds}"),
+            {"after": after, "upto": upto},
+        )
+        after = upto
+
+
+def _prepare(partitions: dict, type_: str) -> None:
+    """
+    Backfill the shadow columns and build their indexes and constraints, without
+    blocking reads or writes. Runs outside a transaction.
+    """
+    for table in KEY_COLUMNS:
+        relations = partitions.get(table, [table])
+        for relation in relations:
+            _backfill(relation, table, type_)
+
+        # The primary key index is built on each partition: the swap turns them
+        # into the partition primary keys, which the new primary key then adopts
+        pk_columns = _shadow_columns(table, _primary_key(table))
+        for relation in relations:
+            op.execute(
+                f"CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {relation}_pkey_new "
+                f"ON {relation} ({pk_columns})"
+            )
+        for name, _, columns in (index for index in KEY_INDEXES if index[1] == table):
+            columns = _shadow_columns(table, columns)
+            if table not in PARTITIONED_TABLES:
+                op.execute(
+                    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name}_new "
+                    f"ON {table} ({columns})"
+                )
+                continue
+            # Built CONCURRENTLY per partition, then attached to the parent index
+            op.execute(
+                f"CREATE INDEX IF NOT EXISTS {name}_new ON ONLY {table} ({columns})"
+            )
+            for relation in relations:
+                op.execute(
+                    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS "
+                    f"{_partition_index(relation, table, name)}_new "
+                    f"ON {relation} ({columns})"
+                )
+                op.execute(
+                    f"ALTER INDEX {name}_new "
+                    f"ATTACH PARTITION {_partition_index(relation, table, name)}_new"
+                )
+
+        # A valid CHECK lets SET NOT NULL skip its table scan in the swap
+        for column in (column for name, column in NOT_NULL_COLUMNS if name == table):
+            constraint = f"{table}_{_shadow(column)}_not_null"
+            op.execute(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {constraint}")
+            op.execute(
+                f"ALTER TABLE {table} ADD CONSTRAINT {constraint} "
+                f"CHECK ({_shadow(column)} IS NOT NULL) NOT VALID"
+            )
+            op.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {constraint}")
+
+        # A partitioned table cannot have a NOT VALID foreign key: validate one per
+        # partition, which the foreign key added in the swap then adopts
+        for _, _, column in (fk for fk in USER_FOREIGN_KEYS if fk[1] == table):
+            for relation in relations:
+                constraint = f"{relation}_{_shadow(column)}_fkey"
+                op.execute(
+                    f"ALTER TABLE {relation} DROP CONSTRAINT IF EXISTS {constraint}"
+                )
+                op.execute(
+                    f"ALTER TABLE {relation} ADD CONSTRAINT {constraint} "
+                    f"FOREIGN KEY ({_shadow(column)}) "
+                    f"REFERENCES users ({_shadow('user_id')}) NOT VALID"
+                )
+                op.execute(f"ALTER TABLE {relation} VALIDATE CONSTRAINT {constraint}")
+
+
+def _swap(partitions: dict) -> None:
+    """Replace the key columns by their shadow columns (catalog changes only)."""
+    # Fail fast instead of queueing every request behind the ACCESS EXCLUSIVE locks
+    op.execute("SET LOCAL lock_timeout = '10s'")
+    for name, table, _ in USER_FOREIGN_KEYS:
+        op.drop_constraint(name, table, type_="foreignkey")
+
+    for table, columns in KEY_COLUMNS.items():
+        op.execute(f"DROP TRIGGER {table}_key_shadow ON {table}")
+        op.execute(f"DROP FUNCTION {table}_key_shadow()")
+        op.drop_constraint(f"{table}_pkey", table, type_="primary")
+        for column in columns:
+            if (table, column) in NOT_NULL_COLUMNS:
+                op.alter_column(table, _shadow(column), nullable=False)
+                op.drop_constraint(
+                    f"{table}_{_shadow(column)}_not_null", table, type_="check"
+                )
+            # Drops the old key indexes with it
+            op.drop_column(table, column)
+            op.alter_column(table, _shadow(column), new_column_name=column)
+
+        for relation in partitions.get(table, [table]):
+            op.execute(
+                f"ALTER TABLE {relation} ADD CONSTRAINT {relation}_pkey "
+                f"PRIMARY KEY USING INDEX {relation}_pkey_new"
+            )
+        if table in PARTITIONED_TABLES:
+            op.create_primary_key(f"{table}_pkey", table, list(_primary_key(table)))
+        for name, _, _ in (index for index in KEY_INDEXES if index[1] == table):
+            op.execute(f"ALTER INDEX {name}_new RENAME TO {name}")
+            for relation in partitions.get(table, []):
+                index = _partition_index(relation, table, name)
+                op.execute(f"ALTER INDEX {index}_new RENAME TO {index}")
+
+    for name, table, column in USER_FOREIGN_KEYS:
+        for relation in partitions.get(table, [table]):
+            op.execute(
+                f"ALTER TABLE {relation} RENAME CONSTRAINT "
+                f"{relation}_{_shadow(column)}_fkey TO {relation}_{column}_fkey"
+            )
+        if table in PARTITIONED_TABLES:
+            op.create_foreign_key(name, table, "users", [column], ["user_id"])
+
+
+def _convert(type_: str) -> None:
+    partitions = {
+        table: [
+            name
+            for (name,) in op.get_bind().execute(LIST_PARTITIONS_SQL, {"table": table})
+        ]
+        for table in PARTITIONED_TABLES
+    }
+    _add_shadow_columns(type_)
+    with op.get_context().autocommit_block():
+        _prepare(partitions, type_)
+    # Runs in the migration transaction, so its locks are released on commit
+    _swap(partitions)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _convert("uuid")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _convert("varchar")
@@ -0,0 +1,81 @@
+"""add content hash dedup
+
+Adds content_hash / use_count / last_used_at to prompts and structured_prompts
+and the (author_id, content_hash) lookup index. Existing rows keep a NULL hash,
+deduplication applies to new submissions.
+
+Revision ID: c1d7a3e9f524
+Revises: b3e8f1c6a074
+Create Date: 2026-10-19 16:20:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c1d7a3e9f524"
+down_revision: Union[str, Sequence[str], None] = "b3e8f1c6a074"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ("prompts", "structured_prompts")
+
+LIST_PARTITIONS_SQL = sa.text(
+    "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+    "WHERE i.inhparent = CAST(:table AS regclass)"
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    partitions = {}
+    for table in TABLES:
+        # No volatile defaults, so none of these rewrite the table
+        op.add_column(table, sa.Column("content_hash", sa.LargeBinary(), nullable=True))
+        op.add_column(
+            table,
+            sa.Column(
+                "use_count", sa.Integer(), server_default=sa.text("1"), nullable=False
+            ),
+        )
+        op.add_column(
+            table,
+            sa.Column("last_used_at", sa.DateTime(timezone=True), nullable=True),
+        )
+        # An index on a partitioned table cannot be built CONCURRENTLY: create it on
+        # the parent only (invalid until every partition has one), then build and
+        # attach the partition indexes one by one without blocking writes.
+        op.execute(
+            f"CREATE INDEX ix_{table}_author_content_hash "
+            f"ON ONLY {table} (author_id, content_hash)"
+        )
+        partitions[table] = [
+            name
+            for (name,) in op.get_bind().execute(LIST_PARTITIONS_SQL, {"table": table})
+        ]
+
+    with op.get_context().autocommit_block():
+        for table, names in partitions.items():
+            for name in names:
+                op.execute(
+                    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name}_author_content_hash_idx "
+                    f"ON {name} (author_id, content_hash)"
+                )
+                op.execute(
+                    f"ALTER INDEX ix_{table}_author_content_hash "
+                    f"ATTACH PARTITION {name}_author_content_hash_idx"
+                )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in TABLES:
+        # Drops the partition indexes with it
+        op.drop_index(f"ix_{table}_author_content_hash", table_name=table)
+        op.drop_column(table, "last_used_at")
+        op.drop_column(table, "use_count")
+        op.drop_column(table, "content_hash")
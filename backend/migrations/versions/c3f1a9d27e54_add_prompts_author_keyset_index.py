@@ -0,0 +1,43 @@
+"""add prompts author keyset index
+
+Revision ID: c3f1a9d27e54
+Revises: b4d5e6f7g8h9
+Create Date: 2026-10-19 09:12:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c3f1a9d27e54"
+down_revision: Union[str, Sequence[str], None] = "b4d5e6f7g8h9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Composite index backing the keyset pagination of GET /pcrafter/
+    # CONCURRENTLY must run outside the migration transaction.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_prompts_author_created_id",
+            "prompts",
+            ["author_id", sa.text("created_at DESC"), sa.text("prompt_id DESC")],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_prompts_author_created_id",
+            table_name="prompts",
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,72 @@
+"""refresh token digest lookup
+
+Refresh tokens are looked up by an HMAC-SHA256 digest (token_digest) instead of
+bcrypt-checking every unexpired row. Existing rows only have a bcrypt hash that
+cannot be turned into a digest: expired ones are deleted, unexpired ones stay
+as legacy rows (token_digest NULL) until they expire.
+
+Revision ID: d4a2f8b6c913
+Revises: c1d7a3e9f524
+Create Date: 2026-10-19 17:05:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d4a2f8b6c913"
+down_revision: Union[str, Sequence[str], None] = "c1d7a3e9f524"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "refresh_tokens", sa.Column("token_digest", sa.String(length=64), nullable=True)
+    )
+    op.alter_column(
+        "refresh_tokens", "token_hash", existing_type=sa.String(), nullable=True
+    )
+    op.execute("DELETE FROM refresh_tokens WHERE expires_at <= now()")
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_refresh_tokens_token_digest",
+            "refresh_tokens",
+            ["token_digest"],
+            unique=True,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_refresh_tokens_user_id_expires_at",
+            "refresh_tokens",
+            ["user_id", "expires_at"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_refresh_tokens_user_id_expires_at",
+            table_name="refresh_tokens",
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_refresh_tokens_token_digest",
+            table_name="refresh_tokens",
+            postgresql_concurrently=True,
+        )
+    # Digest-only tokens have no bcrypt hash to fall back to, their users log in again
+    op.execute("DELETE FROM refresh_tokens WHERE token_hash IS NULL")
+    op.alter_column(
+        "refresh_tokens", "token_hash", existing_type=sa.String(), nullable=False
+    )
+    op.drop_column("refresh_tokens", "token_digest")
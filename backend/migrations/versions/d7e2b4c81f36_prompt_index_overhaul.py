@@ -0,0 +1,125 @@
+"""prompt index overhaul
+
+Drops the btree indexes on the free-text title/role/task columns and the
+duplicate prompt_id indexes (the primary key already has one), and adds the
+indexes the application queries actually use.
+
+Revision ID: d7e2b4c81f36
+Revises: c3f1a9d27e54
+Create Date: 2026-10-19 10:05:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d7e2b4c81f36"
+down_revision: Union[str, Sequence[str], None] = "c3f1a9d27e54"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY keeps the tables writable while indexes are built/dropped,
+    # and it cannot run inside the migration transaction.
+    with op.get_context().autocommit_block():
+        for index_name in (
+            "ix_prompts_title",
+            "ix_prompts_role",
+            "ix_prompts_task",
+            "ix_prompts_prompt_id",
+        ):
+            op.drop_index(
+                index_name,
+                table_name="prompts",
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
+        op.drop_index(
+            "ix_structured_prompts_prompt_id",
+            table_name="structured_prompts",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+        op.create_index(
+            "ix_structured_prompts_author_created_id",
+            "structured_prompts",
+            ["author_id", sa.text("created_at DESC"), sa.text("prompt_id DESC")],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_structured_prompts_original_prompt_id",
+            "structured_prompts",
+            ["original_prompt_id"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_prompts_created_at_brin",
+            "prompts",
+            ["created_at"],
+            unique=False,
+            postgresql_using="brin",
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_structured_prompts_created_at_brin",
+            "structured_prompts",
+            ["created_at"],
+            unique=False,
+            postgresql_using="brin",
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_structured_prompts_created_at_brin",
+            table_name="structured_prompts",
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_prompts_created_at_brin",
+            table_name="prompts",
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_structured_prompts_original_prompt_id",
+            table_name="structured_prompts",
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_structured_prompts_author_created_id",
+            table_name="structured_prompts",
+            postgresql_concurrently=True,
+        )
+
+        op.create_index(
+            "ix_structured_prompts_prompt_id",
+            "structured_prompts",
+            ["prompt_id"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        for index_name, column in (
+            ("ix_prompts_prompt_id", "prompt_id"),
+            ("ix_prompts_task", "task"),
+            ("ix_prompts_role", "role"),
+            ("ix_prompts_title", "title"),
+        ):
+            op.create_index(
+                index_name,
+                "prompts",
+                [column],
+                unique=False,
+                postgresql_concurrently=True,
+            )
@@ -0,0 +1,83 @@
+"""add prompt full text search
+
+Revision ID: e5a8c0f3b912
+Revises: d7e2b4c81f36
+Create Date: 2026-10-19 11:20:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e5a8c0f3b912"
+down_revision: Union[str, Sequence[str], None] = "d7e2b4c81f36"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Keep in sync with db.models.PROMPT_SEARCH_VECTOR
+PROMPT_SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(role, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(task, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(constraints, '')), 'C')"
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.add_column(
+        "prompts",
+        sa.Column(
+            "is_public", sa.Boolean(), server_default=sa.text("false"), nullable=False
+        ),
+    )
+    # NOTE: adding a stored generated column rewrites the table once.
+    op.add_column(
+        "prompts",
+        sa.Column(
+            "search_vector",
+            postgresql.TSVECTOR(),
+            sa.Computed(PROMPT_SEARCH_VECTOR, persisted=True),
+            nullable=True,
+        ),
+    )
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_prompts_search_vector",
+            "prompts",
+            ["search_vector"],
+            unique=False,
+            postgresql_using="gin",
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_prompts_title_trgm",
+            "prompts",
+            ["title"],
+            unique=False,
+            postgresql_using="gin",
+            postgresql_ops={"title": "gin_trgm_ops"},
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_prompts_title_trgm", table_name="prompts", postgresql_concurrently=True
+        )
+        op.drop_index(
+            "ix_prompts_search_vector",
+            table_name="prompts",
+            postgresql_concurrently=True,
+        )
+    op.drop_column("prompts", "search_vector")
+    op.drop_column("prompts", "is_public")
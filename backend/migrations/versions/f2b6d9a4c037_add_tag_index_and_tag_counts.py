@@ -0,0 +1,94 @@
+"""add tag index and tag counts
+
+Revision ID: f2b6d9a4c037
+Revises: e5a8c0f3b912
+Create Date: 2026-10-19 12:40:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f2b6d9a4c037"
+down_revision: Union[str, Sequence[str], None] = "e5a8c0f3b912"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Keep in sync with db.models.TAG_COUNTS_SYNC_FUNCTION / TAG_COUNTS_SYNC_TRIGGER
+TAG_COUNTS_SYNC_FUNCTION = """
+CREATE OR REPLACE FUNCTION prompts_tag_counts_sync() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.is_public AND OLD.tags IS NOT NULL THEN
+        UPDATE tag_counts SET prompt_count = prompt_count - 1
+        WHERE tag IN (SELECT DISTINCT unnest(OLD.tags));
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.is_public AND NEW.tags IS NOT NULL THEN
+        INSERT INTO tag_counts (tag, prompt_count)
+        SELECT DISTINCT unnest(NEW.tags), 1
+        ON CONFLICT (tag) DO UPDATE SET prompt_count = tag_counts.prompt_count + 1;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+TAG_COUNTS_SYNC_TRIGGER = """
+CREATE TRIGGER prompts_tag_counts_sync
+AFTER INSERT OR DELETE OR UPDATE OF tags, is_public ON prompts
+FOR EACH ROW EXECUTE FUNCTION prompts_tag_counts_sync()
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "tag_counts",
+        sa.Column("tag", sa.String(), nullable=False),
+        sa.Column(
+            "prompt_count", sa.Integer(), server_default=sa.text("0"), nullable=False
+        ),
+        sa.PrimaryKeyConstraint("tag"),
+    )
+    op.create_index(
+        "ix_tag_counts_prompt_count",
+        "tag_counts",
+        [sa.text("prompt_count DESC")],
+        unique=False,
+    )
+
+    # Install the trigger and backfill in the same transaction so no write is missed
+    op.execute(TAG_COUNTS_SYNC_FUNCTION)
+    op.execute(TAG_COUNTS_SYNC_TRIGGER)
+    op.execute(
+        """
+        INSERT INTO tag_counts (tag, prompt_count)
+        SELECT tag, count(*)
+        FROM (SELECT DISTINCT prompt_id, unnest(tags) AS tag FROM prompts WHERE is_public) t
+        GROUP BY tag
+        """
+    )
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_prompts_tags",
+            "prompts",
+            ["tags"],
+            unique=False,
+            postgresql_using="gin",
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_prompts_tags", table_name="prompts", postgresql_concurrently=True
+        )
+    op.execute("DROP TRIGGER IF EXISTS prompts_tag_counts_sync ON prompts")
+    op.execute("DROP FUNCTION IF EXISTS prompts_tag_counts_sync()")
+    op.drop_index("ix_tag_counts_prompt_count", table_name="tag_counts")
+    op.drop_table("tag_counts")
@@ -0,0 +1,71 @@
+"""one refinement per prompt
+
+Structured prompts linked to a prompt are deduplicated on original_prompt_id
+alone (their content_hash becomes the hash of the original prompt's id), so a
+resubmitted prompt reuses its refinement instead of storing another one with
+different AI output. Rows already duplicated are merged into the oldest one.
+
+A unique index is not possible: the table is partitioned on created_at, which
+every unique index would have to include. Writers are serialized with the same
+advisory lock as the rest of the content-hash deduplication (db.dedup).
+
+Revision ID: f6c2a8d4e190
+Revises: d4a2f8b6c913
+Create Date: 2026-10-19 18:30:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f6c2a8d4e190"
+down_revision: Union[str, Sequence[str], None] = "d4a2f8b6c913"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+RANKED_REFINEMENTS = """
+WITH ranked AS (
+    SELECT
+        prompt_id,
+        created_at,
+        row_number() OVER (
+            PARTITION BY original_prompt_id ORDER BY created_at, prompt_id
+        ) AS rank,
+        sum(use_count) OVER (PARTITION BY original_prompt_id) AS uses,
+        max(last_used_at) OVER (PARTITION BY original_prompt_id) AS last_used
+    FROM structured_prompts
+    WHERE original_prompt_id IS NOT NULL
+)
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(
+        RANKED_REFINEMENTS + "UPDATE structured_prompts s "
+        "SET use_count = r.uses, last_used_at = r.last_used FROM ranked r "
+        "WHERE s.prompt_id = r.prompt_id AND s.created_at = r.created_at "
+        "AND r.rank = 1"
+    )
+    op.execute(
+        RANKED_REFINEMENTS + "DELETE FROM structured_prompts s USING ranked r "
+        "WHERE s.prompt_id = r.prompt_id AND s.created_at = r.created_at "
+        "AND r.rank > 1"
+    )
+    # Same digest as core.formatters.content_hash(str(original_prompt_id)): the
+    # text form of a uuid is already normalized (lower case, no whitespace)
+    op.execute(
+        "UPDATE structured_prompts "
+        "SET content_hash = sha256(convert_to(original_prompt_id::text, 'UTF8')) "
+        "WHERE original_prompt_id IS NOT NULL"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Merged rows cannot be restored and the keys still deduplicate correctly
+    # with the previous code (one row per prompt), so there is nothing to undo.
+    pass
@@ -10,16 +10,46 @@ Note:
     FileResponse is currently imported for potential future use in endpoints that may need to return files (e.g., prompt exports or downloads).
 """
 
-from typing import List
-from fastapi import APIRouter, status, Depends, HTTPException
-
-from core.schemas import PromptSchema, PromptSchemaOutput
-from auth.dependencies import get_current_user
-from core.custom_error_handlers import PromptNotModified, PromptsNotFoundForCurrentUser
+import uuid
+import tempfile
+from typing import Any, Dict, List, Optional
+from pydantic import ValidationError
+from fastapi import APIRouter, status, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
+
+from core.schemas import (
+    PromptSchema,
+    PromptSchemaOutput,
+    PromptPageSchema,
+    TagCountSchema,
+    PromptImportResultSchema,
+    PromptBatchItemSchema,
+    PromptBatchResultSchema,
+    UserPromptsSchema,
+    UserPromptsPageSchema,
+)
+from core.config import settings
+from core.streaming import NDJSON_MEDIA_TYPE
+from core.http_cache import (
+    PRIVATE_REVALIDATE,
+    etag_matches,
+    public_library_cache_control,
+)
+from core.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from auth.dependencies import get_current_user, get_read_db
+from core.custom_error_handlers import (
+    PromptNotModified,
+    PromptsNotFoundForCurrentUser,
+    ImportTooLarge,
+    PromptBatchTooLarge,
+)
 from sqlalchemy.orm import Session
 from db.database import get_db
 from services.prompt_service import PromptService
 from services.st_prompt_service import RestructuredPromptService
+from services.prompt_transfer_service import PromptTransferService
+from services.prompt_cache import prompt_cache
 from services.user_service import UserService
 from utility.logger import get_logger
 
@@ -29,6 +59,7 @@ router = APIRouter(prefix="/pcrafter", tags=["prompts"])
 prompt_service = PromptService()
 st_prompt_service = RestructuredPromptService()
 user_service = UserService()
+transfer_service = PromptTransferService()
 lg = get_logger(__file__)
 
 # Note: We rely on the global exception handler in main.py to catch and log any DB errors
@@ -89,42 +120,340 @@ def create_new_prompt(
         raise PromptNotModified
 
 
+@router.post(
+    "/batch", status_code=status.HTTP_200_OK, response_model=PromptBatchResultSchema
+)
+def create_new_prompts(
+    items: List[Dict[str, Any]],
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+) -> PromptBatchResultSchema:
+    """
+    Create many prompts and their structured versions in one request.
+
+    Every item is validated on its own, so invalid items are reported without
+    failing the others. The daily quota of verified users is charged once for
+    all valid items, prompts and structured prompts are each saved with one
+    multi-row insert, and AI refinements run concurrently (up to LLM_MAX_CONCURRENCY).
+
+    Args:
+        items (List[dict]): The prompts, as for POST /pcrafter/, at most PROMPT_BATCH_MAX_ITEMS.
+        db (Session, optional): SQLAlchemy database session dependency.
+        current_user (User, optional): The currently authenticated user dependency.
+
+    Returns:
+        PromptBatchResultSchema: One result or error per item, in submission order.
+
+    Raises:
+        PromptBatchTooLarge: If there are more than PROMPT_BATCH_MAX_ITEMS items.
+        RateLimitExceeded: If the batch exceeds the remaining daily quota.
+    """
+    if len(items) > settings.PROMPT_BATCH_MAX_ITEMS:
+        raise PromptBatchTooLarge()
+
+    results = [PromptBatchItemSchema(index=i) for i in range(len(items))]
+    valid, prompts = [], []
+    for i, item in enumerate(items):
+        try:
+            prompts.append(PromptSchema.model_validate(item))
+            valid.append(i)
+        except ValidationError as e:
+            results[i].error = e.errors()[0]["msg"]
+    if not prompts:
+        return PromptBatchResultSchema(items=results)
+
+    use_ai = current_user.is_verified
+    if use_ai:
+        user_service.check_daily_limit(
+            db=db, user_id=current_user.user_id, cost=len(prompts)
+        )
+
+    saved = prompt_service.save_prompts(
+        db=db, prompts=prompts, author_id=current_user.user_id
+    )
+    outputs = st_prompt_service.create_structured_prompts(
+        db=db, prompts=saved, use_ai=use_ai
+    )
+    for i, output in zip(valid, outputs):
+        if isinstance(output, Exception):
+            results[i].error = "Structured prompt creation failed."
+        else:
+            results[i].result = output
+    return PromptBatchResultSchema(items=results)
+
+
 # NOTE: so instead of separately returning the prompt and structured prompt for this routes
 # we can create schema to return all the info related to the prompt id
 # since author_id is tied to the restructured prompt and non structured prompt
 
 
 # If user is implemented the uncomment the below path operator
-@router.get("/", status_code=status.HTTP_200_OK, response_model=List[PromptSchema])
+@router.get(
+    "/",
+    status_code=status.HTTP_200_OK,
+    response_model=PromptPageSchema,
+    responses={200: {"content": {NDJSON_MEDIA_TYPE: {}}}},
+)
 def get_all_previous_prompts(
-    current_user=Depends(get_current_user), db: Session = Depends(get_db)
+    request: Request,
+    cursor: Optional[str] = Query(default=None),
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user=Depends(get_current_user),
+    db: Session = Depends(get_read_db),
 ):
     """
-    Retrieve all previously created prompts.
-    This endpoint fetches all prompts stored in the database.
+    Retrieve the current user's prompts, newest first, one page at a time.
+
+    Clients sending 'Accept: application/x-ndjson' get the whole history streamed
+    instead, one prompt per line, without pagination.
 
     Args:
+        cursor (str, optional): The 'next_cursor' returned by the previous page. Omit for the first page.
+        limit (int, optional): Page size, between 1 and MAX_PAGE_SIZE.
         db (Session, optional): SQLAlchemy database session dependency.
 
     Returns:
-        List[PromptSchema]: A list of all prompt records.
+        PromptPageSchema: The page of prompts and the cursor of the next page (null on the last page).
     """
-    # get historical prompts
-    # TODO: this requeires user id  dependency to retrieve the desired prompt
-    # later implement user based retreival , something prompts for the current user onl.
-    all_previous_prompts = prompt_service.get_all_prompt(
-        user_id=current_user.user_id, db=db
+    if NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+        return StreamingResponse(
+            prompt_service.stream_all_prompts(user_id=current_user.user_id, db=db),
+            media_type=NDJSON_MEDIA_TYPE,
+        )
+
+    headers = {"Cache-Control": PRIVATE_REVALIDATE, "Vary": "Accept"}
+    etag = prompt_cache.etag(str(current_user.user_id))
+    if etag is not None:
+        headers["ETag"] = etag
+        # Answered before any query: the version covers every page
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    def build_page() -> bytes:
+        all_previous_prompts, next_cursor = prompt_service.get_all_prompt(
+            user_id=current_user.user_id, db=db, cursor=cursor, limit=limit
+        )
+        return (
+            PromptPageSchema(
+                items=[PromptSchema.model_validate(p) for p in all_previous_prompts],
+                next_cursor=next_cursor,
+            )
+            .model_dump_json()
+            .encode()
+        )
+
+    body = prompt_cache.get_or_build(
+        user_id=str(current_user.user_id),
+        variant=f"list:{cursor or ''}:{limit}",
+        build=build_page,
+    )
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.get(
+    "/history", status_code=status.HTTP_200_OK, response_model=UserPromptsPageSchema
+)
+def get_prompt_history(
+    cursor: Optional[str] = Query(default=None),
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user=Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Retrieve the current user's prompts together with their structured versions, newest first.
+
+    Args:
+        cursor (str, optional): The 'next_cursor' returned by the previous page. Omit for the first page.
+        limit (int, optional): Page size, between 1 and MAX_PAGE_SIZE.
+        db (Session, optional): SQLAlchemy database session dependency.
+
+    Returns:
+        UserPromptsPageSchema: The page of prompts and the cursor of the next page (null on the last page).
+    """
+    prompts, next_cursor = st_prompt_service.get_all_restructured_prompt_by_user_id(
+        id=current_user.user_id, db=db, cursor=cursor, limit=limit
+    )
+    return UserPromptsPageSchema(
+        items=[UserPromptsSchema.model_validate(p) for p in prompts],
+        next_cursor=next_cursor,
+    )
+
+
+@router.get("/search", status_code=status.HTTP_200_OK, response_model=PromptPageSchema)
+def search_prompts(
+    response: Response,
+    q: str = Query(min_length=1, max_length=200),
+    public: bool = Query(default=False),
+    cursor: Optional[str] = Query(default=None),
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user=Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Search prompts by title, role, task and constraints, most relevant first.
+
+    Args:
+        q (str): The search text. Words are matched as prefixes, titles also tolerate typos.
+        public (bool, optional): Search the public prompt library instead of your own prompts.
+        cursor (str, optional): The 'next_cursor' returned by the previous page.
+        limit (int, optional): Page size, between 1 and MAX_PAGE_SIZE.
+        db (Session, optional): SQLAlchemy database session dependency.
+
+    Returns:
+        PromptPageSchema: The page of matching prompts and the cursor of the next page.
+    """
+    prompts, next_cursor = prompt_service.search_prompts(
+        db=db,
+        query_text=q,
+        user_id=current_user.user_id,
+        public=public,
+        cursor=cursor,
+        limit=limit,
+    )
+    if public:
+        response.headers["Cache-Control"] = public_library_cache_control()
+    return PromptPageSchema(
+        items=[PromptSchema.model_validate(p) for p in prompts],
+        next_cursor=next_cursor,
+    )
+
+
+@router.get(
+    "/tags", status_code=status.HTTP_200_OK, response_model=List[TagCountSchema]
+)
+def get_tag_facets(
+    response: Response,
+    prefix: Optional[str] = Query(default=None, max_length=100),
+    limit: int = Query(default=50, ge=1, le=MAX_PAGE_SIZE),
+    current_user=Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Retrieve the tags of the public prompt library with the number of prompts using each.
+
+    Args:
+        prefix (str, optional): Only return tags starting with this text (autocomplete).
+        limit (int, optional): Maximum number of tags to return.
+        db (Session, optional): SQLAlchemy database session dependency.
+
+    Returns:
+        List[TagCountSchema]: Tags ordered by prompt count, most used first.
+    """
+    tag_counts = prompt_service.get_tag_counts(db=db, prefix=prefix, limit=limit)
+    response.headers["Cache-Control"] = public_library_cache_control()
+    return [TagCountSchema(tag=t.tag, count=t.prompt_count) for t in tag_counts]
+
+
+@router.get(
+    "/tags/{tag}", status_code=status.HTTP_200_OK, response_model=PromptPageSchema
+)
+def get_public_prompts_by_tag(
+    tag: str,
+    response: Response,
+    cursor: Optional[str] = Query(default=None),
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user=Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Retrieve the public prompts carrying a tag, newest first, one page at a time.
+
+    Args:
+        tag (str): The tag to browse.
+        cursor (str, optional): The 'next_cursor' returned by the previous page.
+        limit (int, optional): Page size, between 1 and MAX_PAGE_SIZE.
+        db (Session, optional): SQLAlchemy database session dependency.
+
+    Returns:
+        PromptPageSchema: The page of prompts and the cursor of the next page.
+    """
+    prompts, next_cursor = prompt_service.get_public_prompts_by_tag(
+        db=db, tag=tag, cursor=cursor, limit=limit
+    )
+    response.headers["Cache-Control"] = public_library_cache_control()
+    return PromptPageSchema(
+        items=[PromptSchema.model_validate(p) for p in prompts],
+        next_cursor=next_cursor,
+    )
+
+
+@router.post(
+    "/import", status_code=status.HTTP_200_OK, response_model=PromptImportResultSchema
+)
+async def import_prompts(
+    request: Request,
+    fmt: str = Query(default="ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    current_user=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Bulk import prompts from an NDJSON or CSV request body, optionally gzip-compressed.
+
+    The body is spooled to a temporary file while it is received (memory above
+    IMPORT_SPOOL_BYTES goes to disk) and then loaded with COPY in chunks.
+    Prompts the user already has are deduplicated, not imported again.
+    No AI refinement is run, so imports do not use the daily token quota.
+
+    Args:
+        request (Request): The raw request, its body is one prompt per line (NDJSON) or a CSV with a header row.
+        fmt (str, optional): 'ndjson' (default) or 'csv'. CSV tags are separated by ';'.
+        db (Session, optional): SQLAlchemy database session dependency.
+
+    Returns:
+        PromptImportResultSchema: Imported/deduplicated/rejected counts and the first errors.
+
+    Raises:
+        ImportTooLarge: If the body is larger than IMPORT_MAX_BYTES.
+    """
+    with tempfile.SpooledTemporaryFile(max_size=settings.IMPORT_SPOOL_BYTES) as body:
+        received = 0
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > settings.IMPORT_MAX_BYTES:
+                raise ImportTooLarge()
+            body.write(chunk)
+        body.seek(0)
+
+        # COPY is blocking, keep it off the event loop
+        return await run_in_threadpool(
+            transfer_service.import_prompts,
+            db=db,
+            body=body,
+            fmt=fmt,
+            author_id=current_user.user_id,
+        )
+
+
+@router.get("/export", status_code=status.HTTP_200_OK)
+def export_prompts(
+    fmt: str = Query(default="ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    current_user=Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Export all of the current user's prompts as a streamed NDJSON or CSV download.
+
+    Args:
+        fmt (str, optional): 'ndjson' (default) or 'csv'.
+        db (Session, optional): SQLAlchemy database session dependency.
+
+    Returns:
+        StreamingResponse: The prompts, oldest first.
+    """
+    media_type = "text/csv" if fmt == "csv" else NDJSON_MEDIA_TYPE
+    return StreamingResponse(
+        transfer_service.export_prompts(db=db, author_id=current_user.user_id, fmt=fmt),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="prompts.{fmt}"'},
     )
-    if all_previous_prompts is None:
-        raise PromptsNotFoundForCurrentUser
-    return all_previous_prompts
 
 
 @router.get("/{prompt_id}", status_code=status.HTTP_200_OK, response_model=PromptSchema)
 def get_all_previous_prompt_by_id(
-    prompt_id: str,
+    prompt_id: uuid.UUID,
+    request: Request,
     current_user=Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     """
     Retrieve a prompt by its unique identifier.
@@ -133,26 +462,46 @@ def get_all_previous_prompt_by_id(
     planned for future implementation to allow fetching prompts specific to the current user.
 
     Args:
-        prompt_id (str): The unique identifier of the prompt.
+        prompt_id (uuid.UUID): The unique identifier of the prompt.
         db (Session, optional): SQLAlchemy database session dependency.
 
     Returns:
         PromptSchema: The prompt record matching the given ID.
     """
+
     # get historical prompts
     # TODO: this requeires user id  dependency to retrieve the desired prompt
     # later implement user based retreival , something prompts for the current user onl.
-    all_previous_prompts = prompt_service.get_prompt_by_id(
-        user_id=current_user.user_id, prompt_id=prompt_id, db=db
+    headers = {"Cache-Control": PRIVATE_REVALIDATE}
+    etag = prompt_cache.etag(str(current_user.user_id), resource=str(prompt_id))
+    if etag is not None:
+        headers["ETag"] = etag
+
+    def build_prompt() -> bytes:
+        all_previous_prompts = prompt_service.get_prompt_by_id(
+            user_id=current_user.user_id, prompt_id=str(prompt_id), db=db
+        )
+        if all_previous_prompts is None:
+            raise PromptsNotFoundForCurrentUser
+        return (
+            PromptSchema.model_validate(all_previous_prompts).model_dump_json().encode()
+        )
+
+    body = prompt_cache.get_or_build(
+        user_id=str(current_user.user_id),
+        variant=f"item:{prompt_id}",
+        build=build_prompt,
     )
-    if all_previous_prompts is None:
-        raise PromptsNotFoundForCurrentUser
-    return all_previous_prompts
+    # Only once the prompt is known to exist and belong to the user (a cache hit
+    # or a build that did not raise), the version alone does not tell
+    if etag is not None and etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @router.delete("/{prompt_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_prompt(
-    prompt_id: str,
+    prompt_id: uuid.UUID,
     current_user=Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
@@ -163,7 +512,7 @@ def delete_prompt(
     required for this operation and will be implemented in the future.
 
     Args:
-        prompt_id (str): The unique identifier of the prompt to delete.
+        prompt_id (uuid.UUID): The unique identifier of the prompt to delete.
         db (Session, optional): SQLAlchemy database session dependency.
 
     Returns:
@@ -171,7 +520,7 @@ def delete_prompt(
     """
     # NOTE: this requires user id to operate
     if prompt_service.delete_prompt(
-        user_id=current_user.user_id, prompt_id=prompt_id, db=db
+        user_id=current_user.user_id, prompt_id=str(prompt_id), db=db
     ):
         return HTTPException(
             status_code=status.HTTP_204_NO_CONTENT,
@@ -181,7 +530,7 @@ def delete_prompt(
 
 @router.post("/{prompt_id}", status_code=status.HTTP_200_OK)
 def update_prompt(
-    prompt_id: str,
+    prompt_id: uuid.UUID,
     current_user=Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
@@ -192,7 +541,7 @@ def update_prompt(
     authorization is required for this operation and will be implemented in the future.
 
     Args:
-        prompt_id (str): The unique identifier of the prompt to update.
+        prompt_id (uuid.UUID): The unique identifier of the prompt to update.
         db (Session, optional): SQLAlchemy database session dependency.
 
     Returns:
@@ -1,4 +1,5 @@
 # user page
+import uuid
 from datetime import timedelta, datetime
 from fastapi import APIRouter, status, Depends, HTTPException, Request
 from fastapi.responses import JSONResponse, RedirectResponse
@@ -9,7 +10,7 @@ from sqlalchemy.orm import Session
 from db.database import get_db
 from db.redis import add_jit_to_blocklist
 from core.config import settings
-from core.custom_error_handlers import InvalidToken
+from core.custom_error_handlers import InvalidToken, UserNotFound
 from core.schemas import UserOutSchema
 from auth.oauth2 import create_access_token, decode_access_token
 
@@ -28,8 +29,8 @@ lg = get_logger(script_path=__file__)
 
 
 @router.post(path="/id/{user_id}", response_model=UserOutSchema)
-def get_user_by_id(user_id: str, db: Session = Depends(dependency=get_db)):
-    user = uservice.get_user_by_id(user_id=user_id, db=db)
+def get_user_by_id(user_id: uuid.UUID, db: Session = Depends(dependency=get_db)):
+    user = uservice.get_user_by_id(user_id=str(user_id), db=db)
     return user
 
 
@@ -46,12 +47,16 @@ def get_new_access_token(
     user_id = user_data.get("user_id")
     email = user_data.get("email")
 
-    user = uservice.get_user_by_email(email=email, db=db)
-    if user is None or str(user.user_id) != user_id:
+    try:
+        user = uservice.get_user_profile(user_id=user_id, db=db)
+    except UserNotFound:
+        # A deleted user's refresh token is just an invalid token
+        raise InvalidToken()
+    if user.email != email:
         raise InvalidToken()
 
     # Invalidate old refresh token
-    uservice.invalidate_refresh_token(token, db)
+    uservice.invalidate_refresh_token(token, db, user_id=user_id)
 
     # Generate new access token
     new_access_token = create_access_token(
@@ -100,7 +105,7 @@ async def logout(
 
     jti = token_data["jti"]
     user_id = token_data["user_id"]
-    await add_jit_to_blocklist(jti)
+    await add_jit_to_blocklist(jti, exp=token_data.get("exp"))
     # Invalidate all refresh tokens for the user
     uservice.invalidate_all_user_refresh_tokens(user_id, db)
     lg.info(f"User {user_id} logged out, tokens invalidated")
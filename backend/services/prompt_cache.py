@@ -0,0 +1,105 @@
+"""
+Per-user cache of prompt read responses (GET /pcrafter/ and /pcrafter/{prompt_id}).
+
+Built on core.cache.VersionedCache: each user's cached responses are the
+serialized JSON bodies, grouped under the user_id (one field per page or
+prompt) next to the version of the user's prompts. Any committed change to the
+user's prompts drops the group and replaces the version; a response built while
+that happened is not stored, so invalidation is exact. The version doubles as
+the ETag of the responses, so conditional requests are answered from it alone.
+
+On a miss one request rebuilds the response: concurrent requests in the same
+process wait for it in memory, those of other processes with one blocking Redis
+wait, instead of all querying the database.
+"""
+
+from typing import Callable
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from db.database import mark_written
+from db.models import Prompts
+from core.cache import VersionedCache
+from core.config import settings
+
+
+class PromptResponseCache:
+    def __init__(self):
+        self.responses = VersionedCache(
+            "prompt_responses",
+            ttl=settings.PROMPT_CACHE_TTL_SECONDS,
+            version_ttl=settings.PROMPT_VERSION_TTL_SECONDS,
+            # Bodies are served as stored, a hit never decompresses
+            compress_min_bytes=None,
+            shared_wait=settings.PROMPT_CACHE_WAIT_MS / 1000,
+        )
+
+    def get_or_build(
+        self, user_id: str, variant: str, build: Callable[[], bytes]
+    ) -> bytes:
+        """
+        Cached response body of a user, built and stored on a miss.
+        Args:
+            user_id (str): The user the response belongs to.
+            variant (str): Identifies the response among the user's (route and parameters).
+            build (Callable[[], bytes]): Builds the serialized body, may raise.
+        Returns:
+            bytes: The JSON response body.
+        """
+        return self.responses.get_or_set((user_id, variant), build)
+
+    def etag(self, user_id: str, resource: str | None = None) -> str | None:
+        """
+        Strong ETag of all of a user's prompt responses: the version of the user's
+        prompts. Versions are random and replaced on every change, so an ETag is
+        never reused, not even across users or after the key expired.
+        Args:
+            user_id (str): The ID of the user.
+            resource (str, optional): Narrows the ETag to one response, e.g. a prompt id.
+        Returns:
+            str | None: The quoted ETag, None if Redis is unavailable.
+        """
+        version = self.responses.version(user_id)
+        if version is None:
+            return None
+        if resource is not None:
+            return f'"{version}:{resource}"'
+        return f'"{version}"'
+
+    def invalidate(self, user_ids: set[str]) -> None:
+        """
+        Drop the cached responses of users whose prompts changed.
+        Args:
+            user_ids (set[str]): IDs of the authors.
+        """
+        self.responses.invalidate(*user_ids)
+
+
+prompt_cache = PromptResponseCache()
+
+
+def mark_prompts_changed(db: Session, author_id: str) -> None:
+    """Invalidate an author's cached responses on commit, for writes that bypass the ORM (COPY, bulk INSERT)."""
+    db.info.setdefault("changed_prompt_authors", set()).add(str(author_id))
+    # The same writes must also pin the author's reads to the primary
+    mark_written(db, author_id)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_prompt_authors(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Prompts) and obj.author_id:
+            mark_prompts_changed(session, obj.author_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_prompt_authors(session):
+    changed = session.info.pop("changed_prompt_authors", None)
+    if changed:
+        prompt_cache.invalidate(changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_prompt_authors(session):
+    session.info.pop("changed_prompt_authors", None)
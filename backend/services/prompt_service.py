@@ -1,16 +1,44 @@
+import re
 import uuid
+from typing import Iterator
+from sqlalchemy import tuple_, func, or_, cast, select, insert
+from sqlalchemy.dialects.postgresql import DOUBLE_PRECISION
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 
 
-from db.models import Prompts
+from db.models import Prompts, TagCount
+from db.dedup import claim_duplicate, claim_duplicates
 from core.schemas import PromptSchema
+from core.config import settings
+from core.ids import new_id
+from core.formatters import content_hash, normalize_text
+from core.streaming import iter_ndjson
+from core.pagination import (
+    DEFAULT_PAGE_SIZE,
+    encode_rank_cursor,
+    decode_rank_cursor,
+    paginate_newest_first,
+)
+from services.prompt_cache import mark_prompts_changed
 from utility.logger import get_logger
 from core.custom_error_handlers import PromptNotFound
 
 lg = get_logger(script_path=__file__)
 
 
+def prompt_content_hash(prompt_data: PromptSchema) -> bytes:
+    return content_hash(
+        prompt_data.title,
+        prompt_data.role,
+        prompt_data.task,
+        prompt_data.constraints,
+        prompt_data.output,
+        prompt_data.personality,
+        *sorted(normalize_text(tag) for tag in prompt_data.tags),
+    )
+
+
 class PromptService:
     # We need to get current user from the browser
     # if the browser didnt sent us id we have to assign new author id.
@@ -26,7 +54,7 @@ class PromptService:
             # We must use the SQLAlchemy Model (Prompts), not the Pydantic Schema
             # Force generation of a new ID for creation to avoid collisions with
             # default/placeholder IDs sent by clients (e.g. Swagger UI defaulting to 3fa8...)
-            prompt_data_dict["prompt_id"] = str(uuid.uuid4())
+            prompt_data_dict["prompt_id"] = new_id()
 
             # Handle author_id
             if author_id:
@@ -35,6 +63,22 @@ class PromptService:
                 prompt_data_dict["author_id"], uuid.UUID
             ):
                 prompt_data_dict["author_id"] = str(prompt_data_dict["author_id"])
+
+            # A resubmission of the same content reuses the author's existing prompt
+            prompt_data_dict["content_hash"] = prompt_content_hash(prompt_data)
+            if prompt_data_dict.get("author_id"):
+                existing = claim_duplicate(
+                    db,
+                    Prompts,
+                    prompt_data_dict["author_id"],
+                    prompt_data_dict["content_hash"],
+                )
+                if existing is not None:
+                    lg.debug(f"Reusing prompt: {existing.prompt_id}")
+                    db.commit()
+                    db.refresh(instance=existing)
+                    return PromptSchema.model_validate(existing)
+
             new_prompt = Prompts(**prompt_data_dict)
 
             # new_prompt.author_id = author_id # Uncomment when author logic is ready
@@ -58,17 +102,101 @@ class PromptService:
             lg.error(f"Unexpected Error in save_prompt: {str(e)}")
             raise e
 
-    def get_all_prompt(self, user_id: str, db: Session):
+    def save_prompts(
+        self, db: Session, prompts: list[PromptSchema], author_id: str
+    ) -> list[PromptSchema]:
+        """
+        Save a batch of one author's prompts in one transaction.
+
+        Resubmitted content reuses the existing row, like save_prompt, and the new
+        rows are written with a single multi-row INSERT.
+
+        Args:
+            db (Session): SQLAlchemy database session.
+            prompts (list[PromptSchema]): The prompts to save.
+            author_id (str): The ID of the author.
+        Returns:
+            list[PromptSchema]: The saved (or reused) prompt of every input, in order.
+        """
+        try:
+            author_id = str(author_id)
+            digests = [prompt_content_hash(prompt) for prompt in prompts]
+            existing = claim_duplicates(db, Prompts, author_id, digests)
+
+            new_rows = {}
+            for prompt, digest in zip(prompts, digests):
+                if digest in existing:
+                    continue
+                if digest in new_rows:
+                    new_rows[digest]["use_count"] += 1
+                    continue
+                row = prompt.model_dump(exclude={"created_at"})
+                row.update(
+                    prompt_id=new_id(),
+                    author_id=author_id,
+                    content_hash=digest,
+                    use_count=1,
+                )
+                new_rows[digest] = row
+            if new_rows:
+                # RETURNING order is not guaranteed, rows are matched back by key
+                inserted = {
+                    row.prompt_id: row
+                    for row in db.scalars(
+                        insert(Prompts).returning(Prompts), list(new_rows.values())
+                    )
+                }
+                for digest, row in new_rows.items():
+                    existing[digest] = inserted[row["prompt_id"]]
+                # The bulk INSERT bypasses the session's change tracking
+                mark_prompts_changed(db, author_id)
+
+            saved = [PromptSchema.model_validate(existing[d]) for d in digests]
+            db.commit()
+            lg.debug(f"Saved {len(new_rows)} of {len(prompts)} batched prompts.")
+            return saved
+
+        except SQLAlchemyError as e:
+            db.rollback()
+            lg.error(f"Database Error saving prompt batch: {str(e)}")
+            raise e
+
+    def get_all_prompt(
+        self,
+        user_id: str,
+        db: Session,
+        cursor: str | None = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+    ) -> tuple[list[Prompts], str | None]:
+        """
+        Retrieve one page of a user's prompts, newest first.
+
+        Uses keyset pagination on (author_id, created_at DESC, prompt_id DESC), which is
+        served by the ix_prompts_author_created_id index, so every page costs the same
+        whatever the size of the user's history.
+
+        Args:
+            user_id (str): The ID of the author.
+            db (Session): SQLAlchemy database session.
+            cursor (str, optional): The 'next_cursor' token of the previous page.
+            limit (int): Maximum number of prompts to return.
+        Returns:
+            tuple[list[Prompts], str | None]: The prompts and the cursor of the next page (None on the last page).
+        """
         lg.debug("Getting all the prompts.")
         try:
-            all_prompts = (
-                db.query(Prompts).filter(Prompts.author_id == user_id).limit(100).all()
+            all_prompts, next_cursor = paginate_newest_first(
+                db.query(Prompts).filter(Prompts.author_id == user_id),
+                Prompts.created_at,
+                Prompts.prompt_id,
+                cursor,
+                limit,
             )
             if not all_prompts:
                 lg.debug("Prompts table is empty - no prompts found in the database.")
 
             lg.info(f"Successfully retreived {len(all_prompts)} posts from database.")
-            return all_prompts
+            return all_prompts, next_cursor
         except SQLAlchemyError as e:
             # This catches ANY database error (connection lost, constraint violation, etc.)
             db.rollback()  # CRITICAL: Reset the session so it's clean for the next request
@@ -80,7 +208,184 @@ class PromptService:
             lg.error(f"Unexpected Error in save_prompt: {str(e)}")
             raise e
 
-        return None
+    def stream_all_prompts(self, user_id: str, db: Session) -> Iterator[str]:
+        """
+        Stream a user's whole prompt history as NDJSON, newest first.
+
+        Reads through a server-side cursor with the same ordering (and index) as the
+        paginated history, so peak memory and time to first byte do not depend on
+        how many prompts the user has.
+
+        Args:
+            user_id (str): The ID of the author.
+            db (Session): SQLAlchemy database session.
+        Yields:
+            str: NDJSON chunks, one PromptSchema document per line.
+        """
+        lg.debug("Streaming all the prompts.")
+        columns = [getattr(Prompts, name) for name in PromptSchema.model_fields]
+        query = (
+            select(*columns)
+            .where(Prompts.author_id == user_id)
+            .order_by(Prompts.created_at.desc(), Prompts.prompt_id.desc())
+        )
+        try:
+            yield from iter_ndjson(db, query, settings.STREAM_FETCH_ROWS)
+        except SQLAlchemyError as e:
+            db.rollback()
+            lg.error(f"Database Error streaming prompts: {str(e)}")
+            raise e
+
+    def search_prompts(
+        self,
+        db: Session,
+        query_text: str,
+        user_id: str,
+        public: bool = False,
+        cursor: str | None = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+    ) -> tuple[list[Prompts], str | None]:
+        """
+        Ranked full-text search over title/role/task/constraints.
+
+        Every word is matched as a prefix against the generated search_vector column
+        (GIN index), and the title is also matched with pg_trgm word similarity (GIN
+        trigram index) so small typos still find results. Results are ordered by
+        relevance and keyset-paginated on (rank, prompt_id).
+
+        Args:
+            db (Session): SQLAlchemy database session.
+            query_text (str): The user's search text.
+            user_id (str): The ID of the current user.
+            public (bool): Search the public library instead of the user's own prompts.
+            cursor (str, optional): The 'next_cursor' token of the previous page.
+            limit (int): Maximum number of prompts to return.
+        Returns:
+            tuple[list[Prompts], str | None]: The prompts and the cursor of the next page (None on the last page).
+        """
+        lg.debug(f"Searching prompts for: {query_text}")
+        # Only keep word characters so user input can never break the tsquery syntax
+        words = re.findall(r"\w+", query_text.lower())
+        if not words:
+            return [], None
+
+        try:
+            ts_query = func.to_tsquery(
+                "english", " & ".join(f"{word}:*" for word in words)
+            )
+            rank = cast(
+                func.greatest(
+                    func.ts_rank_cd(Prompts.search_vector, ts_query),
+                    func.word_similarity(query_text, Prompts.title),
+                ),
+                DOUBLE_PRECISION,
+            )
+
+            query = db.query(Prompts, rank.label("rank")).filter(
+                or_(
+                    Prompts.search_vector.op("@@")(ts_query),
+                    Prompts.title.op("%>")(query_text),
+                )
+            )
+            if public:
+                query = query.filter(Prompts.is_public.is_(True))
+            else:
+                query = query.filter(Prompts.author_id == user_id)
+
+            if cursor:
+                last_rank, last_prompt_id = decode_rank_cursor(cursor)
+                query = query.filter(
+                    tuple_(rank, Prompts.prompt_id) < tuple_(last_rank, last_prompt_id)
+                )
+
+            rows = (
+                query.order_by(rank.desc(), Prompts.prompt_id.desc())
+                .limit(limit + 1)
+                .all()
+            )
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                last_prompt, last_rank = rows[-1]
+                next_cursor = encode_rank_cursor(last_rank, last_prompt.prompt_id)
+
+            lg.info(f"Search for '{query_text}' returned {len(rows)} prompts.")
+            return [prompt for prompt, _ in rows], next_cursor
+        except SQLAlchemyError as e:
+            db.rollback()
+            lg.error(f"Database Error searching prompts: {str(e)}")
+            raise e
+
+        except Exception as e:
+            lg.error(f"Unexpected Error in search_prompts: {str(e)}")
+            raise e
+
+    def get_tag_counts(
+        self, db: Session, prefix: str | None = None, limit: int = 50
+    ) -> list[TagCount]:
+        """
+        Retrieve the most used tags of the public library with their prompt counts.
+
+        Reads the trigger-maintained tag_counts table, so the cost depends on the
+        number of distinct tags, never on the number of prompts.
+
+        Args:
+            db (Session): SQLAlchemy database session.
+            prefix (str, optional): Only return tags starting with this text.
+            limit (int): Maximum number of tags to return.
+        Returns:
+            list[TagCount]: Tags ordered by prompt count, most used first.
+        """
+        lg.debug("Getting tag counts.")
+        try:
+            query = db.query(TagCount).filter(TagCount.prompt_count > 0)
+            if prefix:
+                query = query.filter(TagCount.tag.startswith(prefix, autoescape=True))
+            return (
+                query.order_by(TagCount.prompt_count.desc(), TagCount.tag)
+                .limit(limit)
+                .all()
+            )
+        except SQLAlchemyError as e:
+            db.rollback()
+            lg.error(f"Database Error getting tag counts: {str(e)}")
+            raise e
+
+    def get_public_prompts_by_tag(
+        self,
+        db: Session,
+        tag: str,
+        cursor: str | None = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+    ) -> tuple[list[Prompts], str | None]:
+        """
+        Retrieve one page of public prompts carrying a tag, newest first.
+
+        The containment filter (tags @> ARRAY[tag]) is served by the ix_prompts_tags GIN index.
+
+        Args:
+            db (Session): SQLAlchemy database session.
+            tag (str): The tag to filter on.
+            cursor (str, optional): The 'next_cursor' token of the previous page.
+            limit (int): Maximum number of prompts to return.
+        Returns:
+            tuple[list[Prompts], str | None]: The prompts and the cursor of the next page (None on the last page).
+        """
+        lg.debug(f"Getting public prompts tagged: {tag}")
+        try:
+            return paginate_newest_first(
+                db.query(Prompts).filter(
+                    Prompts.is_public.is_(True), Prompts.tags.contains([tag])
+                ),
+                Prompts.created_at,
+                Prompts.prompt_id,
+                cursor,
+                limit,
+            )
+        except SQLAlchemyError as e:
+            db.rollback()
+            lg.error(f"Database Error getting prompts by tag: {str(e)}")
+            raise e
 
     def get_prompt_by_id(
         self, user_id: str, prompt_id: str, db: Session
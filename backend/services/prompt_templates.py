@@ -0,0 +1,182 @@
+"""
+Registry of versioned prompt templates, compiled once into render functions.
+
+A template is text with {field} placeholders for the prompt components (role,
+task, constraints, output, personality). At registration it is parsed once and
+turned into a generated function returning a single f-string, so rendering is
+one string build with no parsing, lookups or intermediate pieces. render_many
+runs a generated list comprehension that reads the fields of each record
+inline, so a batch costs one function call and one string per record.
+
+The built-in 'structured' and 'natural' templates (version 1) are the ones
+PromptSystem has always produced. New versions are registered next to them,
+the latest one is used unless a version is asked for.
+"""
+
+import string
+from collections.abc import Mapping
+from typing import Any, Callable, Iterable
+
+FIELDS = ("role", "task", "constraints", "output", "personality")
+
+
+class PromptTemplate:
+    __slots__ = (
+        "name",
+        "version",
+        "source",
+        "render",
+        "_render_attrs",
+        "_render_items",
+    )
+
+    def __init__(self, name: str, version: int, source: str):
+        """
+        Args:
+            name (str): Template name, e.g. 'structured'.
+            version (int): Template version.
+            source (str): Text with {field} placeholders, surrounding whitespace is dropped.
+        """
+        self.name = name
+        self.version = version
+        self.source = source.strip()
+        self.render, self._render_attrs, self._render_items = compile_template(
+            self.source
+        )
+
+    def render_many(self, records: list[Any]) -> list[str]:
+        """Render a list of objects or of mappings (all of one kind) carrying the FIELDS."""
+        if not records:
+            return []
+        if isinstance(records[0], Mapping):
+            return self._render_items(records)
+        return self._render_attrs(records)
+
+
+def compile_template(source: str) -> tuple[Callable[..., str], ...]:
+    """
+    Generate the render functions of a template text.
+    Args:
+        source (str): Text with {field} placeholders.
+    Returns:
+        tuple: render(role, task, constraints, output, personality), and
+            render_attrs(records) / render_items(records) rendering a list of
+            objects / mappings with the fields inline, without a call per record.
+    """
+    namespace, parts = {}, []
+    for i, (literal, field, spec, conversion) in enumerate(
+        string.Formatter().parse(source)
+    ):
+        if literal:
+            # Literals are bound as constants, so the f-strings hold names only
+            namespace[f"_l{i}"] = literal
+            parts.append((f"_l{i}",) * 3)
+        if field is None:
+            continue
+        if field not in FIELDS or spec or conversion:
+            raise ValueError(f"Unsupported placeholder {{{field}}} in prompt template")
+        parts.append((field, f"r.{field}", f"r[{field!r}]"))
+
+    def fstring(exprs) -> str:
+        return "f" + repr("".join(f"{{{expr}}}" for expr in exprs))
+
+    single, attrs, items = zip(*parts) if parts else ((), (), ())
+    code = (
+        f"def render({', '.join(FIELDS)}):\n"
+        f"    return {fstring(single)}\n"
+        f"def render_attrs(records):\n"
+        f"    return [{fstring(attrs)} for r in records]\n"
+        f"def render_items(records):\n"
+        f"    return [{fstring(items)} for r in records]\n"
+    )
+    exec(compile(code, "<prompt template>", "exec"), namespace)
+    return namespace["render"], namespace["render_attrs"], namespace["render_items"]
+
+
+class TemplateRegistry:
+    def __init__(self):
+        self._templates: dict[str, dict[int, PromptTemplate]] = {}
+
+    def register(self, name: str, version: int, source: str) -> PromptTemplate:
+        """
+        Compile and add a template version.
+        Args:
+            name (str): Template name.
+            version (int): Template version, unique per name.
+            source (str): Text with {field} placeholders.
+        Returns:
+            PromptTemplate: The compiled template.
+        """
+        versions = self._templates.setdefault(name, {})
+        if version in versions:
+            raise ValueError(f"Prompt template {name} v{version} already exists")
+        versions[version] = template = PromptTemplate(name, version, source)
+        return template
+
+    def get(self, name: str, version: int | None = None) -> PromptTemplate:
+        """
+        A compiled template, the latest version unless one is given.
+        Args:
+            name (str): Template name.
+            version (int, optional): Template version.
+        Returns:
+            PromptTemplate: The template, KeyError if it does not exist.
+        """
+        versions = self._templates[name]
+        return versions[max(versions) if version is None else version]
+
+    def versions(self, name: str) -> list[int]:
+        return sorted(self._templates.get(name, ()))
+
+    def render(self, name: str, version: int | None = None, **fields: Any) -> str:
+        """Render one set of fields (missing ones render as None, like the f-strings did)."""
+        return self.get(name, version).render(*(fields.get(f) for f in FIELDS))
+
+    def render_many(
+        self,
+        name: str,
+        records: Iterable[Any],
+        version: int | None = None,
+    ) -> list[str]:
+        """
+        Render a template for many records in one call.
+        Args:
+            name (str): Template name.
+            records (Iterable): Objects with the FIELDS as attributes (PromptSchema,
+                Prompts rows) or mappings with them as keys, all of one kind.
+            version (int, optional): Template version, the latest by default.
+        Returns:
+            list[str]: The rendered texts, in the order of the records.
+        """
+        records = records if isinstance(records, list) else list(records)
+        return self.get(name, version).render_many(records)
+
+
+templates = TemplateRegistry()
+
+templates.register(
+    "structured",
+    1,
+    """
+    [1. ROLE or CONTEXTUAL SETTING]: Imagine you are a {role}.
+
+    [2. OBJECTIVE or TASK]: I want you to help me {task}.
+    [3. CONSTRAINTS & RESOURCES]: Here’s what I already have / can't do / must consider:
+    {constraints}
+
+    [4. PREFERRED OUTPUT STYLE]: I want the response to be in {output}.
+
+    [5. BONUS – PERSONAL TOUCH]: Think like {personality}.
+    """,
+)
+templates.register(
+    "natural",
+    1,
+    """
+    Imagine you are {role}.
+    I want you to help me {task}.
+    Constraints: {constraints}
+    Output: {output}
+    Act like {personality}.
+    """,
+)
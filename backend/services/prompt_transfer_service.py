@@ -0,0 +1,304 @@
+import io
+import csv
+import gzip
+import json
+from datetime import datetime, timezone
+from typing import IO, Iterator
+
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+
+from db.dedup import claim_duplicates
+from db.models import Prompts
+from core.schemas import PromptSchema, PromptImportResultSchema
+from core.config import settings
+from core.ids import new_id
+from core.streaming import iter_ndjson, iter_partitions
+from services.prompt_cache import mark_prompts_changed
+from services.prompt_service import prompt_content_hash
+from utility.logger import get_logger
+
+lg = get_logger(script_path=__file__)
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+# Columns written by COPY, in order
+IMPORT_COLUMNS = (
+    "prompt_id",
+    "author_id",
+    "title",
+    "role",
+    "task",
+    "constraints",
+    "output",
+    "personality",
+    "tags",
+    "is_public",
+    "created_at",
+    "content_hash",
+    "use_count",
+)
+EXPORT_COLUMNS = (
+    "prompt_id",
+    "title",
+    "role",
+    "task",
+    "constraints",
+    "output",
+    "personality",
+    "tags",
+    "is_public",
+    "created_at",
+)
+# Only the first errors are reported back, the rest are just counted
+MAX_REPORTED_ERRORS = 100
+
+
+def _pg_array(values: list[str]) -> str:
+    """Render a list as a Postgres text[] literal for COPY ... (FORMAT csv)."""
+    quoted = (
+        '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"' for value in values
+    )
+    return "{" + ",".join(quoted) + "}"
+
+
+class PromptTransferService:
+    """
+    Bulk import and export of prompts.
+
+    Imports are parsed from a spooled (constant memory) request body and loaded
+    with Postgres COPY in chunks of IMPORT_CHUNK_ROWS rows, inside one transaction.
+    Content the author already has is deduplicated like save_prompts does.
+    Exports are read through a server-side cursor and serialized row by row.
+    """
+
+    def open_import_stream(self, body: IO[bytes]) -> IO[str]:
+        """
+        Wrap the raw request body in a text stream, transparently gunzipping it.
+        Args:
+            body (IO[bytes]): The seekable request body.
+        Returns:
+            IO[str]: A utf-8 text stream over the (decompressed) body.
+        """
+        magic = body.read(2)
+        body.seek(0)
+        if magic == GZIP_MAGIC:
+            body = gzip.GzipFile(fileobj=body, mode="rb")
+        return io.TextIOWrapper(body, encoding="utf-8", newline="")
+
+    def iter_records(
+        self, stream: IO[str], fmt: str
+    ) -> Iterator[tuple[int, dict | str]]:
+        """
+        Yield (line_number, record) pairs from an NDJSON or CSV stream.
+        CSV tags are separated by ';'. Unparseable NDJSON lines yield their error text instead of a record.
+        """
+        if fmt == "csv":
+            reader = csv.DictReader(stream)
+            for record in reader:
+                tags = record.get("tags")
+                record["tags"] = [t for t in tags.split(";") if t] if tags else []
+                yield reader.line_num, record
+            return
+
+        for line_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, f"invalid JSON: {e.msg}"
+                continue
+            yield line_number, record
+
+    def _copy_chunk(
+        self,
+        db: Session,
+        cursor,
+        copy_sql: str,
+        author_id: str,
+        chunk: list[tuple[PromptSchema, bytes]],
+    ) -> int:
+        """
+        COPY the new content of a chunk and bump the use_count of the rest.
+
+        Takes the same advisory locks as save_prompts (db.dedup.claim_duplicates),
+        so rows stored earlier in the import or by a concurrent writer are found.
+
+        Returns:
+            int: Number of rows copied, the others reused an existing prompt.
+        """
+        existing = claim_duplicates(db, Prompts, author_id, [d for _, d in chunk])
+        new_rows = {}
+        for prompt, digest in chunk:
+            if digest in existing:
+                continue
+            if digest in new_rows:
+                new_rows[digest][1] += 1
+                continue
+            new_rows[digest] = [prompt, 1]
+        if not new_rows:
+            return 0
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for digest, (prompt, uses) in new_rows.items():
+            writer.writerow(
+                (
+                    new_id(),
+                    author_id,
+                    prompt.title,
+                    prompt.role,
+                    prompt.task,
+                    prompt.constraints,
+                    prompt.output,
+                    prompt.personality,
+                    _pg_array(prompt.tags),
+                    prompt.is_public,
+                    prompt.created_at.isoformat(),
+                    # bytea hex input format
+                    "\\x" + digest.hex(),
+                    uses,
+                )
+            )
+        buffer.seek(0)
+        cursor.copy_expert(copy_sql, buffer)
+        return len(new_rows)
+
+    def import_prompts(
+        self, db: Session, body: IO[bytes], fmt: str, author_id: str
+    ) -> PromptImportResultSchema:
+        """
+        Validate and COPY prompts from an NDJSON or CSV body into the prompts table.
+
+        Every row gets a fresh prompt_id and the importing user as author. Rows
+        whose content the author already has (stored before, or earlier in the
+        import) reuse that prompt instead. The import is atomic: if the database
+        rejects a chunk, nothing is imported.
+
+        Args:
+            db (Session): SQLAlchemy database session.
+            body (IO[bytes]): The seekable request body, optionally gzip-compressed.
+            fmt (str): 'ndjson' or 'csv'.
+            author_id (str): The ID of the importing user.
+        Returns:
+            PromptImportResultSchema: Imported/deduplicated/rejected counts and the first errors.
+        """
+        accepted, imported, rejected, errors = 0, 0, 0, []
+        chunk = []
+        author_id = str(author_id)
+        now = datetime.now(timezone.utc)
+        copy_sql = (
+            f"COPY prompts ({', '.join(IMPORT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+        )
+
+        def reject(line_number: int, reason: str):
+            nonlocal rejected
+            rejected += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append(f"line {line_number}: {reason}")
+
+        try:
+            cursor = db.connection().connection.cursor()
+            stream = self.open_import_stream(body)
+            for line_number, record in self.iter_records(stream, fmt):
+                if accepted >= settings.IMPORT_MAX_ROWS:
+                    reject(line_number, "row limit reached")
+                    continue
+                if isinstance(record, str):
+                    reject(line_number, record)
+                    continue
+                if not isinstance(record, dict):
+                    reject(line_number, "not a JSON object")
+                    continue
+                # IDs are always assigned by the server
+                record.pop("prompt_id", None)
+                record.pop("author_id", None)
+                try:
+                    prompt = PromptSchema.model_validate(record)
+                except ValidationError as e:
+                    reject(line_number, e.errors()[0]["msg"])
+                    continue
+
+                if prompt.created_at is None:
+                    prompt.created_at = now
+                chunk.append((prompt, prompt_content_hash(prompt)))
+                accepted += 1
+                if len(chunk) >= settings.IMPORT_CHUNK_ROWS:
+                    imported += self._copy_chunk(db, cursor, copy_sql, author_id, chunk)
+                    chunk = []
+
+            if chunk:
+                imported += self._copy_chunk(db, cursor, copy_sql, author_id, chunk)
+
+            # COPY bypasses the ORM events, so flag the author's cached responses
+            mark_prompts_changed(db, author_id)
+            db.commit()
+            lg.info(
+                f"Imported {imported} prompts for user {author_id}, "
+                f"deduplicated {accepted - imported}, rejected {rejected}."
+            )
+            return PromptImportResultSchema(
+                imported=imported,
+                deduplicated=accepted - imported,
+                rejected=rejected,
+                errors=errors,
+            )
+        except SQLAlchemyError as e:
+            db.rollback()
+            lg.error(f"Database Error importing prompts: {str(e)}")
+            raise e
+        except Exception as e:
+            # psycopg2 errors raised by COPY are not wrapped by SQLAlchemy
+            db.rollback()
+            lg.error(f"Unexpected Error in import_prompts: {str(e)}")
+            raise e
+
+    def export_prompts(self, db: Session, author_id: str, fmt: str) -> Iterator[str]:
+        """
+        Stream a user's prompts as NDJSON or CSV, oldest first.
+
+        Rows are fetched through a server-side cursor STREAM_FETCH_ROWS at a time,
+        so memory stays flat and the first bytes go out before the query finishes.
+
+        Args:
+            db (Session): SQLAlchemy database session.
+            author_id (str): The ID of the user whose prompts are exported.
+            fmt (str): 'ndjson' or 'csv'.
+        Yields:
+            str: Serialized chunks of the export.
+        """
+        columns = [getattr(Prompts, name) for name in EXPORT_COLUMNS]
+        query = (
+            select(*columns)
+            .where(Prompts.author_id == author_id)
+            .order_by(Prompts.created_at, Prompts.prompt_id)
+        )
+
+        try:
+            if fmt != "csv":
+                yield from iter_ndjson(db, query, settings.STREAM_FETCH_ROWS)
+                return
+
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_COLUMNS)
+            tags_index = EXPORT_COLUMNS.index("tags")
+            for partition in iter_partitions(db, query, settings.STREAM_FETCH_ROWS):
+                for row in partition:
+                    values = list(row)
+                    values[tags_index] = ";".join(row.tags or [])
+                    writer.writerow(values)
+                # One chunk per fetched partition keeps writes to the socket large
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue()
+        except SQLAlchemyError as e:
+            db.rollback()
+            lg.error(f"Database Error exporting prompts: {str(e)}")
+            raise e
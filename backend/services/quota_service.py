@@ -0,0 +1,289 @@
+"""
+Daily token quota kept in Redis.
+
+Every quota check is one atomic Lua script call: it compares the user's usage
+for the UTC day with their limit and consumes the cost if it fits, so
+concurrent requests on any API node cannot overspend. The limit and the usage
+already recorded in the database are loaded once per user and day.
+
+Usage is written back to users.tokens_used_today by the worker
+(core.celery_tasks.write_back_quota_usage) for the users marked dirty. When
+Redis is unavailable the check falls back to a locked row update in the
+database. The first check that reaches Redis again raises the Redis counts of
+the day to the usage recorded in the database, and the write-back never lowers
+the usage already recorded for the day.
+"""
+
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import bindparam, case, event, func, inspect, or_, select, update
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.exc import SQLAlchemyError
+
+from db.models import User
+from db.redis import get_sync_redis
+from core.streaming import iter_partitions
+from core.custom_error_handlers import RateLimitExceeded, UserNotFound
+from core.metrics import QUOTA_CHECKS
+from utility.logger import get_logger
+
+lg = get_logger(script_path=__file__)
+
+# Per-day keys expire on their own once the day has been written back
+KEY_TTL_SECONDS = 2 * 24 * 3600
+
+# KEYS: usage hash of the user for the day, dirty set of the day
+# ARGV: cost, key TTL, user id, limit and usage to seed a new day with ('' to ask)
+# Returns {allowed (1, 0, or -2 when the day is not seeded yet), used, limit}
+CONSUME_SCRIPT = """
+local limit = tonumber(redis.call('HGET', KEYS[1], 'limit'))
+if not limit then
+    if ARGV[4] == '' then
+        return {-2, 0, 0}
+    end
+    limit = tonumber(ARGV[4])
+    redis.call('HSET', KEYS[1], 'limit', limit)
+    redis.call('HSETNX', KEYS[1], 'used', tonumber(ARGV[5]))
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+local used = tonumber(redis.call('HGET', KEYS[1], 'used') or '0')
+local cost = tonumber(ARGV[1])
+if used + cost > limit then
+    return {0, used, limit}
+end
+used = redis.call('HINCRBY', KEYS[1], 'used', cost)
+redis.call('SADD', KEYS[2], ARGV[3])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+return {1, used, limit}
+"""
+
+# KEYS: usage hash of the user for the day
+# ARGV: usage recorded in the database for the day
+# Raises the usage to the database's, never lowers it. A day that is not seeded
+# yet will load the usage from the database anyway.
+RECONCILE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+if tonumber(redis.call('HGET', KEYS[1], 'used') or '0') >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'used', ARGV[1])
+return 1
+"""
+
+# Users reconciled per query round trip and Redis pipeline
+RECONCILE_BATCH_USERS = 1000
+
+
+def usage_key(day: date, user_id: str) -> str:
+    return f"quota:{day.isoformat()}:{user_id}"
+
+
+def dirty_key(day: date) -> str:
+    return f"quota:dirty:{day.isoformat()}"
+
+
+class DailyQuotaService:
+    def __init__(self):
+        self._consume_script = None
+        self._reconcile_script = None
+        # Until this process reaches Redis once, it cannot know whether usage was
+        # consumed in the database (by itself before a restart, or by another node)
+        self._reconcile_pending = True
+
+    def _reconcile(self, db: Session, day: date) -> int:
+        """
+        Raise the day's Redis usage of every user to users.tokens_used_today.
+
+        Usage consumed by the database fallback is only recorded there. Redis may
+        also be ahead of the database (usage not written back yet), so the larger
+        value is kept. Nothing is held in memory, so a crashed process loses nothing.
+        Returns:
+            int: Number of users whose Redis usage was raised.
+        """
+        if self._reconcile_script is None:
+            self._reconcile_script = get_sync_redis().register_script(RECONCILE_SCRIPT)
+        query = select(User.user_id, User.tokens_used_today).where(
+            User.last_token_reset == day, User.tokens_used_today > 0
+        )
+        raised = 0
+        for partition in iter_partitions(db, query, RECONCILE_BATCH_USERS):
+            pipe = get_sync_redis().pipeline(transaction=False)
+            for user_id, used in partition:
+                self._reconcile_script(
+                    keys=[usage_key(day, user_id)], args=[used], client=pipe
+                )
+            raised += sum(int(result) for result in pipe.execute())
+        lg.info(f"Reconciled the quota usage of {raised} users from the database")
+        return raised
+
+    def _consume_in_redis(
+        self, db: Session, user_id: str, cost: int, day: date
+    ) -> tuple[int, int, int]:
+        if self._consume_script is None:
+            # EVALSHA, with a one-off EVAL when the script is not cached yet
+            self._consume_script = get_sync_redis().register_script(CONSUME_SCRIPT)
+        if self._reconcile_pending:
+            self._reconcile(db, day)
+            self._reconcile_pending = False
+        keys = [usage_key(day, user_id), dirty_key(day)]
+        result = self._consume_script(
+            keys=keys, args=[cost, KEY_TTL_SECONDS, user_id, "", ""]
+        )
+        if int(result[0]) == -2:
+            # First request of the day on any node: seed from the database
+            user = db.query(User).filter(User.user_id == user_id).first()
+            if not user:
+                raise UserNotFound()
+            used = user.tokens_used_today if user.last_token_reset == day else 0
+            result = self._consume_script(
+                keys=keys,
+                args=[cost, KEY_TTL_SECONDS, user_id, user.daily_token_limit, used],
+            )
+        allowed, used, limit = (int(value) for value in result)
+        return allowed, used, limit
+
+    def _consume_in_db(self, db: Session, user_id: str, cost: int, day: date) -> int:
+        try:
+            # Locked, so concurrent requests of the same user cannot lose updates
+            user = (
+                db.query(User).filter(User.user_id == user_id).with_for_update().first()
+            )
+            if not user:
+                raise UserNotFound()
+            if user.last_token_reset != day:
+                user.tokens_used_today = 0
+                user.last_token_reset = day
+            if user.tokens_used_today + cost > user.daily_token_limit:
+                db.rollback()
+                raise RateLimitExceeded()
+            user.tokens_used_today += cost
+            db.commit()
+            # The Redis count of the day does not include it yet
+            self._reconcile_pending = True
+            return user.daily_token_limit - user.tokens_used_today
+        except SQLAlchemyError as e:
+            db.rollback()
+            lg.error(f"Database Error checking daily limit: {str(e)}")
+            raise e
+
+    def consume(self, db: Session, user_id: str, cost: int = 1) -> int:
+        """
+        Consume tokens from the user's daily quota.
+        Args:
+            db (Session): SQLAlchemy database session.
+            user_id (str): The ID of the user.
+            cost (int, optional): Tokens the request costs. Defaults to 1.
+        Returns:
+            int: Tokens left for today.
+        Raises:
+            RateLimitExceeded: If the quota does not cover the cost.
+        """
+        day = datetime.utcnow().date()
+        try:
+            allowed, used, limit = self._consume_in_redis(db, user_id, cost, day)
+        except (UserNotFound, SQLAlchemyError):
+            raise
+        except Exception as e:
+            QUOTA_CHECKS.labels(result="fallback").inc()
+            lg.error(f"Quota check in Redis failed, using the database: {e}")
+            return self._consume_in_db(db, user_id, cost, day)
+
+        if not allowed:
+            QUOTA_CHECKS.labels(result="exceeded").inc()
+            lg.warning(f"User {user_id} exceeded daily token limit")
+            raise RateLimitExceeded()
+        QUOTA_CHECKS.labels(result="allowed").inc()
+        lg.debug(f"User {user_id} used {cost} tokens. Balance: {limit - used}")
+        return limit - used
+
+    def write_back(self, db: Session, batch_users: int = 1000) -> int:
+        """
+        Copy the Redis usage of dirty users to users.tokens_used_today.
+        Yesterday is written before today, so late usage of yesterday never
+        overwrites a newer day, and the usage of a day is never lowered (it may
+        include database fallback usage Redis has not been reconciled with yet).
+        Args:
+            db (Session): SQLAlchemy database session.
+            batch_users (int, optional): Users updated per transaction.
+        Returns:
+            int: Number of users written back.
+        """
+        client = get_sync_redis()
+        stmt = (
+            update(User.__table__)
+            .where(
+                User.user_id == bindparam("uid"),
+                or_(
+                    User.last_token_reset.is_(None),
+                    User.last_token_reset <= bindparam("day"),
+                ),
+            )
+            .values(
+                tokens_used_today=case(
+                    (
+                        User.last_token_reset == bindparam("day"),
+                        func.greatest(User.tokens_used_today, bindparam("used")),
+                    ),
+                    else_=bindparam("used"),
+                ),
+                last_token_reset=bindparam("day"),
+            )
+        )
+        today = datetime.utcnow().date()
+        written = 0
+        for day in (today - timedelta(days=1), today):
+            while user_ids := client.spop(dirty_key(day), batch_users):
+                user_ids = [user_id.decode("utf-8") for user_id in user_ids]
+                pipe = client.pipeline(transaction=False)
+                for user_id in user_ids:
+                    pipe.hget(usage_key(day, user_id), "used")
+                rows = [
+                    {"uid": user_id, "used": int(used), "day": day}
+                    for user_id, used in zip(user_ids, pipe.execute())
+                    if used is not None
+                ]
+                try:
+                    if rows:
+                        db.execute(stmt, rows)
+                    db.commit()
+                except SQLAlchemyError as e:
+                    db.rollback()
+                    # Mark them dirty again for the next run
+                    client.sadd(dirty_key(day), *user_ids)
+                    lg.error(f"Database Error writing back quota usage: {str(e)}")
+                    raise e
+                written += len(rows)
+        return written
+
+
+@event.listens_for(User, "after_update")
+def _collect_limit_changes(mapper, connection, target):
+    if inspect(target).attrs.daily_token_limit.history.has_changes():
+        session = object_session(target)
+        if session is not None:
+            session.info.setdefault("quota_limit_changed", set()).add(
+                str(target.user_id)
+            )
+
+
+@event.listens_for(Session, "after_commit")
+def _forget_changed_limits(session):
+    changed = session.info.pop("quota_limit_changed", None)
+    if not changed:
+        return
+    # The next check reseeds today's limit from the database, keeping the usage
+    today = datetime.utcnow().date()
+    try:
+        pipe = get_sync_redis().pipeline(transaction=False)
+        for user_id in changed:
+            pipe.hdel(usage_key(today, user_id), "limit")
+        pipe.execute()
+    except Exception as e:
+        lg.error(f"Could not reset cached quota limits of {changed}: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_limit_changes(session):
+    session.info.pop("quota_limit_changed", None)
@@ -1,13 +1,41 @@
-import uuid
-from sqlalchemy.orm import Session
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session, selectinload
 from sqlalchemy.exc import SQLAlchemyError
-from db.models import StructuredPrompts
+from db.models import Prompts, StructuredPrompts
+from core.pagination import DEFAULT_PAGE_SIZE, paginate_newest_first
 from core.schemas import PromptSchema, PromptSchemaOutput
+from core.ids import new_id
+from core.formatters import content_hash
+from db.database import mark_written
+from db.dedup import claim_duplicate, claim_duplicates
+from core.config import settings
+from services.structured_write_behind import StructuredPromptWriteBehind
+from services.prompt_templates import templates
 from utility.logger import get_logger
 from core.ollama_client import OllamaClient
 
 lg = get_logger(script_path=__file__)
 
+# Batched AI refinements, OllamaClient caps the requests in flight process-wide
+llm_executor = ThreadPoolExecutor(
+    max_workers=settings.LLM_MAX_CONCURRENCY, thread_name_prefix="llm"
+)
+
+
+def refinement_hash(
+    original_prompt_id: str | None, structured_prompt: str, natural_prompt: str
+) -> bytes:
+    """
+    Deduplication key of a structured prompt. A prompt has a single refinement,
+    whatever text the AI produced for it, so linked rows are keyed by their
+    original prompt alone and only standalone rows by their content.
+    """
+    if original_prompt_id:
+        return content_hash(str(original_prompt_id))
+    return content_hash(None, structured_prompt, natural_prompt)
+
 
 class RestructuredPromptService:
     """
@@ -21,6 +49,41 @@ class RestructuredPromptService:
         Initialize the RestructuredPromptService with a PromptSystem instance.
         """
         self.psystem = PromptSystem()
+        self.write_behind = StructuredPromptWriteBehind()
+
+    def stored_refinements(
+        self, db: Session, prompts: list[PromptSchema]
+    ) -> dict[str, PromptSchemaOutput]:
+        """
+        Look up the refinements already stored for saved prompts (resubmissions
+        reuse the original prompt), so they are not generated again.
+        Args:
+            db (Session): SQLAlchemy database session.
+            prompts (list[PromptSchema]): Saved prompts, all of the same author.
+        Returns:
+            dict: prompt_id -> the stored output, for the prompts that have one.
+        """
+        details = {str(prompt.prompt_id): prompt for prompt in prompts}
+        stored = {}
+        for row in (
+            db.query(StructuredPrompts)
+            .filter(
+                StructuredPrompts.author_id == str(prompts[0].author_id),
+                StructuredPrompts.original_prompt_id.in_(details),
+            )
+            .order_by(StructuredPrompts.created_at)
+        ):
+            stored.setdefault(
+                str(row.original_prompt_id),
+                PromptSchemaOutput(
+                    structured_prompt=row.structured_prompt,
+                    natural_prompt=row.natural_prompt,
+                    details=details[str(row.original_prompt_id)],
+                ),
+            )
+        # Do not sit idle in a transaction while the refinements are generated
+        db.commit()
+        return stored
 
     def create_structured_prompt(
         self, db: Session, prompt_data: PromptSchema, use_ai: bool = False
@@ -37,7 +100,10 @@ class RestructuredPromptService:
         """
         try:
             # TODO: Migrate the database driver to async because this method alone requires async job.
-            if use_ai:
+            stored = self.stored_refinements(db, [prompt_data])
+            if stored:
+                st_prompt = stored[str(prompt_data.prompt_id)]
+            elif use_ai:
                 st_prompt = self.psystem.create_prompt_using_ai(prompt_data=prompt_data)
             else:
                 st_prompt = self.psystem.create_prompt_normal_way(
@@ -85,7 +151,7 @@ class RestructuredPromptService:
                 del st_prompt_dict["details"]
 
             # Generate new PK for structured_prompts table
-            st_prompt_dict["prompt_id"] = str(uuid.uuid4())
+            st_prompt_dict["prompt_id"] = new_id()
 
             # Assign foreign keys
             if author_id:
@@ -97,6 +163,29 @@ class RestructuredPromptService:
                 # NOTE: if we generate new uuid here it creates problem on retreival. so we must warn or raise error if there is no author id in the prompt data.
                 raise ValueError("Author ID is required to save structured prompt.")
 
+            # A prompt's refinement is stored once
+            st_prompt_dict["content_hash"] = refinement_hash(
+                st_prompt_dict.get("original_prompt_id"),
+                st_prompt_dict["structured_prompt"],
+                st_prompt_dict["natural_prompt"],
+            )
+            if settings.STRUCTURED_WRITE_BEHIND and self.write_behind.enqueue(
+                st_prompt_dict
+            ):
+                # Deduplicated and inserted by the flusher
+                return
+
+            existing = claim_duplicate(
+                db,
+                StructuredPrompts,
+                st_prompt_dict["author_id"],
+                st_prompt_dict["content_hash"],
+            )
+            if existing is not None:
+                lg.debug(f"Reusing structured prompt: {existing.prompt_id}")
+                db.commit()
+                return
+
             new_st_prompt = StructuredPrompts(**st_prompt_dict)
             db.add(instance=new_st_prompt)
             db.commit()
@@ -112,6 +201,117 @@ class RestructuredPromptService:
             lg.error(f"Unexpected Error in save_prompt: {str(e)}")
             raise e
 
+    def create_structured_prompts(
+        self, db: Session, prompts: list[PromptSchema], use_ai: bool = False
+    ) -> list[PromptSchemaOutput | Exception]:
+        """
+        Create and save the structured prompts of a batch of one author's saved prompts.
+
+        Prompts that already have a refinement (resubmissions) reuse it, and a
+        prompt repeated in the batch is refined once. AI refinements run
+        concurrently on the LLM pool, the others are rendered in one render_many
+        pass. All rows are saved with one multi-row INSERT.
+
+        Args:
+            db (Session): SQLAlchemy database session.
+            prompts (list[PromptSchema]): Saved prompts, all of the same author.
+            use_ai (bool): Whether to use AI for prompt generation.
+        Returns:
+            list: The output of every prompt in order, or the exception its refinement
+            (or saving the refinements) raised.
+        """
+        if not prompts:
+            return []
+        refined = self.stored_refinements(db, prompts)
+        pending = {}
+        for prompt in prompts:
+            if str(prompt.prompt_id) not in refined:
+                pending.setdefault(str(prompt.prompt_id), prompt)
+
+        if use_ai:
+            futures = {
+                prompt_id: llm_executor.submit(
+                    self.psystem.create_prompt_using_ai, prompt
+                )
+                for prompt_id, prompt in pending.items()
+            }
+            for prompt_id, future in futures.items():
+                try:
+                    refined[prompt_id] = future.result()
+                except Exception as e:
+                    lg.error(f"Error while creating structured_prompt: {str(e)}")
+                    refined[prompt_id] = e
+        elif pending:
+            generated = self.psystem.create_prompts_normal_way(list(pending.values()))
+            refined.update(zip(pending, generated))
+
+        outputs = [refined[str(prompt.prompt_id)] for prompt in prompts]
+        try:
+            self.save_structured_prompts(
+                db, [o for o in outputs if isinstance(o, PromptSchemaOutput)]
+            )
+        except SQLAlchemyError as e:
+            # The prompts are already committed: report the refinements as failed
+            # instead of failing the whole batch
+            outputs = [e if isinstance(o, PromptSchemaOutput) else o for o in outputs]
+        return outputs
+
+    def save_structured_prompts(
+        self, db: Session, structured_prompts: list[PromptSchemaOutput]
+    ) -> None:
+        """
+        Save a batch of structured prompts of one author, each linked to its
+        original prompt (details), in one transaction.
+        Args:
+            db (Session): SQLAlchemy database session.
+            structured_prompts (list[PromptSchemaOutput]): The prompts to save.
+        """
+        rows = []
+        for st_prompt in structured_prompts:
+            original_prompt_id = str(st_prompt.details.prompt_id)
+            rows.append(
+                {
+                    "prompt_id": new_id(),
+                    "structured_prompt": st_prompt.structured_prompt,
+                    "natural_prompt": st_prompt.natural_prompt,
+                    "author_id": str(st_prompt.details.author_id),
+                    "original_prompt_id": original_prompt_id,
+                    "content_hash": refinement_hash(
+                        original_prompt_id,
+                        st_prompt.structured_prompt,
+                        st_prompt.natural_prompt,
+                    ),
+                }
+            )
+        if settings.STRUCTURED_WRITE_BEHIND:
+            # Rows Redis did not take are saved below
+            rows = [row for row in rows if not self.write_behind.enqueue(row)]
+        if not rows:
+            return
+
+        try:
+            digests = [row["content_hash"] for row in rows]
+            existing = claim_duplicates(
+                db, StructuredPrompts, rows[0]["author_id"], digests
+            )
+            new_rows = {}
+            for row in rows:
+                digest = row["content_hash"]
+                if digest in existing:
+                    continue
+                if digest in new_rows:
+                    new_rows[digest]["use_count"] += 1
+                    continue
+                new_rows[digest] = {**row, "use_count": 1}
+            if new_rows:
+                db.execute(insert(StructuredPrompts), list(new_rows.values()))
+            mark_written(db, rows[0]["author_id"])
+            db.commit()
+        except SQLAlchemyError as e:
+            db.rollback()
+            lg.error(f"Database Error saving structured prompt batch: {str(e)}")
+            raise e
+
     def delete_structured_prompt(self, structured_prompt_id: str, db: Session):
         """
         Delete a structured prompt from the database by its ID.
@@ -159,17 +359,43 @@ class RestructuredPromptService:
         lg.debug("Getting all the restructured prompts.")
         return None
 
-    def get_all_restructured_prompt_by_user_id(self, id: str, db: Session):
+    def get_all_restructured_prompt_by_user_id(
+        self,
+        id: str,
+        db: Session,
+        cursor: str | None = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+    ) -> tuple[list[Prompts], str | None]:
         """
-        Retrieve all restructured prompts for a specific user by user ID.
+        Retrieve one page of a user's prompts together with their restructured versions, newest first.
+
+        The page is keyset-paginated like the plain history, and the structured versions
+        are loaded with selectinload: one extra 'WHERE original_prompt_id IN (...)' query
+        for the whole page instead of one lazy load per prompt. A page always costs two queries.
+
         Args:
             id (str): The user ID.
             db (Session): SQLAlchemy database session.
+            cursor (str, optional): The 'next_cursor' token of the previous page.
+            limit (int): Maximum number of prompts to return.
         Returns:
-            None
+            tuple[list[Prompts], str | None]: The prompts, with 'structured_version' loaded, and the cursor of the next page.
         """
         lg.debug("Getting all the restructured prompts.")
-        return None
+        try:
+            return paginate_newest_first(
+                db.query(Prompts)
+                .options(selectinload(Prompts.structured_version))
+                .filter(Prompts.author_id == id),
+                Prompts.created_at,
+                Prompts.prompt_id,
+                cursor,
+                limit,
+            )
+        except SQLAlchemyError as e:
+            db.rollback()
+            lg.error(f"Database Error getting restructured prompts: {str(e)}")
+            raise e
 
     def get_one_structured_prompt_by_user_id(self, id: str, db: Session):
         """
@@ -276,6 +502,24 @@ class PromptSystem:
             lg.error(f"Error in create_prompt_using_ai: {str(e)}")
             return self.create_prompt_normal_way(prompt_data)
 
+    def create_prompts_normal_way(
+        self, prompts: list[PromptSchema]
+    ) -> list[PromptSchemaOutput]:
+        """
+        Generate structured and natural prompts for many inputs at once (bulk
+        generation, previews), with the templates' render_many.
+        Args:
+            prompts (list[PromptSchema]): The inputs.
+        Returns:
+            list[PromptSchemaOutput]: One output per input, in the same order.
+        """
+        structured = templates.render_many("structured", prompts)
+        natural = templates.render_many("natural", prompts)
+        return [
+            PromptSchemaOutput(structured_prompt=s, natural_prompt=n, details=p)
+            for s, n, p in zip(structured, natural, prompts)
+        ]
+
     def build_structured_prompt(self, role, task, constraints, output, personality):
         """
         Build a structured prompt string from the provided components.
@@ -288,17 +532,9 @@ class PromptSystem:
         Returns:
             str: The formatted structured prompt.
         """
-        return f"""
-    [1. ROLE or CONTEXTUAL SETTING]: Imagine you are a {role}.
-
-    [2. OBJECTIVE or TASK]: I want you to help me {task}.
-    [3. CONSTRAINTS & RESOURCES]: Here’s what I already have / can't do / must consider:
-    {constraints}
-
-    [4. PREFERRED OUTPUT STYLE]: I want the response to be in {output}.
-
-    [5. BONUS – PERSONAL TOUCH]: Think like {personality}.
-    """.strip()
+        return templates.get("structured").render(
+            role, task, constraints, output, personality
+        )
 
     def build_natural_prompt(self, role, task, constraints, output, personality):
         """
@@ -312,10 +548,6 @@ class PromptSystem:
         Returns:
             str: The formatted natural prompt.
         """
-        return f"""
-    Imagine you are {role}.
-    I want you to help me {task}.
-    Constraints: {constraints}
-    Output: {output}
-    Act like {personality}.
-    """.strip()
+        return templates.get("natural").render(
+            role, task, constraints, output, personality
+        )
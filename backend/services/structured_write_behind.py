@@ -0,0 +1,284 @@
+"""
+Write-behind persistence of structured prompts.
+
+With STRUCTURED_WRITE_BEHIND on, save_structured_prompt appends the finished row
+to a Redis stream and returns; the user already has the generated text. The
+flusher (core.celery_tasks.flush_structured_prompts) drains the stream through a
+consumer group and batch-inserts the rows with one multi-row INSERT.
+
+Delivery is at-least-once: entries are acknowledged only after the batch is
+committed, and entries left pending by a crashed flusher are reclaimed after
+STRUCTURED_FLUSH_CLAIM_IDLE_MS. Replays are harmless because inserts are keyed
+by prompt_id (ON CONFLICT DO NOTHING, and rows already stored are skipped).
+
+Entries that cannot be parsed, or that were delivered STRUCTURED_FLUSH_MAX_DELIVERIES
+times without being flushed, are moved to a dead-letter stream and acknowledged,
+so one poison entry cannot block the stream. The dead-letter stream keeps the
+payload and the reason, for inspection and replay.
+"""
+
+import json
+import os
+import socket
+import time
+from datetime import datetime, timezone
+
+import redis
+from sqlalchemy import func, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+
+from db.database import mark_written
+from db.dedup import lock_contents
+from db.models import StructuredPrompts
+from db.redis import get_sync_redis
+from core.config import settings
+from core.metrics import (
+    WRITE_BEHIND_ENQUEUED,
+    WRITE_BEHIND_FLUSHED,
+    WRITE_BEHIND_BACKLOG,
+    WRITE_BEHIND_LAG_SECONDS,
+)
+from utility.logger import get_logger
+
+lg = get_logger(script_path=__file__)
+
+STREAM_KEY = "write_behind:structured_prompts"
+DEAD_LETTER_KEY = "write_behind:structured_prompts:dead"
+CONSUMER_GROUP = "flusher"
+
+
+def apply_batch(db: Session, rows: list[dict]) -> dict[str, int]:
+    """
+    Persist a batch of structured prompt rows, idempotently.
+
+    Rows whose prompt_id is already stored (a replayed entry) are skipped, rows with
+    content the author already has bump the existing row's use_count, and the rest
+    are inserted with a single multi-row INSERT. The caller commits.
+
+    Args:
+        db (Session): SQLAlchemy database session.
+        rows (list[dict]): Column values, as enqueued by StructuredPromptWriteBehind.
+    Returns:
+        dict[str, int]: Number of rows 'inserted', 'duplicate' and 'replayed'.
+    """
+    counts = {"inserted": 0, "duplicate": 0, "replayed": 0}
+    if not rows:
+        return counts
+    keys = {(row["author_id"], row["content_hash"]) for row in rows}
+    # The same locks as the synchronous writers (db.dedup), so the duplicate
+    # check below sees every row committed for this content
+    lock_contents(db, StructuredPrompts, keys)
+
+    stored = set(
+        db.scalars(
+            select(StructuredPrompts.prompt_id).where(
+                StructuredPrompts.prompt_id.in_([row["prompt_id"] for row in rows])
+            )
+        )
+    )
+    existing = set(
+        db.execute(
+            select(StructuredPrompts.author_id, StructuredPrompts.content_hash).where(
+                tuple_(StructuredPrompts.author_id, StructuredPrompts.content_hash).in_(
+                    keys
+                )
+            )
+        ).all()
+    )
+
+    new_rows, bumps = [], {}
+    for row in rows:
+        mark_written(db, row["author_id"])
+        key = (row["author_id"], row["content_hash"])
+        if row["prompt_id"] in stored:
+            counts["replayed"] += 1
+        elif key in existing:
+            bumps[key] = bumps.get(key, 0) + 1
+            counts["duplicate"] += 1
+        else:
+            # Later rows of the batch with the same content are duplicates of this one
+            existing.add(key)
+            new_rows.append(row)
+            counts["inserted"] += 1
+
+    if new_rows:
+        db.execute(
+            insert(StructuredPrompts)
+            .values(new_rows)
+            .on_conflict_do_nothing(index_elements=["prompt_id", "created_at"])
+        )
+    for (author_id, digest), uses in bumps.items():
+        db.execute(
+            update(StructuredPrompts)
+            .where(
+                StructuredPrompts.author_id == author_id,
+                StructuredPrompts.content_hash == digest,
+            )
+            .values(
+                use_count=StructuredPrompts.use_count + uses,
+                last_used_at=func.now(),
+            )
+        )
+    return counts
+
+
+class StructuredPromptWriteBehind:
+    """
+    Redis stream buffer between save_structured_prompt and the database.
+    """
+
+    def __init__(self):
+        self._consumer = f"{socket.gethostname()}-{os.getpid()}"
+
+    def _client(self) -> redis.Redis:
+        return get_sync_redis()
+
+    def enqueue(self, row: dict) -> bool:
+        """
+        Append a structured prompt row to the stream.
+        Args:
+            row (dict): The column values of the new row (prompt_id, content_hash, ...).
+        Returns:
+            bool: False if Redis is unavailable, the caller then saves synchronously.
+        """
+        now = datetime.now(timezone.utc).isoformat()
+        payload = {
+            "original_prompt_id": None,
+            **row,
+            "content_hash": row["content_hash"].hex(),
+            "created_at": now,
+            "last_used_at": now,
+        }
+        try:
+            self._client().xadd(STREAM_KEY, {"row": json.dumps(payload)})
+            WRITE_BEHIND_ENQUEUED.labels(result="queued").inc()
+            return True
+        except redis.RedisError as e:
+            WRITE_BEHIND_ENQUEUED.labels(result="fallback").inc()
+            lg.error(f"Write-behind enqueue failed, saving synchronously: {e}")
+            return False
+
+    def _read(self, count: int) -> list[tuple[bytes, dict, int]]:
+        """The next entries for this consumer, with how many times each was delivered."""
+        client = self._client()
+        try:
+            client.xgroup_create(STREAM_KEY, CONSUMER_GROUP, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        # Entries a crashed flusher read but never acknowledged come first
+        _, entries, *_ = client.xautoclaim(
+            STREAM_KEY,
+            CONSUMER_GROUP,
+            self._consumer,
+            min_idle_time=settings.STRUCTURED_FLUSH_CLAIM_IDLE_MS,
+            count=count,
+        )
+        entries = [entry for entry in entries if entry[1]]
+        deliveries = []
+        if entries:
+            pipe = client.pipeline(transaction=False)
+            for entry_id, _ in entries:
+                pipe.xpending_range(
+                    STREAM_KEY, CONSUMER_GROUP, min=entry_id, max=entry_id, count=1
+                )
+            # Claiming counts as a delivery, so a reclaimed entry is at 2 or more
+            deliveries = [
+                pending[0]["times_delivered"] if pending else 1
+                for pending in pipe.execute()
+            ]
+        claimed = [(*entry, times) for entry, times in zip(entries, deliveries)]
+        if len(claimed) < count:
+            for _, fresh in client.xreadgroup(
+                CONSUMER_GROUP,
+                self._consumer,
+                {STREAM_KEY: ">"},
+                count=count - len(claimed),
+            ):
+                claimed.extend((entry_id, fields, 1) for entry_id, fields in fresh)
+        return claimed
+
+    @staticmethod
+    def _parse(fields: dict) -> dict:
+        row = json.loads(fields[b"row"])
+        row["content_hash"] = bytes.fromhex(row["content_hash"])
+        row["created_at"] = datetime.fromisoformat(row["created_at"])
+        row["last_used_at"] = datetime.fromisoformat(row["last_used_at"])
+        return row
+
+    def _dead_letter(self, entries: list[tuple[bytes, dict, str]]) -> None:
+        """Move entries to the dead-letter stream and acknowledge them."""
+        pipe = self._client().pipeline()
+        for entry_id, fields, reason in entries:
+            pipe.xadd(
+                DEAD_LETTER_KEY,
+                {"id": entry_id, "row": fields.get(b"row", b""), "reason": reason},
+            )
+        ids = [entry_id for entry_id, _, _ in entries]
+        pipe.xack(STREAM_KEY, CONSUMER_GROUP, *ids)
+        pipe.xdel(STREAM_KEY, *ids)
+        pipe.execute()
+        WRITE_BEHIND_FLUSHED.labels(outcome="dead_letter").inc(len(entries))
+        for entry_id, _, reason in entries:
+            lg.error(
+                f"Moved write-behind entry {entry_id} to {DEAD_LETTER_KEY}: {reason}"
+            )
+
+    def flush(self, db: Session, batch_rows: int | None = None) -> int:
+        """
+        Move one batch from the stream to the database.
+        Args:
+            db (Session): SQLAlchemy database session.
+            batch_rows (int, optional): Batch size, defaults to STRUCTURED_FLUSH_BATCH_ROWS.
+        Returns:
+            int: Number of stream entries processed (0 when the stream is drained).
+        """
+        entries = self._read(batch_rows or settings.STRUCTURED_FLUSH_BATCH_ROWS)
+        if not entries:
+            WRITE_BEHIND_BACKLOG.set(self._client().xlen(STREAM_KEY))
+            return 0
+
+        rows, ids, dead = [], [], []
+        for entry_id, fields, times_delivered in entries:
+            if times_delivered > settings.STRUCTURED_FLUSH_MAX_DELIVERIES:
+                reason = f"not flushed after {times_delivered - 1} deliveries"
+                dead.append((entry_id, fields, reason))
+                continue
+            try:
+                rows.append(self._parse(fields))
+                ids.append(entry_id)
+            except (KeyError, TypeError, ValueError) as e:
+                dead.append((entry_id, fields, f"unreadable entry: {e}"))
+        if dead:
+            self._dead_letter(dead)
+        if not rows:
+            WRITE_BEHIND_BACKLOG.set(self._client().xlen(STREAM_KEY))
+            return len(entries)
+
+        try:
+            counts = apply_batch(db, rows)
+            db.commit()
+        except SQLAlchemyError as e:
+            # Left unacknowledged, so the batch is retried after the claim timeout
+            db.rollback()
+            lg.error(f"Database Error flushing structured prompts: {str(e)}")
+            raise e
+
+        pipe = self._client().pipeline()
+        pipe.xack(STREAM_KEY, CONSUMER_GROUP, *ids)
+        pipe.xdel(STREAM_KEY, *ids)
+        pipe.xlen(STREAM_KEY)
+        backlog = pipe.execute()[-1]
+
+        now_ms = time.time() * 1000
+        for entry_id in ids:
+            # Stream ids start with the enqueue time in milliseconds
+            enqueued_ms = int(entry_id.split(b"-")[0])
+            WRITE_BEHIND_LAG_SECONDS.observe((now_ms - enqueued_ms) / 1000)
+        for outcome, count in counts.items():
+            WRITE_BEHIND_FLUSHED.labels(outcome=outcome).inc(count)
+        WRITE_BEHIND_BACKLOG.set(backlog)
+        lg.info(f"Flushed {len(ids)} structured prompts: {counts}")
+        return len(entries)
@@ -0,0 +1,78 @@
+"""
+Micro-benchmark of prompt rendering: the original PromptSystem f-strings against
+the compiled templates of services.prompt_templates, one call per record and
+render_many over the whole batch.
+
+Usage: python services/template_benchmark.py [records] [repeats]
+"""
+
+import sys
+import os
+import time
+import random
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.schemas import PromptSchema
+from services.prompt_templates import templates
+
+
+def legacy_structured(role, task, constraints, output, personality):
+    return f"""
+    [1. ROLE or CONTEXTUAL SETTING]: Imagine you are a {role}.
+
+    [2. OBJECTIVE or TASK]: I want you to help me {task}.
+    [3. CONSTRAINTS & RESOURCES]: Here’s what I already have / can't do / must consider:
+    {constraints}
+
+    [4. PREFERRED OUTPUT STYLE]: I want the response to be in {output}.
+
+    [5. BONUS – PERSONAL TOUCH]: Think like {personality}.
+    """.strip()
+
+
+def make_records(records: int) -> list[PromptSchema]:
+    words = "role task constraint output personality refine explain build".split()
+    return [
+        PromptSchema(
+            role=" ".join(random.choices(words, k=3)),
+            task=" ".join(random.choices(words, k=12)),
+            constraints=" ".join(random.choices(words, k=8)),
+            output=" ".join(random.choices(words, k=2)),
+            personality=" ".join(random.choices(words, k=2)),
+        )
+        for _ in range(records)
+    ]
+
+
+def run_benchmark(records: int = 10_000, repeats: int = 20) -> dict[str, float]:
+    data = make_records(records)
+    render = templates.get("structured").render
+    cases = {
+        "legacy_fstring": lambda: [
+            legacy_structured(p.role, p.task, p.constraints, p.output, p.personality)
+            for p in data
+        ],
+        "compiled_render": lambda: [
+            render(p.role, p.task, p.constraints, p.output, p.personality) for p in data
+        ],
+        "render_many": lambda: templates.render_many("structured", data),
+    }
+    assert len({tuple(case()) for case in cases.values()}) == 1
+    results = {}
+    for name, case in cases.items():
+        started = time.perf_counter()
+        for _ in range(repeats):
+            case()
+        results[name] = (time.perf_counter() - started) / repeats / records * 1e9
+    return results
+
+
+if __name__ == "__main__":
+    records = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    results = run_benchmark(records=records, repeats=repeats)
+    print(f"{'case':<20}{'ns/record':>12}{'vs legacy':>12}")
+    for name, ns in results.items():
+        print(f"{name:<20}{ns:>12.1f}{results['legacy_fstring'] / ns:>11.2f}x")
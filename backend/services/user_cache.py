@@ -0,0 +1,145 @@
+"""
+Two-tier cache of user profiles (services.user_service reads through it).
+
+Built on core.cache: profiles are keyed by user_id, with an email -> user_id
+index next to them, and both carry the tag 'user:<user_id>'. Profiles hold
+metadata only, never the password hash.
+
+Every committed change to a User row (services, OAuth, admin panel) invalidates
+that tag, which drops the user's entries from Redis and from the local tier of
+every worker.
+"""
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from db.models import User
+from core.cache import Cache, invalidate_tags
+from core.config import settings
+from core.schemas import UserProfileSchema
+
+PROFILE_FIELDS = tuple(UserProfileSchema.model_fields)
+
+
+def user_tag(user_id: str) -> str:
+    return f"user:{user_id}"
+
+
+class UserProfileCache:
+    def __init__(self, max_entries: int, local_ttl: float, ttl: int):
+        self.profiles = Cache(
+            "user_profile",
+            ttl=ttl,
+            local_ttl=local_ttl,
+            local_max_entries=max_entries,
+            encode=lambda profile: profile.model_dump(mode="json"),
+            decode=UserProfileSchema.model_validate,
+        )
+        self.emails = Cache("user_email", ttl=ttl)
+
+    def drop_local(self) -> None:
+        """Forget the local entries of every user."""
+        self.profiles.drop_local()
+
+    def _load(self, db: Session, user_id: str) -> UserProfileSchema | None:
+        user = db.query(User).filter(User.user_id == user_id).first()
+        if user is None:
+            return None
+        self.emails.set(
+            user.email.lower(), str(user.user_id), tags=[user_tag(user.user_id)]
+        )
+        return UserProfileSchema.model_validate(user)
+
+    def get(self, db: Session, user_id: str) -> UserProfileSchema | None:
+        """
+        Profile of a user, from the first tier that has it.
+        Args:
+            db (Session): SQLAlchemy database session, used on a miss.
+            user_id (str): The ID of the user.
+        Returns:
+            UserProfileSchema | None: The profile, None if the user does not exist.
+        """
+        return self.profiles.get_or_set(
+            user_id, lambda: self._load(db, user_id), tags=[user_tag(user_id)]
+        )
+
+    def get_by_email(self, db: Session, email: str) -> UserProfileSchema | None:
+        """
+        Profile of a user by email, through the email -> user_id index.
+        Args:
+            db (Session): SQLAlchemy database session, used on a miss.
+            email (str): The user's email.
+        Returns:
+            UserProfileSchema | None: The profile, None if the user does not exist.
+        """
+        user_id = self.emails.get(email.lower())
+        if user_id is not None:
+            profile = self.get(db, user_id)
+            # The index can outlive an email change
+            if profile is not None and profile.email.lower() == email.lower():
+                return profile
+
+        user = db.query(User).filter(User.email == email).first()
+        if user is None:
+            return None
+        return self.put(user)
+
+    def put(self, user: User) -> UserProfileSchema:
+        """
+        Write a freshly loaded or just committed user through both tiers.
+        Args:
+            user (User): The user row.
+        Returns:
+            UserProfileSchema: Its profile.
+        """
+        profile = UserProfileSchema.model_validate(user)
+        tags = [user_tag(profile.user_id)]
+        self.profiles.set(profile.user_id, profile, tags=tags)
+        self.emails.set(profile.email.lower(), profile.user_id, tags=tags)
+        return profile
+
+    def invalidate(self, user_ids: set[str]) -> None:
+        """
+        Drop users from Redis and from the local tier of every worker.
+        Args:
+            user_ids (set[str]): IDs of the changed users.
+        """
+        invalidate_tags(*(user_tag(user_id) for user_id in user_ids))
+
+
+user_cache = UserProfileCache(
+    max_entries=settings.USER_CACHE_LOCAL_MAX_ENTRIES,
+    local_ttl=settings.USER_CACHE_LOCAL_TTL_SECONDS,
+    ttl=settings.USER_CACHE_TTL_SECONDS,
+)
+
+
+def _mark_changed(target: User) -> None:
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("changed_users", set()).add(str(target.user_id))
+
+
+@event.listens_for(User, "after_update")
+def _collect_updated_users(mapper, connection, target):
+    # Quota usage updates do not touch the profile
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in PROFILE_FIELDS):
+        _mark_changed(target)
+
+
+@event.listens_for(User, "after_delete")
+def _collect_deleted_users(mapper, connection, target):
+    _mark_changed(target)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session):
+    changed = session.info.pop("changed_users", None)
+    if changed:
+        user_cache.invalidate(changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_users(session):
+    session.info.pop("changed_users", None)
@@ -1,10 +1,9 @@
-import uuid
 from datetime import datetime
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 
 
-from core.schemas import UserCreateSchema, UserOutSchema
+from core.schemas import UserCreateSchema, UserOutSchema, UserProfileSchema
 from db.models import User
 from utility.logger import get_logger
 from auth.oauth2 import hash_password, create_access_token
@@ -12,22 +11,24 @@ from core.custom_error_handlers import (
     UserAlreadyExists,
     UserNotFound,
     InvalidCredentials,
-    RateLimitExceeded,
     WeakPasswordError,
 )
 from pydantic import EmailStr
 from core.config import settings
-from google_auth_oauthlib.flow import Flow
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
+from core.ids import new_id
+from services.quota_service import DailyQuotaService
+from services.user_cache import user_cache
+from auth import google_oauth
 from fastapi import HTTPException
 from datetime import timedelta
-import os
 
 lg = get_logger(__file__)
 
 
 class UserService:
+    def __init__(self):
+        self.quota = DailyQuotaService()
+
     def validate_password_strength(self, password: str):
         if len(password) < 8:
             raise WeakPasswordError("Password must be at least 8 characters long")
@@ -60,7 +61,7 @@ class UserService:
 
             # check if the user has an id with the request
             if not user_data_dict.get("user_id"):
-                user_data_dict["user_id"] = str(uuid.uuid4())
+                user_data_dict["user_id"] = new_id()
 
             # create a data base model
             new_user = User(**user_data_dict)
@@ -92,22 +93,36 @@ class UserService:
             raise e
 
     def get_user_by_id(self, user_id: str, db: Session):
+        return UserOutSchema.model_validate(
+            self.get_user_profile(user_id=user_id, db=db), from_attributes=True
+        )
+
+    def get_user_profile(self, user_id: str, db: Session) -> UserProfileSchema:
+        """
+        Cached metadata of a user (no credentials), see services.user_cache.
+        Args:
+            user_id (str): The ID of the user.
+            db (Session): SQLAlchemy database session, used on a cache miss.
+        Returns:
+            UserProfileSchema: The user's profile.
+        Raises:
+            UserNotFound: If the user does not exist.
+        """
         try:
             lg.debug(f"Getting user by id: {user_id}")
-            user = db.query(User).filter(User.user_id == user_id).first()
-            if user is None:
+            profile = user_cache.get(db, user_id)
+            if profile is None:
                 raise UserNotFound()
-            lg.debug(f"Found user by id: {user_id}: , user email: {user.email}")
-            return UserOutSchema.model_validate(user)
+            return profile
         except SQLAlchemyError as e:
             # This catches ANY database error (connection lost, constraint violation, etc.)
             db.rollback()  # CRITICAL: Reset the db so it's clean for the next request
-            lg.error(f"Database Error saving prompt: {str(e)}")
+            lg.error(f"Database Error getting user: {str(e)}")
             raise e  # Re-raise it so the router knows something went wrong
 
         except Exception as e:
             # This catches any other unexpected Python error (like a bug in our code)
-            lg.error(f"Unexpected Error in save_prompt: {str(e)}")
+            lg.error(f"Unexpected Error in get_user_profile: {str(e)}")
             raise e
 
     def get_user_by_email(self, email: EmailStr, db: Session):
@@ -134,46 +149,12 @@ class UserService:
 
     def check_daily_limit(self, db: Session, user_id: str, cost: int = 1) -> bool:
         """
-        Check if user has enough tokens for the request.
-        Resets quota if it's a new day.
+        Check if user has enough tokens for the request and consume them.
+        The quota is counted in Redis, see services.quota_service.
         Raises RateLimitExceeded if not enough tokens.
         """
-        try:
-            user = db.query(User).filter(User.user_id == user_id).first()
-            if not user:
-                raise UserNotFound()
-
-            # Check date
-            today = datetime.utcnow().date()
-            if user.last_token_reset != today:
-                # Reset
-                lg.debug(f"Resetting tokens for user {user_id}")
-                user.tokens_used_today = 0
-                user.last_token_reset = today
-                db.add(user)
-                db.commit()
-                db.refresh(user)
-
-            if user.tokens_used_today + cost > user.daily_token_limit:
-                lg.warning(f"User {user_id} exceeded daily token limit")
-                raise RateLimitExceeded
-
-            # Deduct (add usage)
-            user.tokens_used_today += cost
-            db.add(user)
-            db.commit()
-            db.refresh(user)
-
-            lg.debug(
-                f"User {user_id} used {cost} tokens. Balance: {user.daily_token_limit - user.tokens_used_today}"
-            )
-            return True
-
-        except RateLimitExceeded as e:
-            raise e
-        except Exception as e:
-            lg.error(f"Error checking daily limit: {str(e)}")
-            raise e
+        self.quota.consume(db=db, user_id=user_id, cost=cost)
+        return True
 
     def update_user(self, user: User, user_data: dict, db: Session):
         lg.info(f"Updating user with email: {user.email}")
@@ -185,6 +166,8 @@ class UserService:
             db.add(user)
             db.commit()
             db.refresh(user)
+            # Write-through, the commit already invalidated the old profile
+            user_cache.put(user)
             lg.info(f"User updated successfully: {user.email}")
             return UserOutSchema.model_validate(user)
         except SQLAlchemyError as e:
@@ -201,13 +184,12 @@ class UserService:
         self, user_id: str, token: str, expires_at: datetime, db: Session
     ):
         from db.models import RefreshToken
-        from auth.oauth2 import hash_token
+        from auth.oauth2 import token_digest
 
         try:
-            token_hash = hash_token(token)
             refresh_token = RefreshToken(
-                id=str(uuid.uuid4()),
-                token_hash=token_hash,
+                id=new_id(),
+                token_digest=token_digest(token),
                 user_id=user_id,
                 expires_at=expires_at,
             )
@@ -220,23 +202,45 @@ class UserService:
             lg.error(f"Error storing refresh token: {str(e)}")
             raise e
 
-    def invalidate_refresh_token(self, token: str, db: Session):
+    def invalidate_refresh_token(self, token: str, db: Session, user_id: str = None):
+        """
+        Revoke a refresh token with a single indexed delete on its digest.
+        Args:
+            token (str): The refresh token to revoke.
+            db (Session): SQLAlchemy database session.
+            user_id (str, optional): The token's user, used to find tokens issued before digests were stored.
+        Returns:
+            bool: True if the token was found and revoked.
+        """
         from db.models import RefreshToken
-        from auth.oauth2 import verify_token
+        from auth.oauth2 import token_digest, verify_token
 
         try:
-            refresh_tokens = (
+            revoked = (
                 db.query(RefreshToken)
-                .filter(RefreshToken.expires_at > datetime.now())
-                .all()
+                .filter(RefreshToken.token_digest == token_digest(token))
+                .delete(synchronize_session=False)
             )
-            for rt in refresh_tokens:
-                if verify_token(token, rt.token_hash):
-                    db.delete(rt)
-                    db.commit()
-                    lg.info(f"Refresh token invalidated for user {rt.user_id}")
-                    return True
-            return False
+            if not revoked and user_id:
+                # Legacy bcrypt rows: only this user's unexpired ones, until they expire
+                legacy_tokens = (
+                    db.query(RefreshToken)
+                    .filter(
+                        RefreshToken.user_id == user_id,
+                        RefreshToken.token_digest.is_(None),
+                        RefreshToken.expires_at > datetime.now(),
+                    )
+                    .all()
+                )
+                for rt in legacy_tokens:
+                    if verify_token(token, rt.token_hash):
+                        db.delete(rt)
+                        revoked = 1
+                        break
+            db.commit()
+            if revoked:
+                lg.info(f"Refresh token invalidated for user {user_id}")
+            return bool(revoked)
         except Exception as e:
             db.rollback()
             lg.error(f"Error invalidating refresh token: {str(e)}")
@@ -255,72 +259,20 @@ class UserService:
             raise e
 
     def get_google_login_url(self):
-        client_config = {
-            "web": {
-                "client_id": settings.GOOGLE_CLIENT_ID,
-                "client_secret": settings.GOOGLE_CLIENT_SECRET,
-                "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                "token_uri": "https://oauth2.googleapis.com/token",
-                "redirect_uris": [settings.GOOGLE_REDIRECT_URI],
-            }
-        }
-
-        flow = Flow.from_client_config(
-            client_config=client_config,
-            scopes=[
-                "openid",
-                "https://www.googleapis.com/auth/userinfo.email",
-                "https://www.googleapis.com/auth/userinfo.profile",
-            ],
-            redirect_uri=settings.GOOGLE_REDIRECT_URI,
-        )
-
-        authorization_url, _ = flow.authorization_url(
-            access_type="offline", include_granted_scopes="true"
-        )
-        return authorization_url
+        return google_oauth.authorization_url()
 
     def process_google_auth(self, request_url: str, db: Session):
-        # Allow http for local testing
-        os.environ["OAUTHLIB_INSECURE_TRANSPORT"] = "1"
-
-        client_config = {
-            "web": {
-                "client_id": settings.GOOGLE_CLIENT_ID,
-                "client_secret": settings.GOOGLE_CLIENT_SECRET,
-                "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                "token_uri": "https://oauth2.googleapis.com/token",
-                "redirect_uris": [settings.GOOGLE_REDIRECT_URI],
-            }
-        }
-
-        flow = Flow.from_client_config(
-            client_config=client_config,
-            scopes=[
-                "openid",
-                "https://www.googleapis.com/auth/userinfo.email",
-                "https://www.googleapis.com/auth/userinfo.profile",
-            ],
-            redirect_uri=settings.GOOGLE_REDIRECT_URI,
-        )
-
         try:
-            flow.fetch_token(authorization_response=request_url)
-        except Exception as e:
+            tokens = google_oauth.exchange_code(request_url)
+        except ValueError as e:
             lg.error(f"Error fetching token from Google: {str(e)}")
             raise HTTPException(
                 status_code=400,
                 detail="Authorization failed. Ensure you are approving the request.",
             )
 
-        credentials = flow.credentials
-
         try:
-            id_info = id_token.verify_oauth2_token(
-                credentials.id_token,
-                google_requests.Request(),
-                settings.GOOGLE_CLIENT_ID,
-            )
+            id_info = google_oauth.verify_id_token(tokens.get("id_token", ""))
         except ValueError as e:
             raise HTTPException(status_code=400, detail=f"Invalid token: {str(e)}")
 
@@ -329,14 +281,14 @@ class UserService:
             raise HTTPException(status_code=400, detail="Email not provided by Google")
 
         try:
-            # Check if user exists using direct query to avoid exception flow control
-            user = db.query(User).filter(User.email == email).first()
+            # Returning users are usually served from the profile cache
+            user = user_cache.get_by_email(db, email)
 
             if not user:
                 # Create new user
                 username = id_info.get("name", email.split("@")[0])
                 new_user = User(
-                    user_id=str(uuid.uuid4()),
+                    user_id=new_id(),
                     username=username,
                     password=hash_password("oauth_dummy"),
                     email=email,
@@ -347,15 +299,19 @@ class UserService:
                 db.add(new_user)
                 db.commit()
                 db.refresh(new_user)
-                user = new_user
+                user = user_cache.put(new_user)
             else:
                 # Update existing user to verified if not
                 if not user.is_verified:
-                    user.is_verified = True
-                    user.oauth_provider = "google"
-                    user.oauth_id = id_info.get("sub")
+                    db_user = (
+                        db.query(User).filter(User.user_id == user.user_id).first()
+                    )
+                    db_user.is_verified = True
+                    db_user.oauth_provider = "google"
+                    db_user.oauth_id = id_info.get("sub")
                     db.commit()
-                    db.refresh(user)
+                    db.refresh(db_user)
+                    user = user_cache.put(db_user)
 
             # Create tokens
             access_token = create_access_token(
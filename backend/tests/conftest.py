@@ -1,4 +1,5 @@
 import sys
+import threading
 from unittest.mock import MagicMock
 
 # Mock sqladmin to avoid install requirement for tests
@@ -25,6 +26,8 @@ from db.models import User
 from core.config import settings
 from auth.oauth2 import create_access_token, hash_password
 
+from core.cache import drop_all_local
+
 # 1. Setup Test Database URL
 # We replace the DB name in the connection string to point to our test DB
 TEST_DATABASE_URL = f"postgresql://{settings.DATABASE_USERNAME}:{settings.DATABASE_PASSWORD}@{settings.DATABASE_HOSTNAME}:{settings.DATABASE_PORT}/promptcrafter_test_db"
@@ -65,6 +68,137 @@ def db_session(setup_database):
     connection.close()
 
 
+@pytest.fixture(autouse=True)
+def empty_caches(monkeypatch):
+    """
+    The redis module is mocked, so make the Redis tier of core.cache always miss
+    and start every test with empty local tiers.
+    """
+    redis_client = MagicMock()
+    redis_client.get.return_value = None
+    redis_client.hget.return_value = None
+    monkeypatch.setattr("core.cache.cache.get_sync_redis", lambda: redis_client)
+    drop_all_local()
+
+
+class FakeRedis:
+    """Just enough of a Redis client for core.cache, pipelines run eagerly."""
+
+    def __init__(self):
+        self.store = {}
+        self.published = []
+        self._results = None
+        self._pushed = threading.Condition()
+
+    def pipeline(self, transaction=True):
+        self._results = []
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def watch(self, *keys):
+        pass
+
+    def multi(self):
+        pass
+
+    def execute(self):
+        results, self._results = self._results, None
+        return results
+
+    def _reply(self, value):
+        if self._results is not None:
+            self._results.append(value)
+        return value
+
+    def get(self, key):
+        return self._reply(self.store.get(key))
+
+    def set(self, key, value, ex=None, px=None, nx=False):
+        if nx and key in self.store:
+            return self._reply(None)
+        if not isinstance(value, bytes):
+            value = str(value).encode("utf-8")
+        self.store[key] = value
+        return self._reply(True)
+
+    def mget(self, keys):
+        return self._reply([self.store.get(key) for key in keys])
+
+    def incr(self, key):
+        value = int(self.store.get(key, b"0")) + 1
+        self.store[key] = str(value).encode("utf-8")
+        return self._reply(value)
+
+    def hget(self, key, field):
+        return self._reply(self.store.get(key, {}).get(field))
+
+    def hset(self, key, field, value):
+        self.store.setdefault(key, {})[field] = value
+        return self._reply(1)
+
+    def hdel(self, key, *fields):
+        for field in fields:
+            self.store.get(key, {}).pop(field, None)
+        return self._reply(len(fields))
+
+    def rpush(self, key, *values):
+        with self._pushed:
+            self.store.setdefault(key, []).extend(values)
+            self._pushed.notify_all()
+        return self._reply(len(self.store[key]))
+
+    def blpop(self, keys, timeout=0):
+        with self._pushed:
+            if not self._pushed.wait_for(
+                lambda: any(self.store.get(key) for key in keys), timeout
+            ):
+                return None
+            key = next(key for key in keys if self.store.get(key))
+            return key.encode("utf-8"), self.store[key].pop(0)
+
+    def pexpire(self, key, milliseconds):
+        return self._reply(key in self.store)
+
+    def sadd(self, key, *members):
+        self.store.setdefault(key, set()).update(m.encode("utf-8") for m in members)
+        return self._reply(len(members))
+
+    def smembers(self, key):
+        return self._reply(set(self.store.get(key, ())))
+
+    def expire(self, key, seconds):
+        return self._reply(key in self.store)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.store.pop(key.decode("utf-8") if isinstance(key, bytes) else key, None)
+        return self._reply(len(keys))
+
+    def publish(self, channel, message):
+        self.published.append((channel, message))
+        return self._reply(0)
+
+
+@pytest.fixture
+def cache_redis(monkeypatch):
+    """
+    Backs core.cache with a FakeRedis and serves its local tier, as when the
+    app follows the invalidation channel.
+    """
+    fake_redis = FakeRedis()
+    following = threading.Event()
+    following.set()
+    monkeypatch.setattr("core.cache.cache.get_sync_redis", lambda: fake_redis)
+    monkeypatch.setattr("core.cache.cache._following", following)
+    yield fake_redis
+    drop_all_local()
+
+
 @pytest.fixture(scope="function")
 def client(db_session):
     """
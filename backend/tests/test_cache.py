@@ -0,0 +1,119 @@
+import threading
+import time
+
+from core.cache import Cache, invalidate_tags
+from core.cache.cache import _on_invalidation
+from core.cache.codec import ZLIB, pack, unpack
+from core.config import settings
+
+scores = Cache("test_scores", ttl=60, local_ttl=30, local_max_entries=2)
+reports = Cache("test_reports", ttl=60, compress_min_bytes=64)
+
+
+def test_codec_compresses_large_values_only():
+    """
+    Test that encodings over the threshold are compressed and both kinds decode.
+    """
+    small, large = {"a": 1}, {"text": "prompt " * 100}
+    assert pack(small, 64)[:1] != ZLIB
+    assert pack(large, 64)[:1] == ZLIB
+    assert len(pack(large, 64)) < len(pack(large))
+    assert unpack(pack(small, 64)) == small
+    assert unpack(pack(large, 64)) == large
+
+
+def test_tiers_lru_and_tag_invalidation(cache_redis):
+    """
+    Test that entries are served locally, fall back to Redis after eviction, and
+    that a tag drops entries of every namespace, locally and in Redis.
+    """
+    scores.set("a", 1, tags=["team:1"])
+    scores.set("b", 2, tags=["team:2"])
+    reports.set("a", "x" * 100, tags=["team:1"])
+    scores.set("c", 3)
+    # "a" was evicted from the local tier but is still in Redis
+    assert scores.local.get("a", time.time()) is None
+    assert scores.get("a") == 1
+    assert reports.get("a") == "x" * 100
+
+    invalidate_tags("team:1")
+    assert scores.get("a") is None
+    assert reports.get("a") is None
+    assert scores.get("b") == 2
+
+    # Another process invalidated team:2, Redis is already clean there
+    cache_redis.store.clear()
+    assert scores.get("b") == 2
+    _on_invalidation(pack({"tags": ["team:2"]}))
+    assert scores.get("b") is None
+
+
+def test_concurrent_misses_share_one_load(cache_redis):
+    """
+    Test that threads missing the same key at once wait for a single loader call.
+    """
+    calls, started = [], threading.Event()
+
+    def loader():
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        return 42
+
+    results = []
+    leader = threading.Thread(
+        target=lambda: results.append(scores.get_or_set("slow", loader))
+    )
+    leader.start()
+    started.wait()
+    followers = [
+        threading.Thread(
+            target=lambda: results.append(scores.get_or_set("slow", loader))
+        )
+        for _ in range(3)
+    ]
+    for thread in [*followers]:
+        thread.start()
+    for thread in [leader, *followers]:
+        thread.join()
+    assert results == [42, 42, 42, 42]
+    assert calls == [1]
+
+
+def test_slow_entries_are_refreshed_early(cache_redis, monkeypatch):
+    """
+    Test that an entry whose loader time is large against its remaining
+    lifetime gets recomputed before it expires.
+    """
+    # Median draw of the exponential jitter (ln 2)
+    monkeypatch.setattr("core.cache.cache.random.random", lambda: 0.5)
+    reports.set("fresh", "v1", delta=0.01)
+    reports.set("expiring", "v1", delta=120.0)
+    assert reports.get_or_set("fresh", lambda: "v2") == "v1"
+    assert reports.get_or_set("expiring", lambda: "v2") == "v2"
+
+    monkeypatch.setattr(settings, "CACHE_EARLY_REFRESH_BETA", 0.0)
+    reports.set("expiring", "v1", delta=120.0)
+    assert reports.get_or_set("expiring", lambda: "v2") == "v1"
+
+
+def test_value_loaded_before_an_invalidation_is_not_stored(cache_redis):
+    """
+    Test that a loader that read the old state, while the tag was invalidated
+    (a commit in another request), does not store its stale value in either tier.
+    """
+    scores.set("d", "old", tags=["team:3"])
+    invalidate_tags("team:3")
+
+    def loader():
+        value = "stale"
+        # The row changes and is invalidated before the load finishes
+        invalidate_tags("team:3")
+        return value
+
+    assert scores.get_or_set("d", loader, tags=["team:3"]) == "stale"
+    assert scores.local.get("d", time.time()) is None
+    assert scores.get("d") is None
+
+    assert scores.get_or_set("d", lambda: "fresh", tags=["team:3"]) == "fresh"
+    assert scores.get("d") == "fresh"
@@ -0,0 +1,123 @@
+import uuid
+
+import pytest
+from sqlalchemy import event, text
+
+from db.models import Prompts
+from services.prompt_service import PromptService
+from services.st_prompt_service import RestructuredPromptService
+
+prompt_service = PromptService()
+st_prompt_service = RestructuredPromptService()
+
+
+def capture_queries(db_session, run) -> list[tuple[str, dict]]:
+    """SELECTs the application issues while running 'run'."""
+    queries = []
+
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            queries.append((statement, parameters))
+
+    event.listen(db_session.bind, "before_cursor_execute", listener)
+    try:
+        run()
+    finally:
+        event.remove(db_session.bind, "before_cursor_execute", listener)
+    return queries
+
+
+def plan_indexes(db_session, statement: str, parameters) -> set[str]:
+    """
+    The indexes in the plan of a query, by the name of the index declared on
+    the partitioned table (partition indexes are attached to it).
+    """
+    conn = db_session.connection()
+    # The test tables are tiny, make the planner show which index it would use
+    conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+    cursor = conn.connection.cursor()
+    cursor.execute(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+    plan = cursor.fetchone()[0][0]["Plan"]
+
+    names, nodes = set(), [plan]
+    while nodes:
+        node = nodes.pop()
+        if "Index Name" in node:
+            names.add(node["Index Name"])
+        nodes.extend(node.get("Plans", []))
+    if not names:
+        return names
+    return set(
+        conn.execute(
+            text(
+                "SELECT coalesce(pg_partition_root(c.oid), c.oid)::regclass::text "
+                "FROM pg_class c WHERE c.relname = ANY(:names)"
+            ),
+            {"names": list(names)},
+        ).scalars()
+    )
+
+
+@pytest.fixture
+def history(db_session, test_user):
+    for i in range(3):
+        db_session.add(
+            Prompts(
+                prompt_id=str(uuid.uuid4()),
+                title=f"Quantum {i}",
+                task="explain quantum computing",
+                tags=["physics"],
+                is_public=True,
+                author_id=test_user.user_id,
+            )
+        )
+    db_session.commit()
+    return test_user
+
+
+def test_history_queries_use_the_keyset_indexes(db_session, history):
+    """
+    Test that the history page and its structured versions are read through the
+    (author_id, created_at, prompt_id) and original_prompt_id indexes.
+    """
+    queries = capture_queries(
+        db_session,
+        lambda: (
+            prompt_service.get_all_prompt(user_id=history.user_id, db=db_session),
+            st_prompt_service.get_all_restructured_prompt_by_user_id(
+                id=history.user_id, db=db_session
+            ),
+        ),
+    )
+    used = set().union(*(plan_indexes(db_session, *q) for q in queries))
+    assert "ix_prompts_author_created_id" in used
+    assert "ix_structured_prompts_original_prompt_id" in used
+
+
+def test_tag_browsing_uses_the_tags_index(db_session, history):
+    """Test that tag browsing is served by the tags GIN index."""
+    queries = capture_queries(
+        db_session,
+        lambda: prompt_service.get_public_prompts_by_tag(db=db_session, tag="physics"),
+    )
+    assert "ix_prompts_tags" in plan_indexes(db_session, *queries[0])
+
+
+def test_search_uses_the_search_vector_index(db_session, history):
+    """Test that full text search is served by the search_vector GIN index."""
+
+    has_trgm = db_session.execute(
+        text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+    ).first()
+    if has_trgm is None:
+        pytest.skip("The title typo match needs the pg_trgm index")
+    queries = capture_queries(
+        db_session,
+        lambda: prompt_service.search_prompts(
+            db=db_session,
+            query_text="quantum",
+            user_id=history.user_id,
+            public=True,
+        ),
+    )
+    assert "ix_prompts_search_vector" in plan_indexes(db_session, *queries[0])
@@ -0,0 +1,52 @@
+import uuid
+from datetime import date, datetime, timezone
+
+from db.models import Prompts, TagCount
+from db.partitions import (
+    list_partitions,
+    ensure_partitions,
+    detach_expired_partitions,
+)
+
+
+def test_ensure_partitions_creates_months_ahead(db_session):
+    """
+    Test that the current month and the months ahead get a partition, once.
+    """
+    conn = db_session.connection()
+
+    created = ensure_partitions(conn, "prompts", 2, today=date(2020, 11, 15))
+    assert created == ["prompts_p2020_11", "prompts_p2020_12", "prompts_p2021_01"]
+    assert ensure_partitions(conn, "prompts", 2, today=date(2020, 11, 15)) == []
+    assert list_partitions(conn, "prompts")["prompts_p2021_01"] == date(2021, 1, 1)
+
+
+def test_retention_detaches_old_partitions_and_tag_counts(db_session, test_user):
+    """
+    Test that partitions older than the retention window are detached, taking their
+    rows out of the table and their public prompts out of the tag facets.
+    """
+    conn = db_session.connection()
+    ensure_partitions(conn, "prompts", 2, today=date(2020, 1, 1))
+    for month in (1, 3):
+        db_session.add(
+            Prompts(
+                prompt_id=str(uuid.uuid4()),
+                title=f"Month {month}",
+                tags=["archive"],
+                is_public=True,
+                author_id=test_user.user_id,
+                created_at=datetime(2020, month, 10, tzinfo=timezone.utc),
+            )
+        )
+    db_session.commit()
+    assert db_session.get(TagCount, "archive").prompt_count == 2
+
+    detached = detach_expired_partitions(
+        conn, "prompts", retention_months=1, drop=True, today=date(2020, 3, 20)
+    )
+
+    assert detached == ["prompts_p2020_01"]
+    db_session.expire_all()
+    assert [p.title for p in db_session.query(Prompts).all()] == ["Month 3"]
+    assert db_session.get(TagCount, "archive").prompt_count == 1
@@ -0,0 +1,37 @@
+import asyncio
+import threading
+
+import pytest
+
+import auth.oauth2 as oauth2
+from core.config import settings
+from core.custom_error_handlers import PasswordHashingBusy
+
+
+def test_rehash_on_cost_change_and_verify_async(monkeypatch):
+    """
+    Test that hashes created with another BCRYPT_ROUNDS are flagged for rehashing
+    and that the async verification runs on the hashing pool.
+    """
+    monkeypatch.setattr(settings, "BCRYPT_ROUNDS", 4)
+    hashed = oauth2.hash_password("Secret123")
+    assert hashed.startswith("$2b$04$")
+    assert not oauth2.needs_rehash(hashed)
+    assert asyncio.run(oauth2.verify_password_async("Secret123", hashed))
+    assert not asyncio.run(oauth2.verify_password_async("wrong", hashed))
+
+    monkeypatch.setattr(settings, "BCRYPT_ROUNDS", 5)
+    assert oauth2.needs_rehash(hashed)
+
+
+def test_full_pool_rejects_instead_of_queueing(monkeypatch):
+    """
+    Test that calls beyond workers + queue are rejected with PasswordHashingBusy.
+    """
+    monkeypatch.setattr(oauth2, "_hash_slots", threading.BoundedSemaphore(1))
+    release = threading.Event()
+    blocked = oauth2._submit("hash", release.wait)
+    with pytest.raises(PasswordHashingBusy):
+        oauth2.hash_password("Secret123")
+    release.set()
+    blocked.result()
@@ -0,0 +1,178 @@
+import threading
+import time
+import uuid
+
+from fastapi import status
+from sqlalchemy import event
+
+from core.config import settings
+from db.models import Prompts
+from services.prompt_cache import prompt_cache
+
+PREFIX = f"/api/{settings.VERSION or 'v1.1'}/pcrafter/"
+
+
+def test_prompt_reads_are_cached_until_the_prompts_change(
+    client, db_session, test_user, test_user_token, cache_redis
+):
+    """
+    Test that a repeated GET /pcrafter/{prompt_id} is answered without queries and
+    that deleting the prompt invalidates the author's cached responses.
+    """
+    prompt_id = str(uuid.uuid4())
+    db_session.add(
+        Prompts(prompt_id=prompt_id, title="Cached", author_id=test_user.user_id)
+    )
+    db_session.commit()
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+
+    first = client.get(f"{PREFIX}{prompt_id}", headers=headers)
+    assert first.status_code == status.HTTP_200_OK
+    assert client.get(PREFIX, headers=headers).status_code == status.HTTP_200_OK
+
+    queries = []
+    listener = lambda *args: queries.append(args[2])
+    event.listen(db_session.bind, "before_cursor_execute", listener)
+    again = client.get(f"{PREFIX}{prompt_id}", headers=headers)
+    event.remove(db_session.bind, "before_cursor_execute", listener)
+    assert again.content == first.content
+    assert not [q for q in queries if "prompts" in q]
+    assert prompt_cache.responses.get((str(test_user.user_id), "list::20"))
+
+    response = client.delete(f"{PREFIX}{prompt_id}", headers=headers)
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    assert prompt_cache.responses.get((str(test_user.user_id), "list::20")) is None
+    assert (
+        client.get(f"{PREFIX}{prompt_id}", headers=headers).status_code
+        == status.HTTP_404_NOT_FOUND
+    )
+
+
+def test_response_built_during_invalidation_is_not_stored(test_user, cache_redis):
+    """
+    Test that a response built from data that changed meanwhile is served but
+    not cached.
+    """
+    user_id = str(test_user.user_id)
+
+    def build() -> bytes:
+        prompt_cache.invalidate({user_id})
+        return b"stale"
+
+    assert prompt_cache.get_or_build(user_id, "item:x", build) == b"stale"
+    assert prompt_cache.responses.get((user_id, "item:x")) is None
+    assert prompt_cache.get_or_build(user_id, "item:x", lambda: b"fresh")
+    assert prompt_cache.responses.get((user_id, "item:x")) == b"fresh"
+
+
+def test_miss_waits_for_the_process_building_the_response(
+    test_user, cache_redis, monkeypatch
+):
+    """
+    Test that a miss blocks until another process building the same response
+    stores it instead of building it again, and builds it itself if that process
+    does not finish in time.
+    """
+    user_id = str(test_user.user_id)
+    responses = prompt_cache.responses
+    key = (user_id, "list::20")
+    cache_redis.set(responses._loading_key(key), 1)
+
+    def other_process():
+        time.sleep(0.1)
+        responses.set(key, b"built elsewhere")
+        cache_redis.rpush(responses._loaded_key(key), 1)
+
+    thread = threading.Thread(target=other_process)
+    thread.start()
+    body = prompt_cache.get_or_build(user_id, "list::20", lambda: b"built here")
+    thread.join()
+    assert body == b"built elsewhere"
+
+    monkeypatch.setattr(responses, "shared_wait", 0.05)
+    cache_redis.set(responses._loading_key((user_id, "list::10")), 1)
+    assert (
+        prompt_cache.get_or_build(user_id, "list::10", lambda: b"built here")
+        == b"built here"
+    )
+
+
+def test_conditional_get_answers_304_until_the_prompts_change(
+    client, db_session, test_user, test_user_token, cache_redis
+):
+    """
+    Test that a matching If-None-Match is answered with 304 without touching the
+    database and that a new prompt changes the ETag.
+    """
+    db_session.add(
+        Prompts(prompt_id=str(uuid.uuid4()), title="First", author_id=test_user.user_id)
+    )
+    db_session.commit()
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+
+    first = client.get(PREFIX, headers=headers)
+    assert first.status_code == status.HTTP_200_OK
+    assert first.headers["cache-control"] == "private, no-cache"
+    etag = first.headers["etag"]
+
+    queries = []
+    listener = lambda *args: queries.append(args[2])
+    event.listen(db_session.bind, "before_cursor_execute", listener)
+    cached = client.get(PREFIX, headers={**headers, "If-None-Match": f"W/{etag}"})
+    event.remove(db_session.bind, "before_cursor_execute", listener)
+    assert cached.status_code == status.HTTP_304_NOT_MODIFIED
+    assert cached.content == b""
+    assert cached.headers["etag"] == etag
+    assert queries == []
+
+    db_session.add(
+        Prompts(
+            prompt_id=str(uuid.uuid4()), title="Second", author_id=test_user.user_id
+        )
+    )
+    db_session.commit()
+    changed = client.get(PREFIX, headers={**headers, "If-None-Match": etag})
+    assert changed.status_code == status.HTTP_200_OK
+    assert changed.headers["etag"] != etag
+    assert {p["title"] for p in changed.json()["items"]} == {"First", "Second"}
+
+    public = client.get(f"{PREFIX}tags", headers=headers)
+    assert public.headers["cache-control"].startswith("public, max-age=")
+
+
+def test_item_etag_is_per_prompt_and_needs_an_existing_prompt(
+    client, db_session, test_user, test_user_token, cache_redis
+):
+    """
+    Test that a prompt's ETag only validates that prompt, and that a matching
+    ETag for a prompt id that does not exist (or is not the user's) gets a 404,
+    not a 304.
+    """
+    prompt_id = str(uuid.uuid4())
+    db_session.add(
+        Prompts(prompt_id=prompt_id, title="Mine", author_id=test_user.user_id)
+    )
+    db_session.commit()
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+
+    first = client.get(f"{PREFIX}{prompt_id}", headers=headers)
+    assert first.status_code == status.HTTP_200_OK
+    etag = first.headers["etag"]
+    assert etag.endswith(f':{prompt_id}"')
+
+    queries = []
+    listener = lambda *args: queries.append(args[2])
+    event.listen(db_session.bind, "before_cursor_execute", listener)
+    cached = client.get(
+        f"{PREFIX}{prompt_id}", headers={**headers, "If-None-Match": etag}
+    )
+    event.remove(db_session.bind, "before_cursor_execute", listener)
+    assert cached.status_code == status.HTTP_304_NOT_MODIFIED
+    assert queries == []
+
+    missing_id = str(uuid.uuid4())
+    forged = etag.replace(prompt_id, missing_id)
+    missing = client.get(
+        f"{PREFIX}{missing_id}", headers={**headers, "If-None-Match": forged}
+    )
+    assert missing.status_code == status.HTTP_404_NOT_FOUND
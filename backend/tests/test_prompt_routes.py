@@ -1,6 +1,14 @@
+import gzip
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
 from fastapi import status
 from unittest.mock import patch, MagicMock
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
 from core.config import settings
+from core.pagination import encode_cursor
+from db.models import Prompts, StructuredPrompts
 
 # Prefix for the API
 PREFIX = f"/api/{settings.VERSION or 'v1.1'}/pcrafter/"
@@ -57,11 +65,82 @@ def test_create_prompt_unverified_user_normal_flow(client, unverified_user_token
 
         # The structured prompt should contain standard template text, not AI output
         assert "[1. ROLE or CONTEXTUAL SETTING]" in data["structured_prompt"]
+        # Keys are time-ordered UUIDv7
+        assert uuid.UUID(data["details"]["prompt_id"]).version == 7
 
         # Ensure AI client was NOT called
         MockOllama.assert_not_called()
 
 
+def test_resubmitted_prompt_is_deduplicated(
+    client, db_session, unverified_user, unverified_user_token
+):
+    """
+    Test that resubmitting the same content (modulo case/whitespace) reuses the
+    stored prompt and refinement instead of inserting duplicates.
+    """
+    headers = {"Authorization": f"Bearer {unverified_user_token}"}
+    first = {"task": "Explain cooking", "title": "Cooking", "role": "Chef"}
+    again = {"task": "  explain   Cooking", "title": "Cooking", "role": "chef "}
+
+    responses = [
+        client.post(PREFIX, json=payload, headers=headers) for payload in (first, again)
+    ]
+
+    assert [r.status_code for r in responses] == [status.HTTP_200_OK] * 2
+    ids = {r.json()["details"]["prompt_id"] for r in responses}
+    assert len(ids) == 1
+    prompts = (
+        db_session.query(Prompts)
+        .filter(Prompts.author_id == unverified_user.user_id)
+        .all()
+    )
+    assert len(prompts) == 1
+    assert prompts[0].use_count == 2
+    structured = (
+        db_session.query(StructuredPrompts)
+        .filter(StructuredPrompts.author_id == unverified_user.user_id)
+        .all()
+    )
+    assert len(structured) == 1
+    assert structured[0].use_count == 2
+
+
+def test_resubmitted_prompt_reuses_its_ai_refinement(
+    client, db_session, test_user, test_user_token
+):
+    """
+    Test that a resubmitted prompt returns its stored refinement without asking
+    the AI again, even though the AI would now answer differently, and that the
+    prompt keeps a single structured version, alone or in a batch.
+    """
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    payload = {"task": "Explain entropy", "title": "Entropy"}
+    with patch("services.st_prompt_service.OllamaClient") as MockOllama:
+        generate = MockOllama.return_value.generate_chat_completion
+        generate.side_effect = [
+            {"choices": [{"message": {"content": f"AI answer {i}"}}]} for i in range(3)
+        ]
+        first = client.post(PREFIX, json=payload, headers=headers)
+        again = client.post(PREFIX, json=payload, headers=headers)
+        batch = client.post(f"{PREFIX}batch", json=[payload, payload], headers=headers)
+
+    assert first.json()["structured_prompt"] == "AI answer 0"
+    assert again.json()["structured_prompt"] == "AI answer 0"
+    assert [r["result"]["structured_prompt"] for r in batch.json()["items"]] == [
+        "AI answer 0"
+    ] * 2
+    assert generate.call_count == 1
+    structured = (
+        db_session.query(StructuredPrompts)
+        .filter(StructuredPrompts.author_id == test_user.user_id)
+        .all()
+    )
+    assert len(structured) == 1
+    assert structured[0].original_prompt_id == first.json()["details"]["prompt_id"]
+    assert structured[0].use_count == 4
+
+
 def test_rate_limit_exceeded(client, test_user_token):
     """
     Test that verified users are rate limited after 10 requests.
@@ -85,3 +164,415 @@ def test_rate_limit_exceeded(client, test_user_token):
         response = client.post(PREFIX, json=payload, headers=headers)
         assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
         assert response.json()["detail"]["error_code"] == "rate_limit_exceeded"
+
+
+def test_history_keyset_pagination(client, db_session, test_user, test_user_token):
+    """
+    Test that GET /pcrafter/ walks the history newest first with an opaque cursor.
+    """
+    base = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    for i in range(5):
+        db_session.add(
+            Prompts(
+                prompt_id=str(uuid.uuid4()),
+                title=f"Prompt {i}",
+                author_id=test_user.user_id,
+                created_at=base + timedelta(minutes=i),
+            )
+        )
+    db_session.commit()
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+
+    titles, cursor = [], None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get(PREFIX, params=params, headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        page = response.json()
+        assert len(page["items"]) <= 2
+        titles.extend(item["title"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert titles == [f"Prompt {i}" for i in reversed(range(5))]
+
+
+def test_history_of_a_user_without_prompts_is_an_empty_page(client, test_user_token):
+    """
+    Test that a user with no prompts gets an empty last page, not an error.
+    """
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+
+    response = client.get(PREFIX, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"items": [], "next_cursor": None}
+
+
+def test_history_with_structured_versions_fixed_query_count(
+    client, db_session, test_user, test_user_token
+):
+    """
+    Test that GET /pcrafter/history returns prompts with their structured versions
+    using the same number of queries for every page (no N+1 lazy loads).
+    """
+    base = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    for i in range(6):
+        prompt_id = str(uuid.uuid4())
+        db_session.add(
+            Prompts(
+                prompt_id=prompt_id,
+                title=f"Prompt {i}",
+                author_id=test_user.user_id,
+                created_at=base + timedelta(minutes=i),
+            )
+        )
+        db_session.flush()
+        if i % 2 == 0:
+            db_session.add(
+                StructuredPrompts(
+                    prompt_id=str(uuid.uuid4()),
+                    structured_prompt=f"Structured {i}",
+                    author_id=test_user.user_id,
+                    original_prompt_id=prompt_id,
+                )
+            )
+    db_session.commit()
+    db_session.expire_all()
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db_session.bind, "before_cursor_execute", count_statement)
+    try:
+        items, query_counts, cursor = [], [], None
+        while True:
+            params = {"limit": 3}
+            if cursor:
+                params["cursor"] = cursor
+            statements.clear()
+            response = client.get(f"{PREFIX}history", params=params, headers=headers)
+            assert response.status_code == status.HTTP_200_OK
+            query_counts.append(len(statements))
+            page = response.json()
+            items.extend(page["items"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+    finally:
+        event.remove(db_session.bind, "before_cursor_execute", count_statement)
+
+    # one keyset query for the page plus one selectin query for the structured versions
+    assert query_counts == [2, 2]
+    assert [item["title"] for item in items] == [
+        f"Prompt {i}" for i in reversed(range(6))
+    ]
+    for item in items:
+        i = int(item["title"].split()[-1])
+        if i % 2 == 0:
+            assert item["structured_version"]["structured_prompt"] == f"Structured {i}"
+        else:
+            assert item["structured_version"] is None
+
+
+def test_history_streams_ndjson(client, db_session, test_user, test_user_token):
+    """
+    Test that asking for NDJSON streams the whole history, newest first.
+    """
+    base = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    for i in range(3):
+        db_session.add(
+            Prompts(
+                prompt_id=str(uuid.uuid4()),
+                title=f"Prompt {i}",
+                author_id=test_user.user_id,
+                created_at=base + timedelta(minutes=i),
+            )
+        )
+    db_session.commit()
+    headers = {
+        "Authorization": f"Bearer {test_user_token}",
+        "Accept": "application/x-ndjson",
+    }
+
+    response = client.get(PREFIX, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [r["title"] for r in rows] == ["Prompt 2", "Prompt 1", "Prompt 0"]
+    assert rows[0]["author_id"] == test_user.user_id
+
+
+def test_history_invalid_cursor(client, test_user_token):
+    """
+    Test that a malformed cursor is rejected with a 400.
+    """
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    response = client.get(PREFIX, params={"cursor": "not-a-cursor"}, headers=headers)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json()["detail"]["error_code"] == "invalid_cursor"
+
+
+def test_history_cursor_with_malformed_id(client, test_user_token):
+    """
+    Test that a well-formed cursor whose row id is not a UUID is rejected with a
+    400 instead of reaching the database.
+    """
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    cursor = encode_cursor(datetime.now(timezone.utc), "not-a-uuid")
+    response = client.get(PREFIX, params={"cursor": cursor}, headers=headers)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json()["detail"]["error_code"] == "invalid_cursor"
+
+
+def test_search_prompts_prefix_and_typo(client, db_session, test_user, test_user_token):
+    """
+    Test that search matches word prefixes and tolerates typos in titles.
+    """
+    for title, task in [
+        ("Quantum computing basics", "Explain qubits"),
+        ("Documentation writer", "Write API docs"),
+    ]:
+        db_session.add(
+            Prompts(
+                prompt_id=str(uuid.uuid4()),
+                title=title,
+                task=task,
+                author_id=test_user.user_id,
+            )
+        )
+    db_session.commit()
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+
+    response = client.get(f"{PREFIX}search", params={"q": "quant"}, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert [p["title"] for p in response.json()["items"]] == [
+        "Quantum computing basics"
+    ]
+
+    response = client.get(
+        f"{PREFIX}search", params={"q": "documentaton"}, headers=headers
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert [p["title"] for p in response.json()["items"]] == ["Documentation writer"]
+
+
+def test_tag_facets_follow_public_prompts(
+    client, db_session, test_user, test_user_token
+):
+    """
+    Test that tag counts are maintained on insert/delete and only count public prompts.
+    """
+    public_prompt = Prompts(
+        prompt_id=str(uuid.uuid4()),
+        title="Public",
+        tags=["python", "fastapi"],
+        is_public=True,
+        author_id=test_user.user_id,
+    )
+    db_session.add_all(
+        [
+            public_prompt,
+            Prompts(
+                prompt_id=str(uuid.uuid4()),
+                title="Private",
+                tags=["python"],
+                author_id=test_user.user_id,
+            ),
+        ]
+    )
+    db_session.commit()
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+
+    response = client.get(f"{PREFIX}tags", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert {t["tag"]: t["count"] for t in response.json()} == {
+        "python": 1,
+        "fastapi": 1,
+    }
+
+    response = client.get(f"{PREFIX}tags/python", headers=headers)
+    assert [p["title"] for p in response.json()["items"]] == ["Public"]
+
+    db_session.delete(public_prompt)
+    db_session.commit()
+    response = client.get(f"{PREFIX}tags", headers=headers)
+    assert response.json() == []
+
+
+def test_bulk_import_and_export_round_trip(client, test_user_token):
+    """
+    Test that a gzip NDJSON import is loaded with COPY and comes back from the export.
+    """
+    lines = [
+        json.dumps({"title": f"Imported {i}", "tags": ["bulk", 'quote"d']})
+        for i in range(3)
+    ]
+    lines.insert(1, "{not json")
+    body = gzip.compress("\n".join(lines).encode("utf-8"))
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+
+    response = client.post(
+        f"{PREFIX}import",
+        params={"format": "ndjson"},
+        content=body,
+        headers={**headers, "Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    result = response.json()
+    assert result["imported"] == 3
+    assert result["rejected"] == 1
+    assert result["errors"][0].startswith("line 2")
+
+    response = client.get(f"{PREFIX}export", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    exported = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(p["title"] for p in exported) == [f"Imported {i}" for i in range(3)]
+    assert exported[0]["tags"] == ["bulk", 'quote"d']
+
+    response = client.get(f"{PREFIX}export", params={"format": "csv"}, headers=headers)
+    assert response.text.splitlines()[0].startswith("prompt_id,title")
+    assert len(response.text.splitlines()) == 4
+
+
+def test_bulk_import_deduplicates_content(
+    client, db_session, test_user, test_user_token, monkeypatch
+):
+    """
+    Test that imported rows get a content hash and that content already stored,
+    or repeated across import chunks, reuses one prompt.
+    """
+    monkeypatch.setattr(settings, "IMPORT_CHUNK_ROWS", 2)
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    client.post(PREFIX, json={"title": "Existing", "task": "Kept"}, headers=headers)
+    lines = [
+        json.dumps(record)
+        for record in [
+            {"title": "Repeated", "task": "Twice"},
+            {"title": "Existing", "task": "Kept"},
+            {"title": "repeated ", "task": "twice"},
+        ]
+    ]
+
+    response = client.post(
+        f"{PREFIX}import",
+        params={"format": "ndjson"},
+        content="\n".join(lines).encode("utf-8"),
+        headers={**headers, "Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    result = response.json()
+    assert (result["imported"], result["deduplicated"]) == (1, 2)
+
+    db_session.expire_all()
+    rows = (
+        db_session.query(Prompts)
+        .filter(Prompts.author_id == test_user.user_id)
+        .order_by(Prompts.title)
+        .all()
+    )
+    assert [(p.title, p.use_count) for p in rows] == [("Existing", 2), ("Repeated", 2)]
+    assert all(p.content_hash is not None for p in rows)
+
+
+def test_batch_create_reports_items_in_order(
+    client, db_session, unverified_user, unverified_user_token
+):
+    """
+    Test that POST /pcrafter/batch returns one result per item in order, reports
+    invalid items without failing the others, deduplicates repeated content and
+    saves the prompts with a single multi-row INSERT.
+    """
+    headers = {"Authorization": f"Bearer {unverified_user_token}"}
+    items = [
+        {"task": "Explain cooking", "role": "Chef"},
+        {"task": "Bad tags", "tags": "not-a-list"},
+        {"task": "explain  COOKING", "role": "chef"},
+        {"task": "Plan a trip", "role": "Guide"},
+    ]
+
+    inserts = []
+    listener = lambda *args: inserts.append(args[2])
+    event.listen(db_session.bind, "before_cursor_execute", listener)
+    response = client.post(f"{PREFIX}batch", json=items, headers=headers)
+    event.remove(db_session.bind, "before_cursor_execute", listener)
+
+    assert response.status_code == status.HTTP_200_OK
+    results = response.json()["items"]
+    assert [r["index"] for r in results] == [0, 1, 2, 3]
+    assert results[1]["result"] is None and results[1]["error"]
+    assert [r["error"] for r in results if r["index"] != 1] == [None] * 3
+    ids = [r["result"]["details"]["prompt_id"] for r in results if r["result"]]
+    assert ids[0] == ids[1] != ids[2]
+    assert "Plan a trip" in results[3]["result"]["structured_prompt"]
+    assert len([q for q in inserts if q.startswith("INSERT INTO prompts")]) == 1
+
+    prompts = {
+        p.task: p.use_count
+        for p in db_session.query(Prompts).filter(
+            Prompts.author_id == unverified_user.user_id
+        )
+    }
+    assert prompts == {"Explain cooking": 2, "Plan a trip": 1}
+    assert (
+        db_session.query(StructuredPrompts)
+        .filter(StructuredPrompts.author_id == unverified_user.user_id)
+        .count()
+        == 2
+    )
+
+
+def test_batch_charges_quota_once_and_refines_with_ai(client, test_user_token):
+    """
+    Test that a verified user's batch is refined by the AI and charged as a whole
+    against the daily quota.
+    """
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    with patch("services.st_prompt_service.OllamaClient") as MockOllama:
+        MockOllama.return_value.generate_chat_completion.return_value = {
+            "choices": [{"message": {"content": "AI Content"}}]
+        }
+        items = [{"task": f"Task {i}"} for i in range(3)]
+        response = client.post(f"{PREFIX}batch", json=items, headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert [r["result"]["structured_prompt"] for r in response.json()["items"]] == [
+            "AI Content"
+        ] * 3
+
+        # 7 of the 10 daily tokens are left
+        items = [{"task": f"More {i}"} for i in range(8)]
+        response = client.post(f"{PREFIX}batch", json=items, headers=headers)
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert MockOllama.return_value.generate_chat_completion.call_count == 3
+
+
+def test_batch_reports_items_failed_when_refinements_cannot_be_saved(
+    client, db_session, unverified_user, unverified_user_token
+):
+    """
+    Test that a database error saving the structured prompts, after the prompts
+    were committed, marks the items failed instead of failing the request.
+    """
+    headers = {"Authorization": f"Bearer {unverified_user_token}"}
+    items = [{"task": "Explain sailing"}, {"task": "Explain knots"}]
+    with patch(
+        "services.st_prompt_service.RestructuredPromptService.save_structured_prompts",
+        side_effect=OperationalError("INSERT", {}, Exception("connection lost")),
+    ):
+        response = client.post(f"{PREFIX}batch", json=items, headers=headers)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [r["error"] for r in response.json()["items"]] == [
+        "Structured prompt creation failed."
+    ] * 2
+    assert (
+        db_session.query(Prompts)
+        .filter(Prompts.author_id == unverified_user.user_id)
+        .count()
+        == 2
+    )
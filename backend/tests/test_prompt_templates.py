@@ -0,0 +1,65 @@
+import pytest
+
+from core.schemas import PromptSchema
+from services.prompt_templates import TemplateRegistry, templates
+from services.st_prompt_service import PromptSystem
+from services.template_benchmark import legacy_structured
+
+
+def test_compiled_templates_match_the_original_fstrings():
+    """
+    Test that the built-in templates render exactly what PromptSystem used to,
+    one at a time and through render_many, for objects and mappings.
+    """
+    prompts = [
+        PromptSchema(role="chef", task="plan a menu {not a field}", output="a list"),
+        PromptSchema(
+            role="tutor",
+            task="explain",
+            constraints="short",
+            output="bullets",
+            personality="Feynman",
+        ),
+    ]
+    expected = [
+        legacy_structured(p.role, p.task, p.constraints, p.output, p.personality)
+        for p in prompts
+    ]
+    psystem = PromptSystem()
+    assert [
+        psystem.build_structured_prompt(
+            p.role, p.task, p.constraints, p.output, p.personality
+        )
+        for p in prompts
+    ] == expected
+    assert templates.render_many("structured", prompts) == expected
+    assert templates.render_many("structured", [p.model_dump() for p in prompts]) == (
+        expected
+    )
+
+    outputs = psystem.create_prompts_normal_way(prompts)
+    assert [o.structured_prompt for o in outputs] == expected
+    assert (
+        outputs[1].natural_prompt
+        == psystem.create_prompt_normal_way(prompts[1]).natural_prompt
+    )
+
+
+def test_template_versions_and_validation():
+    """
+    Test that the latest version is used by default, older ones stay
+    available, and unknown placeholders are rejected at registration.
+    """
+    registry = TemplateRegistry()
+    registry.register("short", 1, "Be {role}: {task}")
+    registry.register("short", 2, "{{{role}}} does {task}")
+    assert registry.versions("short") == [1, 2]
+    assert registry.render("short", role="chef", task="cook") == "{chef} does cook"
+    assert registry.render("short", 1, role="chef", task="cook") == "Be chef: cook"
+
+    with pytest.raises(ValueError):
+        registry.register("short", 2, "{task}")
+    with pytest.raises(ValueError):
+        registry.register("broken", 1, "{__import__}")
+    with pytest.raises(KeyError):
+        registry.get("missing")
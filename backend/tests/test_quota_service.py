@@ -0,0 +1,206 @@
+from datetime import datetime
+
+import pytest
+
+from core.custom_error_handlers import RateLimitExceeded
+from services.quota_service import (
+    CONSUME_SCRIPT,
+    RECONCILE_SCRIPT,
+    DailyQuotaService,
+    dirty_key,
+    usage_key,
+)
+
+
+class FakeQuotaRedis:
+    """
+    Hashes, sets and the quota scripts (in Python, with the semantics of their
+    Lua source). Set 'down' to make every command fail like an outage.
+    """
+
+    def __init__(self):
+        self.hashes = {}
+        self.sets = {}
+        self.down = False
+        self._results = None
+
+    def register_script(self, script):
+        run = {CONSUME_SCRIPT: self._consume, RECONCILE_SCRIPT: self._reconcile}[script]
+
+        def call(keys, args, client=None):
+            self._check()
+            result = run(keys, [str(arg) for arg in args])
+            if client is not None:
+                # Queued on a pipeline
+                self._results.append(result)
+            return result
+
+        return call
+
+    def _check(self):
+        if self.down:
+            raise ConnectionError("Redis is down")
+
+    def _consume(self, keys, args):
+        usage = self.hashes.setdefault(keys[0], {})
+        if "limit" not in usage:
+            if args[3] == "":
+                del self.hashes[keys[0]]
+                return [-2, 0, 0]
+            usage["limit"] = int(args[3])
+            usage.setdefault("used", int(args[4]))
+        cost, used, limit = int(args[0]), usage.get("used", 0), usage["limit"]
+        if used + cost > limit:
+            return [0, used, limit]
+        usage["used"] = used + cost
+        self.sets.setdefault(keys[1], set()).add(args[2].encode())
+        return [1, usage["used"], limit]
+
+    def _reconcile(self, keys, args):
+        usage = self.hashes.get(keys[0])
+        if usage is None or usage.get("used", 0) >= int(args[0]):
+            return 0
+        usage["used"] = int(args[0])
+        return 1
+
+    def spop(self, key, count):
+        self._check()
+        members = self.sets.pop(key, set())
+        return list(members) or None
+
+    def sadd(self, key, *members):
+        self.sets.setdefault(key, set()).update(m.encode() for m in members)
+
+    def pipeline(self, transaction=True):
+        self._results = []
+        return self
+
+    def hget(self, key, field):
+        value = self.hashes.get(key, {}).get(field)
+        self._results.append(None if value is None else str(value).encode())
+
+    def hdel(self, key, *fields):
+        for field in fields:
+            self.hashes.get(key, {}).pop(field, None)
+
+    def execute(self):
+        results, self._results = self._results, None
+        return results
+
+
+@pytest.fixture
+def quota_redis(monkeypatch):
+    fake_redis = FakeQuotaRedis()
+    monkeypatch.setattr("services.quota_service.get_sync_redis", lambda: fake_redis)
+    return fake_redis
+
+
+def today():
+    return datetime.utcnow().date()
+
+
+def test_consume_allows_until_the_limit(db_session, test_user, quota_redis):
+    """
+    Test that tokens are consumed in Redis up to the daily limit, then refused.
+    """
+    quota = DailyQuotaService()
+
+    assert quota.consume(db_session, test_user.user_id, cost=4) == 6
+    assert quota.consume(db_session, test_user.user_id, cost=6) == 0
+    with pytest.raises(RateLimitExceeded):
+        quota.consume(db_session, test_user.user_id)
+    assert quota_redis.sets[dirty_key(today())] == {test_user.user_id.encode()}
+
+
+def test_first_check_of_the_day_seeds_from_the_database(
+    db_session, test_user, quota_redis
+):
+    """
+    Test that the first check of the day loads the limit and the usage already
+    recorded in the database, and that usage of an earlier day is not carried over.
+    """
+    test_user.daily_token_limit = 5
+    test_user.tokens_used_today = 3
+    test_user.last_token_reset = today()
+    db_session.commit()
+    quota = DailyQuotaService()
+
+    assert quota.consume(db_session, test_user.user_id) == 1
+    assert quota_redis.hashes[usage_key(today(), test_user.user_id)] == {
+        "limit": 5,
+        "used": 4,
+    }
+
+    quota_redis.hashes.clear()
+    test_user.last_token_reset = None
+    db_session.commit()
+    assert quota.consume(db_session, test_user.user_id) == 4
+
+
+def test_fallback_usage_is_reconciled_and_never_written_back_lower(
+    db_session, test_user, quota_redis
+):
+    """
+    Test that tokens consumed in the database during a Redis outage raise the
+    Redis count when it is back, and that the write-back never lowers the usage
+    recorded in the database.
+    """
+    quota = DailyQuotaService()
+    assert quota.consume(db_session, test_user.user_id, cost=2) == 8
+    assert quota.write_back(db_session) == 1
+
+    quota_redis.down = True
+    assert quota.consume(db_session, test_user.user_id, cost=3) == 5
+    db_session.refresh(test_user)
+    assert test_user.tokens_used_today == 5
+
+    quota_redis.down = False
+    assert quota.consume(db_session, test_user.user_id) == 4
+    assert quota_redis.hashes[usage_key(today(), test_user.user_id)]["used"] == 6
+
+    # Redis lagging behind the database must not lower it
+    quota_redis.hashes[usage_key(today(), test_user.user_id)]["used"] = 1
+    assert quota.write_back(db_session) == 1
+    db_session.refresh(test_user)
+    assert test_user.tokens_used_today == 5
+
+
+def test_new_process_reconciles_usage_only_the_database_has(
+    db_session, test_user, quota_redis
+):
+    """
+    Test that a process reconciles Redis with the database on its first check,
+    so fallback usage of a crashed process or another node is not lost, while
+    usage Redis has not written back yet is kept.
+    """
+    other = DailyQuotaService()
+    assert other.consume(db_session, test_user.user_id, cost=2) == 8
+    # Consumed by a fallback of a process that then crashed
+    test_user.tokens_used_today = 7
+    test_user.last_token_reset = today()
+    db_session.commit()
+
+    assert DailyQuotaService().consume(db_session, test_user.user_id) == 2
+    assert quota_redis.hashes[usage_key(today(), test_user.user_id)]["used"] == 8
+
+    test_user.tokens_used_today = 3
+    db_session.commit()
+    assert DailyQuotaService().consume(db_session, test_user.user_id) == 1
+
+
+def test_write_back_copies_dirty_usage(db_session, test_user, quota_redis):
+    """
+    Test that the write-back copies the day's Redis usage of dirty users to the
+    database and resets the usage of an earlier day.
+    """
+    test_user.tokens_used_today = 9
+    test_user.last_token_reset = None
+    db_session.commit()
+    quota = DailyQuotaService()
+    quota.consume(db_session, test_user.user_id, cost=3)
+
+    assert quota.write_back(db_session) == 1
+    db_session.refresh(test_user)
+    assert (test_user.tokens_used_today, test_user.last_token_reset) == (3, today())
+    # Nothing is dirty anymore
+    assert quota.write_back(db_session) == 0
@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+import pytest
+from unittest.mock import patch, AsyncMock, MagicMock
+
+from auth.revocation import RevocationFilter
+from db.redis import (
+    REVOKED_INDEX_BACKFILLED_KEY,
+    REVOKED_INDEX_BACKFILL_LOCK_KEY,
+    REVOKED_INDEX_KEY,
+    add_jit_to_blocklist,
+    backfill_revoked_index,
+    token_in_blocklist,
+)
+
+
+def test_filter_answers_locally_once_synced():
+    """
+    Test that the filter defers to Redis until synced, then rules unknown jtis out
+    and recent revocations in.
+    """
+    revoked = RevocationFilter(capacity=100, error_rate=0.001, exact_size=2)
+    assert revoked.check("a") is None
+
+    exp = time.time() + 600
+    revoked.rebuild([("a", exp)])
+    assert revoked.check("a") is True
+    assert revoked.check("never-revoked") is False
+
+    # Pushed out of the exact set: still in the Bloom filter, so Redis decides
+    revoked.add("b", exp)
+    revoked.add("c", exp)
+    assert revoked.check("a") is None
+
+
+def test_blocklist_ttl_follows_token_exp():
+    """
+    Test that a revoked jti is kept in Redis for the token's remaining lifetime
+    and that checks against a synced filter skip Redis.
+    """
+    redis_client = MagicMock()
+    redis_client.pipeline.return_value.execute = AsyncMock()
+    redis_client.get = AsyncMock(return_value=None)
+    revoked = RevocationFilter(capacity=100, error_rate=0.001, exact_size=10)
+    revoked.rebuild([])
+
+    with patch("db.redis.get_async_redis", return_value=redis_client), patch(
+        "db.redis.revocation_filter", revoked
+    ):
+        asyncio.run(add_jit_to_blocklist("jti-1", exp=time.time() + 120))
+        assert asyncio.run(token_in_blocklist("jti-1")) is True
+        assert asyncio.run(token_in_blocklist("jti-2")) is False
+
+    ttl = redis_client.pipeline.return_value.set.call_args.kwargs["ex"]
+    assert 119 <= ttl <= 120
+    redis_client.get.assert_not_called()
+
+
+def test_backfill_indexes_blocklist_keys_from_before_the_index():
+    """
+    Test that blocklist keys written before the revoked index existed are added
+    to it with their remaining lifetime as exp, under a lock, and that the
+    marker recording it never expires.
+    """
+    legacy_jti = b"0b7c0a4e-4f5e-4d8e-9a51-3c2f8d1e6a90"
+    other_key = b"1c8d1b5f-5a6f-4e9f-8b62-4d3a9e2f7b01"
+    keys = {legacy_jti: (b"true", 90_000), other_key: (b"something else", 90_000)}
+
+    async def scan_iter(match, count):
+        for key in keys:
+            yield key
+
+    redis_client = MagicMock()
+    redis_client.exists = AsyncMock(return_value=0)
+    redis_client.scan_iter = scan_iter
+    redis_client.pipeline.return_value.execute = AsyncMock(
+        return_value=[reply for key in keys for reply in keys[key]]
+    )
+    redis_client.zadd = AsyncMock()
+    redis_client.set = AsyncMock(return_value=True)
+    redis_client.delete = AsyncMock()
+
+    with patch("db.redis.get_async_redis", return_value=redis_client):
+        assert asyncio.run(backfill_revoked_index()) == 1
+        ((index, revoked), _) = redis_client.zadd.call_args
+        assert index == REVOKED_INDEX_KEY
+        assert list(revoked) == [legacy_jti]
+        assert 85 <= revoked[legacy_jti] - time.time() <= 90
+        lock, marker = redis_client.set.call_args_list
+        assert lock.args[0] == REVOKED_INDEX_BACKFILL_LOCK_KEY
+        assert lock.kwargs["nx"] is True
+        assert marker.args[0] == REVOKED_INDEX_BACKFILLED_KEY
+        assert "ex" not in marker.kwargs
+        redis_client.delete.assert_awaited_once_with(REVOKED_INDEX_BACKFILL_LOCK_KEY)
+
+        redis_client.exists.return_value = 1
+        assert asyncio.run(backfill_revoked_index()) == 0
+    assert redis_client.zadd.call_count == 1
+
+
+def test_backfill_waits_for_the_worker_holding_the_lock():
+    """
+    Test that a worker which cannot take the backfill lock does not scan and
+    raises, so its filter stays not ready until the backfill is done.
+    """
+    redis_client = MagicMock()
+    redis_client.exists = AsyncMock(return_value=0)
+    redis_client.set = AsyncMock(return_value=None)
+
+    with patch("db.redis.get_async_redis", return_value=redis_client):
+        with pytest.raises(RuntimeError):
+            asyncio.run(backfill_revoked_index())
+    redis_client.scan_iter.assert_not_called()
@@ -0,0 +1,232 @@
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from db.models import StructuredPrompts
+from core.config import settings
+from core.ids import new_id
+from core.formatters import content_hash
+from db.dedup import _lock_key
+from services.structured_write_behind import (
+    DEAD_LETTER_KEY,
+    STREAM_KEY,
+    StructuredPromptWriteBehind,
+    apply_batch,
+)
+
+
+class FakeStreamRedis:
+    """
+    Just enough of a Redis stream with one consumer group for the flusher.
+    Pending entries are always idle long enough to be reclaimed, as if the
+    previous flush had crashed long ago.
+    """
+
+    def __init__(self):
+        self.streams = {}
+        self.pending = {}
+        self.delivered = set()
+        self._results = None
+        self._next_id = 0
+
+    def pipeline(self, transaction=True):
+        self._results = []
+        return self
+
+    def execute(self):
+        results, self._results = self._results, None
+        return results
+
+    def _reply(self, value):
+        if self._results is not None:
+            self._results.append(value)
+        return value
+
+    def xgroup_create(self, name, groupname, id="$", mkstream=False):
+        self.streams.setdefault(name, [])
+
+    def xadd(self, name, fields):
+        self._next_id += 1
+        entry_id = f"{self._next_id}-0".encode()
+        encoded = {
+            k.encode(): v if isinstance(v, bytes) else str(v).encode()
+            for k, v in fields.items()
+        }
+        self.streams.setdefault(name, []).append((entry_id, encoded))
+        return self._reply(entry_id)
+
+    def xautoclaim(self, name, groupname, consumername, min_idle_time, count):
+        claimed = [e for e in self.streams.get(name, []) if e[0] in self.pending]
+        for entry_id, _ in claimed[:count]:
+            self.pending[entry_id] += 1
+        return [b"0-0", claimed[:count], []]
+
+    def xreadgroup(self, groupname, consumername, streams, count):
+        (name,) = streams
+        fresh = [e for e in self.streams.get(name, []) if e[0] not in self.delivered]
+        for entry_id, _ in fresh[:count]:
+            self.delivered.add(entry_id)
+            self.pending[entry_id] = 1
+        return [[name.encode(), fresh[:count]]] if fresh else []
+
+    def xpending_range(self, name, groupname, min, max, count):
+        if min not in self.pending:
+            return self._reply([])
+        return self._reply([{"message_id": min, "times_delivered": self.pending[min]}])
+
+    def xack(self, name, groupname, *ids):
+        for entry_id in ids:
+            self.pending.pop(entry_id, None)
+        return self._reply(len(ids))
+
+    def xdel(self, name, *ids):
+        self.streams[name] = [e for e in self.streams[name] if e[0] not in ids]
+        return self._reply(len(ids))
+
+    def xlen(self, name):
+        return self._reply(len(self.streams.get(name, [])))
+
+
+@pytest.fixture
+def stream_redis(monkeypatch):
+    fake_redis = FakeStreamRedis()
+    monkeypatch.setattr(
+        "services.structured_write_behind.get_sync_redis", lambda: fake_redis
+    )
+    return fake_redis
+
+
+def make_row(author_id: str, text: str) -> dict:
+    now = datetime.now(timezone.utc)
+    return {
+        "prompt_id": new_id(),
+        "structured_prompt": text,
+        "natural_prompt": text,
+        "author_id": author_id,
+        "original_prompt_id": None,
+        "content_hash": content_hash(None, text, text),
+        "created_at": now,
+        "last_used_at": now,
+    }
+
+
+def test_apply_batch_is_idempotent_and_deduplicates(db_session, test_user):
+    """
+    Test that replayed stream entries are not inserted twice and that repeated
+    content inside and across batches bumps use_count instead of inserting.
+    """
+    first = make_row(test_user.user_id, "Structured A")
+    repeat = make_row(test_user.user_id, "Structured A")
+    other = make_row(test_user.user_id, "Structured B")
+
+    assert apply_batch(db_session, [first, repeat, other]) == {
+        "inserted": 2,
+        "duplicate": 1,
+        "replayed": 0,
+    }
+    db_session.commit()
+    # At-least-once delivery: the same entries come again
+    assert apply_batch(db_session, [first, other]) == {
+        "inserted": 0,
+        "duplicate": 0,
+        "replayed": 2,
+    }
+    db_session.commit()
+
+    rows = {
+        row.structured_prompt: row.use_count
+        for row in db_session.query(StructuredPrompts).filter(
+            StructuredPrompts.author_id == test_user.user_id
+        )
+    }
+    assert rows == {"Structured A": 2, "Structured B": 1}
+
+
+def test_apply_batch_takes_the_content_locks_of_the_writers(db_session, test_user):
+    """
+    Test that the flusher holds the same per-content advisory locks as the
+    synchronous writers (db.dedup), one per (author_id, content_hash).
+    """
+    rows = [make_row(test_user.user_id, f"Structured {i}") for i in "XYX"]
+
+    apply_batch(db_session, rows)
+
+    held = db_session.execute(
+        text(
+            "SELECT (classid::bigint << 32) | objid::bigint FROM pg_locks "
+            "WHERE locktype = 'advisory' AND pid = pg_backend_pid()"
+        )
+    ).scalars()
+    expected = {
+        _lock_key(
+            StructuredPrompts.__tablename__, row["author_id"], row["content_hash"]
+        )
+        for row in rows
+    }
+    # pg_locks splits the key into two unsigned halves
+    assert {key - (1 << 64) if key >= 1 << 63 else key for key in held} == expected
+
+
+def test_apply_batch_pins_authors_to_the_primary(db_session, test_user):
+    """
+    Test that the flusher's Core INSERT records the authors it wrote for, so the
+    commit keeps their reads on the primary like an ORM flush would.
+    """
+    apply_batch(db_session, [make_row(test_user.user_id, "Structured C")])
+
+    assert db_session.info["written_users"] == {str(test_user.user_id)}
+
+
+def test_flush_dead_letters_unreadable_entries(db_session, test_user, stream_redis):
+    """
+    Test that entries that cannot be parsed are moved to the dead-letter stream
+    and acknowledged, while the rest of the batch is flushed.
+    """
+    write_behind = StructuredPromptWriteBehind()
+    good = make_row(test_user.user_id, "Structured D")
+    assert write_behind.enqueue(good)
+    stream_redis.xadd(STREAM_KEY, {"row": "{not json"})
+    stream_redis.xadd(STREAM_KEY, {"row": '{"content_hash": "zz"}'})
+
+    assert write_behind.flush(db_session) == 3
+
+    stored = db_session.query(StructuredPrompts.prompt_id).all()
+    assert [row.prompt_id for row in stored] == [good["prompt_id"]]
+    dead = stream_redis.streams[DEAD_LETTER_KEY]
+    assert [fields[b"row"] for _, fields in dead] == [
+        b"{not json",
+        b'{"content_hash": "zz"}',
+    ]
+    assert all(fields[b"reason"].startswith(b"unreadable") for _, fields in dead)
+    assert stream_redis.streams[STREAM_KEY] == []
+    assert stream_redis.pending == {}
+
+
+def test_flush_dead_letters_entries_that_keep_failing(
+    db_session, test_user, stream_redis, monkeypatch
+):
+    """
+    Test that an entry whose batch keeps failing is redelivered until
+    STRUCTURED_FLUSH_MAX_DELIVERIES, then moved to the dead-letter stream.
+    """
+    monkeypatch.setattr(settings, "STRUCTURED_FLUSH_MAX_DELIVERIES", 2)
+
+    def failing_batch(db, rows):
+        raise OperationalError("INSERT", {}, Exception("row rejected"))
+
+    monkeypatch.setattr("services.structured_write_behind.apply_batch", failing_batch)
+    write_behind = StructuredPromptWriteBehind()
+    write_behind.enqueue(make_row(test_user.user_id, "Structured E"))
+
+    for _ in range(2):
+        with pytest.raises(OperationalError):
+            write_behind.flush(db_session)
+    assert write_behind.flush(db_session) == 1
+
+    ((_, fields),) = stream_redis.streams[DEAD_LETTER_KEY]
+    assert fields[b"reason"] == b"not flushed after 2 deliveries"
+    assert stream_redis.streams[STREAM_KEY] == []
+    assert stream_redis.pending == {}
+    assert write_behind.flush(db_session) == 0
@@ -0,0 +1,36 @@
+from sqlalchemy import event
+
+from core.cache.cache import INVALIDATE_CHANNEL
+from core.cache.codec import unpack
+from services.user_cache import user_cache
+from services.user_service import UserService
+
+uservice = UserService()
+
+
+def test_profile_tiers_and_write_through_invalidation(
+    db_session, test_user, cache_redis
+):
+    """
+    Test that a profile loaded once is served from Redis and then from the local
+    tier without queries, and that an update invalidates it everywhere and
+    writes the new profile through.
+    """
+    assert user_cache.get(db_session, test_user.user_id).username == "testuser"
+
+    queries = []
+    event.listen(
+        db_session.bind,
+        "before_cursor_execute",
+        lambda *args: queries.append(args[2]),
+    )
+    user_cache.drop_local()
+    assert user_cache.get(db_session, test_user.user_id).email == test_user.email
+    assert user_cache.get_by_email(db_session, test_user.email).user_id
+    assert queries == []
+
+    uservice.update_user(test_user, {"username": "renamed"}, db_session)
+    [(channel, message)] = cache_redis.published
+    assert channel == INVALIDATE_CHANNEL
+    assert unpack(message) == {"tags": [f"user:{test_user.user_id}"]}
+    assert user_cache.get(db_session, test_user.user_id).username == "renamed"
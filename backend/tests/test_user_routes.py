@@ -1,7 +1,186 @@
+import json
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest.mock import patch, AsyncMock, MagicMock
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
 from fastapi import status
+from google.auth import crypt, jwt as google_jwt
 from core.config import settings
+from auth.oauth2 import create_access_token, decode_access_token, token_digest
+from auth.token_cache import verified_tokens
+from auth.google_oauth import google_certs
+from db.models import RefreshToken
+from services.user_service import UserService
 
 PREFIX = f"/api/{settings.VERSION or "v1.1"}/user"
+uservice = UserService()
 
 # Tests for password login/signup removed as we moved to Google Auth only.
-# TODO: Add tests for Google Auth (mocked) and other existing routes like /refresh, /logout
+
+
+@pytest.fixture
+def google_stand_in(monkeypatch):
+    """
+    Local stand-in for Google's token and certificate endpoints.
+    Yields the list of requested paths.
+    """
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    signer = crypt.RSASigner.from_string(
+        private_key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        ),
+        key_id="stand-in-key",
+    )
+    public_pem = (
+        private_key.public_key()
+        .public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+        .decode()
+    )
+    requested = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, body: dict, headers: dict):
+            requested.append(self.path)
+            payload = json.dumps(body).encode()
+            self.send_response(200)
+            for name, value in {"Content-Type": "application/json", **headers}.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            self._send(
+                {"stand-in-key": public_pem}, {"Cache-Control": "public, max-age=3600"}
+            )
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            now = int(time.time())
+            id_token = google_jwt.encode(
+                signer,
+                {
+                    "iss": "https://accounts.google.com",
+                    "aud": settings.GOOGLE_CLIENT_ID,
+                    "sub": "google-sub-1",
+                    "email": "googler@example.com",
+                    "name": "Googler",
+                    "iat": now,
+                    "exp": now + 3600,
+                },
+            ).decode()
+            self._send({"access_token": "at", "id_token": id_token}, {})
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    monkeypatch.setattr(settings, "GOOGLE_TOKEN_URI", f"{base}/token")
+    monkeypatch.setattr(settings, "GOOGLE_CERTS_URL", f"{base}/certs")
+    google_certs.clear()
+    yield requested
+    server.shutdown()
+    google_certs.clear()
+
+
+def test_google_login_caches_signing_certs(client, db_session, google_stand_in):
+    """
+    Test that the OAuth callback exchanges the code, verifies the ID token and
+    fetches Google's certificates only once while their max-age lasts.
+    """
+    for _ in range(2):
+        response = client.get(f"{PREFIX}/auth/google?code=auth-code&state=s")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["user"]["email"] == "googler@example.com"
+
+    assert google_stand_in == ["/token", "/certs", "/token"]
+
+
+def test_refresh_rotates_stored_token(client, db_session, test_user):
+    """
+    Test that GET /user/refresh revokes the presented refresh token by its digest
+    and stores the new one.
+    """
+    refresh_token = create_access_token(
+        {"user_id": test_user.user_id, "email": test_user.email},
+        refresh=True,
+        expiry=timedelta(minutes=settings.JWT_REFRESH_TOKEN_EXPIRY_MINUTES),
+    )
+    uservice.store_refresh_token(
+        test_user.user_id,
+        refresh_token,
+        datetime.now() + timedelta(minutes=settings.JWT_REFRESH_TOKEN_EXPIRY_MINUTES),
+        db_session,
+    )
+
+    with patch("auth.dependencies.token_in_blocklist", AsyncMock(return_value=False)):
+        response = client.get(
+            f"{PREFIX}/refresh",
+            headers={"Authorization": f"Bearer {refresh_token}"},
+        )
+
+    assert response.status_code == status.HTTP_200_OK
+    new_refresh_token = response.json()["refresh_token"]
+    digests = [
+        rt.token_digest
+        for rt in db_session.query(RefreshToken).filter(
+            RefreshToken.user_id == test_user.user_id
+        )
+    ]
+    assert digests == [token_digest(new_refresh_token)]
+
+
+def test_refresh_for_a_deleted_user_is_unauthorized(client):
+    """
+    Test that a refresh token of a user that no longer exists is rejected as an
+    invalid token (401), not as a missing user.
+    """
+    refresh_token = create_access_token(
+        {"user_id": str(uuid.uuid4()), "email": "gone@example.com"},
+        refresh=True,
+        expiry=timedelta(minutes=settings.JWT_REFRESH_TOKEN_EXPIRY_MINUTES),
+    )
+
+    with patch("auth.dependencies.token_in_blocklist", AsyncMock(return_value=False)):
+        response = client.get(
+            f"{PREFIX}/refresh",
+            headers={"Authorization": f"Bearer {refresh_token}"},
+        )
+
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_logout_drops_token_from_verified_cache(client, test_user):
+    """
+    Test that a verified token is served from the cache and that blocklisting its
+    jti on logout removes it again.
+    """
+    access_token = create_access_token(
+        {"user_id": test_user.user_id, "email": test_user.email}
+    )
+    claims = decode_access_token(access_token)
+    assert verified_tokens.get(access_token) == claims
+
+    redis_client = MagicMock()
+    redis_client.pipeline.return_value.execute = AsyncMock()
+    with patch(
+        "auth.dependencies.token_in_blocklist", AsyncMock(return_value=False)
+    ), patch("db.redis.get_async_redis", return_value=redis_client):
+        response = client.post(
+            f"{PREFIX}/logout",
+            headers={"Authorization": f"Bearer {access_token}"},
+        )
+
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    assert verified_tokens.get(access_token) is None